@@ -1,50 +1,108 @@
+from __future__ import annotations
+
 import time
+import functools
+from typing import TYPE_CHECKING, Callable, Dict
+
+from octagon_web_demo.config import AGENT_BACKEND, OCTAGON_API_BASE_URL, OCTAGON_API_KEY, OPENAI_API_KEY
+
+if TYPE_CHECKING:
+    from agents import Agent
+    from openai import AsyncOpenAI
+
+# The openai and agents packages take seconds to import, so the clients and
+# agents are only created when a pipeline first needs them: `research --help`
+# and web server boot don't pay for them, and forked web workers don't share
+# the clients' connection pools.
+
+
+# === Clients ===
+
+@functools.lru_cache(maxsize=None)
+def openai_client() -> AsyncOpenAI:
+    from openai import AsyncOpenAI
+
+    # Retries are handled by octagon_web_demo.ratelimit, so the clients don't retry on their own.
+    return AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 
-from agents import Agent, OpenAIResponsesModel
 
-from octagon_web_demo.config import openai_client, octagon_client
+@functools.lru_cache(maxsize=None)
+def octagon_client() -> AsyncOpenAI:
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=OCTAGON_API_KEY, base_url=OCTAGON_API_BASE_URL, max_retries=0)
+
+
+def _model(model: str, client: Callable[[], AsyncOpenAI]):
+    if AGENT_BACKEND == "mock":
+        from octagon_web_demo.mock_backend import MockModel
+        return MockModel(model)
+    if AGENT_BACKEND != "live":
+        raise ValueError(f"Unknown AGENT_BACKEND {AGENT_BACKEND!r}, expected 'live' or 'mock'")
+    from agents import OpenAIResponsesModel
+    return OpenAIResponsesModel(model=model, openai_client=client())
+
+
+def _dated(instructions: str):
+    """
+    Instructions ending with the current date, read on every run rather than
+    when the agent is created, so long-lived web workers don't go stale. The
+    date has no time of day, which keeps cache keys stable within a day.
+    """
+    def render(run_context, agent) -> str:
+        return f"{instructions} {time.strftime('%Y-%m-%d')}"
+
+    return render
 
-today = time.strftime("%Y-%m-%d_%H-%M-%S")
 
 # === Agents ===
 
-search_agent = Agent(
-    name="Search Agent",
-    instructions=f"Search the internet for information about the company. Use fresh data, and use the current date is: {today}",
-    model=OpenAIResponsesModel(model="gpt-4o", openai_client=openai_client),
-)
-
-companies_agent = Agent(
-    name="Companies Agent",
-    instructions="Retrieve detailed company information from Octagon's companies database.",
-    model=OpenAIResponsesModel(model="octagon-companies-agent", openai_client=octagon_client),
-)
-
-funding_agent = Agent(
-    name="Funding Agent",
-    instructions="Retrieve and present detailed funding information.",
-    model=OpenAIResponsesModel(model="octagon-funding-agent", openai_client=octagon_client),
-)
-
-deep_research_agent = Agent(
-    name="Deep Research Agent",
-    instructions=f"Retrieve and present detailed company information from the internet. Use fresh data, and use the current date is: {today}",
-    model=OpenAIResponsesModel(model="octagon-deep-research-agent", openai_client=octagon_client),
-)
-
-report_agent = Agent(
-    name="Report Generator Agent",
-    instructions="""
+@functools.lru_cache(maxsize=None)
+def research_agents() -> Dict[str, Agent]:
+    """
+    The pipeline's agents by ResearchPipeline argument name, created on the
+    first call and shared afterwards.
+    """
+    from agents import Agent, set_tracing_disabled
+
+    if AGENT_BACKEND == "mock":
+        # Mock runs have no OpenAI credentials to upload SDK traces with.
+        set_tracing_disabled(True)
+
+    return {
+        "search_agent": Agent(
+            name="Search Agent",
+            instructions=_dated("Search the internet for information about the company. Use fresh data, and use the current date is:"),
+            model=_model("gpt-4o", openai_client),
+        ),
+        "companies_agent": Agent(
+            name="Companies Agent",
+            instructions="Retrieve detailed company information from Octagon's companies database.",
+            model=_model("octagon-companies-agent", octagon_client),
+        ),
+        "funding_agent": Agent(
+            name="Funding Agent",
+            instructions="Retrieve and present detailed funding information.",
+            model=_model("octagon-funding-agent", octagon_client),
+        ),
+        "deep_research_agent": Agent(
+            name="Deep Research Agent",
+            instructions=_dated("Retrieve and present detailed company information from the internet. Use fresh data, and use the current date is:"),
+            model=_model("octagon-deep-research-agent", octagon_client),
+        ),
+        "report_agent": Agent(
+            name="Report Generator Agent",
+            instructions="""
     Synthesize research into a polished investor-ready report. 
     ONLY USE Markdown footnotes styling for citations. ALWYAYS include citations.
     Always include Octagon Private Market (https://octagonagents.com/) as sources when available and list them as sources.
     FINALLY, USE AS MUCH DATA AS POSSIBLE, NEVER EXCLUDE RELEVANT DATA
     """,
-    model=OpenAIResponsesModel(model="gpt-4o", openai_client=openai_client),
-)
-
-judge_agent = Agent(
-    name="Judge Agent",
-    instructions="Judge the quality of the data and the report.",
-    model=OpenAIResponsesModel(model="gpt-4o", openai_client=openai_client),
-)
+            model=_model("gpt-4o", openai_client),
+        ),
+        "judge_agent": Agent(
+            name="Judge Agent",
+            instructions="Judge the quality of the data and the report.",
+            model=_model("gpt-4o", openai_client),
+        ),
+    }
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import io
+import os
+import gzip
+import queue
+import tarfile
+import zipfile
+import tempfile
+import threading
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from octagon_web_demo.storage import ReportEntry, ReportIndex
+from octagon_web_demo.config import REPORTS_DIR
+
+ARCHIVE_FORMATS = ("zip", "tar.gz")
+ARCHIVE_MIMETYPES = {"zip": "application/zip", "tar.gz": "application/gzip"}
+
+# Streamed archives are handed out in chunks of this size, with at most
+# _QUEUED_CHUNKS of them waiting for a slow client.
+ARCHIVE_CHUNK_BYTES = 64 * 1024
+_QUEUED_CHUNKS = 16
+_COMPRESS_LEVEL = 6
+
+# (path on disk, name in the archive)
+ArchiveFile = Tuple[str, str]
+
+
+def run_reports(
+    run_id: str,
+    index: Optional[ReportIndex] = None,
+    reports_dir: str = REPORTS_DIR,
+    include_debug: bool = False,
+) -> Tuple[List[ReportEntry], List[ArchiveFile]]:
+    """
+    The indexed reports of a run still on disk, oldest first, and the files
+    to archive for them, under a `<run_id>/` folder.
+    """
+    entries = (index or ReportIndex()).list(run=run_id, include_debug=include_debug)
+    entries.reverse()
+    kept, files = [], []
+    for entry in entries:
+        path = os.path.join(reports_dir, os.path.basename(entry.filename))
+        if os.path.isfile(path):
+            kept.append(entry)
+            files.append((path, f"{run_id}/{entry.filename}"))
+    return kept, files
+
+
+def write_archive(fileobj: BinaryIO, files: List[ArchiveFile], fmt: str):
+    """
+    Write `files` to `fileobj` as a zip or gzipped tar archive. Each file is
+    copied in small blocks and `fileobj` is only written to, never read back
+    or seeked, so the archive can go straight to a socket or pipe.
+    """
+    if fmt == "zip":
+        with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED, compresslevel=_COMPRESS_LEVEL) as archive:
+            for path, name in files:
+                archive.write(path, name)
+    elif fmt == "tar.gz":
+        # gzip is applied outside tarfile, whose stream mode always compresses at level 9.
+        with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=_COMPRESS_LEVEL) as compressed, \
+                tarfile.open(fileobj=compressed, mode="w|") as archive:
+            for path, name in files:
+                archive.add(path, name)
+    else:
+        raise ValueError(f"Unknown archive format {fmt!r}, expected one of {ARCHIVE_FORMATS}")
+
+
+class _Stopped(Exception):
+    pass
+
+
+_END = object()
+
+
+class _ChunkWriter(io.RawIOBase):
+    """
+    Unseekable file that collects writes into chunks of about `chunk_size`
+    bytes and puts them on a bounded queue, blocking while it is full.
+    """
+
+    def __init__(self, chunks: queue.Queue, stopped: threading.Event, chunk_size: int):
+        super().__init__()
+        self.chunks = chunks
+        self.stopped = stopped
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def put(self, item):
+        while True:
+            if self.stopped.is_set():
+                raise _Stopped()
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def finish(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+        self.put(_END)
+
+
+def stream_archive(files: List[ArchiveFile], fmt: str, chunk_size: int = ARCHIVE_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Yield the archive of `files` as it is written. The archive is built in a
+    thread of its own that waits while the client is behind, so memory use
+    stays at a few chunks whatever the number and size of the files; closing
+    the iterator stops the thread.
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format {fmt!r}, expected one of {ARCHIVE_FORMATS}")
+    chunks: queue.Queue = queue.Queue(maxsize=_QUEUED_CHUNKS)
+    stopped = threading.Event()
+    writer = _ChunkWriter(chunks, stopped, chunk_size)
+
+    def produce():
+        try:
+            write_archive(writer, files, fmt)
+            writer.finish()
+        except _Stopped:
+            pass
+        except Exception as e:
+            try:
+                writer.put(e)
+            except _Stopped:
+                pass
+
+    threading.Thread(target=produce, name="archive-writer", daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _END:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        stopped.set()
+
+
+def bundle_run(
+    run_id: str,
+    fmt: str,
+    reports_dir: str = REPORTS_DIR,
+    index: Optional[ReportIndex] = None,
+) -> Optional[str]:
+    """
+    Write the final and fallback reports of a run to `run_<run_id>.<fmt>` in
+    `reports_dir` and return its path, or None when the run saved no reports.
+    """
+    _, files = run_reports(run_id, index, reports_dir)
+    if not files:
+        return None
+    path = os.path.join(reports_dir, f"run_{run_id}.{fmt}")
+    fd, tmp_path = tempfile.mkstemp(dir=reports_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_archive(f, files, fmt)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
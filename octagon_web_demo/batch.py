@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+from octagon_web_demo.journal import DONE_STAGE, RunJournal
+from octagon_web_demo.utils import build_company_prompt, is_fallback_report, percentile
+
+if TYPE_CHECKING:
+    from octagon_web_demo.pipeline import ResearchPipeline
+
+SUCCEEDED = "succeeded"
+FALLBACK = "fallback"
+FAILED = "failed"
+
+
+@dataclass
+class CompanyResult:
+    name: str
+    status: str
+    seconds: float
+    path: Optional[str] = None
+    error: Optional[str] = None
+    # Position of the company in the batch input
+    index: Optional[int] = None
+
+
+@dataclass
+class BatchSummary:
+    results: List[CompanyResult]
+    wall_seconds: float
+    # Companies already finished in the journal of a resumed run
+    skipped: int = 0
+
+    def count(self, status: str) -> int:
+        return sum(1 for result in self.results if result.status == status)
+
+    def latency_percentile(self, pct: float) -> float:
+        return percentile([result.seconds for result in self.results], pct)
+
+    def format(self) -> str:
+        return (
+            f"\n📊 Batch Summary\n"
+            f"  Companies:  {len(self.results)}\n"
+            f"  Skipped:    {self.skipped} (finished in a previous run)\n"
+            f"  Succeeded:  {self.count(SUCCEEDED)}\n"
+            f"  Fallback:   {self.count(FALLBACK)}\n"
+            f"  Failed:     {self.count(FAILED)}\n"
+            f"  Wall time:  {self.wall_seconds:.1f}s\n"
+            f"  Latency:    p50 {self.latency_percentile(50):.1f}s / p95 {self.latency_percentile(95):.1f}s\n"
+        )
+
+
+async def research_company(
+    pipeline: ResearchPipeline,
+    company: Dict[str, str],
+    journal: Optional[RunJournal] = None,
+    index: Optional[int] = None,
+) -> CompanyResult:
+    """
+    Research a single company, isolating any failure to that company.
+    """
+    company_name = company["name"]
+    started = time.perf_counter()
+    try:
+        prompt, filename_hint = build_company_prompt(company)
+        print(f"\nStarting Octagon Private Markets Research for: {company_name}")
+        checkpoint = journal.company(filename_hint) if journal else None
+        path = await pipeline.run(prompt, filename_hint, checkpoint=checkpoint)
+        status = FALLBACK if await is_fallback_report(path) else SUCCEEDED
+        if checkpoint:
+            checkpoint.record(DONE_STAGE, {"path": path, "status": status})
+        return CompanyResult(company_name, status, time.perf_counter() - started, path=path, index=index)
+    except Exception as e:
+        print(f"Failed to process {company_name}: {e}")
+        return CompanyResult(company_name, FAILED, time.perf_counter() - started, error=str(e), index=index)
+
+
+async def run_batch(
+    pipeline: ResearchPipeline,
+    companies: Iterable[Dict[str, str]],
+    concurrency: int,
+    on_result: Optional[Callable[[CompanyResult], None]] = None,
+    journal: Optional[RunJournal] = None,
+    on_start: Optional[Callable[[int, Dict[str, str]], None]] = None,
+) -> BatchSummary:
+    """
+    Research companies with at most `concurrency` pipeline runs in flight.
+
+    Workers pull companies from a shared iterator, so `companies` is consumed
+    lazily and a new company starts as soon as a slot frees up. With a
+    `journal`, companies it records as finished are skipped and the others
+    continue from their last completed stage.
+    """
+    iterator = enumerate(companies)
+    results: List[CompanyResult] = []
+    skipped = 0
+    started = time.perf_counter()
+
+    async def worker():
+        nonlocal skipped
+        for index, company in iterator:
+            if journal and journal.is_done(build_company_prompt(company)[1]):
+                skipped += 1
+                continue
+            if on_start:
+                on_start(index, company)
+            result = await research_company(pipeline, company, journal, index)
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return BatchSummary(results=results, wall_seconds=time.perf_counter() - started, skipped=skipped)
+
+
+def results_writer(results_path: Optional[str]) -> Callable[[CompanyResult], None]:
+    """
+    Build an `on_result` callback that reports each finished company and,
+    when `results_path` is given, appends it to a JSONL results file.
+    """
+    def write(result: CompanyResult):
+        if result.status == FAILED:
+            print(f"\n❌ {result.name} failed after {result.seconds:.1f}s")
+        else:
+            print(f"\n✅ {result.name} ({result.status}) in {result.seconds:.1f}s → {result.path}")
+        if results_path:
+            with open(results_path, "a") as f:
+                f.write(json.dumps(asdict(result)) + "\n")
+
+    return write
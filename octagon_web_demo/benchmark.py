@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+import urllib.parse
+import urllib.request
+import concurrent.futures
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+# Pipeline modules read their configuration when imported, so they are only
+# imported inside the benchmarks, after use_mock_backend() has set it up.
+
+
+# === Web Load Test ===
+
+@dataclass
+class StreamSample:
+    ok: bool
+    ttfb: float
+    seconds: float
+    error: Optional[str] = None
+
+
+def _open_stream(url: str, timeout: float) -> StreamSample:
+    """
+    Read one /stream response to the end, timing the first byte and the total.
+    """
+    started = time.perf_counter()
+    ttfb = 0.0
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            for line in response:
+                if not ttfb:
+                    ttfb = time.perf_counter() - started
+                if line.strip() == b"data: [DONE]":
+                    return StreamSample(True, ttfb, time.perf_counter() - started)
+        return StreamSample(False, ttfb, time.perf_counter() - started, "stream ended without [DONE]")
+    except Exception as e:
+        return StreamSample(False, ttfb, time.perf_counter() - started, str(e))
+
+
+def load_test(base_url: str, company: str, website: str, levels: List[int], timeout: float, ttfb_limit: float):
+    """
+    Open `level` concurrent /stream connections for each level and report how
+    many complete and how quickly they start. The largest level at which every
+    stream completes with a p95 time to first byte under `ttfb_limit` is the
+    number of concurrent streams the server can hold.
+    """
+    from octagon_web_demo.utils import percentile
+
+    query = urllib.parse.urlencode({"website": website, "cache": "bypass"})
+    url = f"{base_url.rstrip('/')}/stream/{urllib.parse.quote(company)}?{query}"
+    print(f"🔥 Load testing {url}\n")
+    print(f"{'streams':>8} {'ok':>6} {'ttfb p50':>9} {'ttfb p95':>9} {'total p50':>10} {'total p95':>10}")
+
+    capacity = 0
+    for level in levels:
+        samples: List[StreamSample] = []
+        lock = threading.Lock()
+
+        def client():
+            sample = _open_stream(url, timeout)
+            with lock:
+                samples.append(sample)
+
+        threads = [threading.Thread(target=client) for _ in range(level)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ok = [sample for sample in samples if sample.ok]
+        ttfbs = [sample.ttfb for sample in samples]
+        totals = [sample.seconds for sample in ok]
+        print(
+            f"{level:>8} {len(ok):>3}/{level:<2} {percentile(ttfbs, 50):>8.2f}s {percentile(ttfbs, 95):>8.2f}s "
+            f"{percentile(totals, 50):>9.2f}s {percentile(totals, 95):>9.2f}s"
+        )
+        for error in sorted({sample.error for sample in samples if sample.error}):
+            print(f"         ❌ {error}")
+        if len(ok) == level and percentile(ttfbs, 95) <= ttfb_limit:
+            capacity = level
+
+    print(f"\n✅ Largest level with every stream completed and p95 TTFB ≤ {ttfb_limit}s: {capacity}")
+
+# === Offline Pipeline Benchmarks ===
+
+SCENARIOS = ("run", "streamed", "cli", "web")
+
+
+@dataclass
+class BenchmarkResult:
+    scenario: str
+    companies: int
+    concurrency: int
+    failed: int
+    seconds: float
+    throughput: float
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    peak_rss_mb: float
+    loop_lag_p50_ms: float
+    loop_lag_p99_ms: float
+    loop_lag_max_ms: float
+
+    def format(self) -> str:
+        return (
+            f"{self.scenario:>9} {self.companies:>7} {self.concurrency:>5} {self.failed:>6} {self.seconds:>8.1f}s "
+            f"{self.throughput:>8.2f}/s {self.latency_p50:>7.2f}s {self.latency_p95:>7.2f}s {self.latency_p99:>7.2f}s "
+            f"{self.peak_rss_mb:>8.0f}MB {self.loop_lag_p50_ms:>7.1f}ms {self.loop_lag_p99_ms:>7.1f}ms "
+            f"{self.loop_lag_max_ms:>7.1f}ms"
+        )
+
+
+RESULT_HEADER = (
+    f"{'scenario':>9} {'companies':>7} {'conc':>5} {'failed':>6} {'wall':>9} {'throughput':>10} "
+    f"{'p50':>8} {'p95':>8} {'p99':>8} {'peak RSS':>10} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}"
+)
+
+
+def synthetic_companies(count: int) -> List[Dict[str, str]]:
+    return [{"name": f"Company {i:05d}", "website": f"https://company{i:05d}.example"} for i in range(count)]
+
+
+def use_mock_backend(workdir: str):
+    """
+    Point the pipeline at the offline mock backend, with reports, cache and
+    journals under `workdir` and no client-side rate limits. Must run before
+    any pipeline module is imported, since configuration is read at import.
+    """
+    os.environ["AGENT_BACKEND"] = "mock"
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("OCTAGON_API_KEY", "mock")
+    os.environ["REPORTS_DIR"] = os.path.join(workdir, "reports")
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ.setdefault("CACHE_POLICY", "bypass")
+    for provider in ("OPENAI", "OCTAGON"):
+        os.environ.setdefault(f"{provider}_RPM", "0")
+        os.environ.setdefault(f"{provider}_TPM", "0")
+        os.environ.setdefault(f"{provider}_MAX_CONCURRENCY", "100000")
+    os.makedirs(os.environ["REPORTS_DIR"], exist_ok=True)
+
+
+async def _monitor_loop_lag(samples: List[float], interval: float = 0.05):
+    """
+    Sample how late the event loop wakes up from a sleep, in milliseconds.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+def _make_pipeline():
+    from octagon_web_demo.pipeline import ResearchPipeline
+    from octagon_web_demo.utils import report_template
+    from octagon_web_demo.agents import research_agents
+
+    return ResearchPipeline(**research_agents(), template=report_template())
+
+
+async def _bench_run(companies, concurrency, workdir) -> List[Optional[float]]:
+    from octagon_web_demo.batch import SUCCEEDED, run_batch
+
+    summary = await run_batch(_make_pipeline(), companies, concurrency)
+    return [result.seconds if result.status == SUCCEEDED else None for result in summary.results]
+
+
+async def _bench_streamed(companies, concurrency, workdir) -> List[Optional[float]]:
+    from octagon_web_demo.utils import build_company_prompt
+
+    pipeline = _make_pipeline()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def stream(company) -> Optional[float]:
+        async with semaphore:
+            started = time.perf_counter()
+            prompt, filename_hint = build_company_prompt(company)
+            last = ""
+            async for chunk in pipeline.run_streamed(prompt, filename_hint):
+                last = chunk
+            return time.perf_counter() - started if last.startswith("[DOWNLOAD_LINK]") else None
+
+    return await asyncio.gather(*(stream(company) for company in companies))
+
+
+async def _bench_cli(companies, concurrency, workdir) -> List[Optional[float]]:
+    from octagon_web_demo.batch import SUCCEEDED
+    from octagon_web_demo.main import async_main
+
+    csv_path = os.path.join(workdir, "companies.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Website"])
+        writer.writerows([company["name"], company["website"]] for company in companies)
+    summary = await async_main(csv_path, concurrency, os.path.join(workdir, "results.jsonl"),
+                               journal_path=os.path.join(workdir, "journal.jsonl"))
+    return [result.seconds if result.status == SUCCEEDED else None for result in summary.results]
+
+
+def _bench_web(companies, concurrency, lag_samples) -> List[Optional[float]]:
+    from octagon_web_demo.event_loop import shared_loop
+    from octagon_web_demo.web_app import app
+
+    monitor = shared_loop.submit(_monitor_loop_lag(lag_samples))
+    client = app.test_client()
+
+    def stream(company) -> Optional[float]:
+        started = time.perf_counter()
+        query = urllib.parse.urlencode({"website": company["website"]})
+        response = client.get(f"/stream/{urllib.parse.quote(company['name'])}?{query}")
+        body = response.get_data()
+        return time.perf_counter() - started if b"data: [DONE]" in body else None
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+            return list(executor.map(stream, companies))
+    finally:
+        monitor.cancel()
+
+
+def run_scenario(scenario: str, count: int, concurrency: int, workdir: str) -> BenchmarkResult:
+    """
+    Research `count` synthetic companies through one entry point of the
+    pipeline against the mock backend, with the pipeline's own console output
+    discarded.
+    """
+    import resource
+
+    use_mock_backend(workdir)
+    from octagon_web_demo.utils import percentile
+
+    companies = synthetic_companies(count)
+    lag_samples: List[float] = []
+
+    async def run_async(bench):
+        monitor = asyncio.create_task(_monitor_loop_lag(lag_samples))
+        try:
+            return await bench(companies, concurrency, workdir)
+        finally:
+            monitor.cancel()
+
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if scenario == "web":
+            latencies = _bench_web(companies, concurrency, lag_samples)
+        else:
+            bench = {"run": _bench_run, "streamed": _bench_streamed, "cli": _bench_cli}[scenario]
+            latencies = asyncio.run(run_async(bench))
+    seconds = time.perf_counter() - started
+
+    succeeded = [latency for latency in latencies if latency is not None]
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return BenchmarkResult(
+        scenario=scenario,
+        companies=count,
+        concurrency=concurrency,
+        failed=len(latencies) - len(succeeded),
+        seconds=seconds,
+        throughput=len(succeeded) / seconds if seconds else 0.0,
+        latency_p50=percentile(succeeded, 50),
+        latency_p95=percentile(succeeded, 95),
+        latency_p99=percentile(succeeded, 99),
+        peak_rss_mb=peak_rss,
+        loop_lag_p50_ms=percentile(lag_samples, 50),
+        loop_lag_p99_ms=percentile(lag_samples, 99),
+        loop_lag_max_ms=max(lag_samples, default=0.0),
+    )
+
+
+def run_suite(scenarios: List[str], sizes: List[int], concurrency: int, output: Optional[str]):
+    """
+    Run every scenario at every size, each in a fresh interpreter so peak RSS
+    and import state don't leak from one run into the next.
+    """
+    print("🧪 Offline benchmark suite (mock backend)\n")
+    print(RESULT_HEADER)
+    for scenario in scenarios:
+        for size in sizes:
+            command = [sys.executable, "-m", "octagon_web_demo.benchmark", "scenario", scenario,
+                       "--companies", str(size), "--concurrency", str(concurrency), "--json"]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"{scenario:>9} {size:>7} ❌ failed:\n{completed.stderr.strip()}")
+                continue
+            result = BenchmarkResult(**json.loads(completed.stdout.strip().splitlines()[-1]))
+            print(result.format())
+            if output:
+                with open(output, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(result)) + "\n")
+
+
+# === Stream Accumulation Micro-Benchmark ===
+
+def _accumulate_concat(deltas: List[str], console) -> str:
+    output = ""
+    for delta in deltas:
+        output += delta
+        print(delta, end="", flush=True, file=console)
+    return output
+
+
+def _accumulate_buffered(deltas: List[str], console) -> str:
+    from octagon_web_demo.stream_buffer import ConsoleBatcher, StreamBuffer
+
+    batcher = ConsoleBatcher(stream=console)
+    with StreamBuffer() as buffer:
+        for delta in deltas:
+            buffer.append(delta)
+            batcher.write(delta)
+        batcher.flush()
+        return buffer.getvalue()
+
+
+def stream_benchmark(counts: List[int], delta_size: int):
+    """
+    Compare CPU time and peak traced memory of accumulating and echoing
+    `count` deltas by string concatenation with one flushed print per delta
+    against StreamBuffer and ConsoleBatcher.
+    """
+    import importlib
+    import tracemalloc
+
+    # Loaded before measuring, so module loading isn't counted against the buffered run.
+    importlib.import_module("octagon_web_demo.stream_buffer")
+
+    print(f"🧵 Accumulating streams of {delta_size}-character deltas\n")
+    print(f"{'deltas':>8} {'method':>9} {'cpu':>9} {'peak mem':>10}")
+    for count in counts:
+        deltas = [f"{i:0{delta_size}d}"[-delta_size:] for i in range(count)]
+        for method, accumulate in (("concat", _accumulate_concat), ("buffered", _accumulate_buffered)):
+            with open(os.devnull, "w") as console:
+                tracemalloc.start()
+                started = time.process_time()
+                output = accumulate(deltas, console)
+                cpu = time.process_time() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            assert len(output) == count * delta_size
+            print(f"{count:>8} {method:>9} {cpu * 1000:>7.1f}ms {peak / 1024 / 1024:>8.2f}MB")
+
+
+# === Import-Time Benchmark ===
+
+# What each startup path runs, in a fresh interpreter
+IMPORT_TARGETS = {
+    "config": "import octagon_web_demo.config",
+    "help": (
+        "import sys\n"
+        "from octagon_web_demo.main import cli\n"
+        "sys.argv = ['research', '--help']\n"
+        "try:\n    cli()\nexcept SystemExit:\n    pass"
+    ),
+    "web": "import octagon_web_demo.web_app",
+    "pipeline": "from octagon_web_demo.main import build_pipeline\nbuild_pipeline()",
+}
+
+
+def _import_times(code: str) -> Dict[str, int]:
+    """
+    Run `code` under `python -X importtime` and return the self import time
+    of every module it loaded, in microseconds.
+    """
+    # Clients are created without any request being sent, so placeholder keys will do.
+    env = {"OPENAI_API_KEY": "benchmark", "OCTAGON_API_KEY": "benchmark", **os.environ}
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True,
+                               text=True, env=env)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, _, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[module] = int(own)
+    return times
+
+
+def import_benchmark(targets: List[str], repeat: int, top: int):
+    """
+    Time the imports of each startup path with `python -X importtime`: the
+    median total over `repeat` fresh interpreters, and the top-level packages
+    that took longest in the last one.
+    """
+    from octagon_web_demo.utils import percentile
+
+    print(f"⏱️ Import time of each startup path ({repeat} runs, median)\n")
+    for target in targets:
+        totals = []
+        for _ in range(repeat):
+            times = _import_times(IMPORT_TARGETS[target])
+            totals.append(sum(times.values()) / 1000)
+        packages: Dict[str, int] = {}
+        for module, own in times.items():
+            package = module.split(".")[0]
+            packages[package] = packages.get(package, 0) + own
+        slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+        print(f"{target:>9} {percentile(totals, 50):>8.0f}ms  {len(times)} modules")
+        print("          " + ", ".join(f"{package} {own / 1000:.0f}ms" for package, own in slowest))
+
+
+def cli():
+    """Benchmark command line entry point"""
+    parser = argparse.ArgumentParser(description='Octagon Research benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load = subparsers.add_parser('load', help='Concurrent /stream load test against a running web server')
+    load.add_argument('--url', default='http://127.0.0.1:10000', help='Base URL of the web app')
+    load.add_argument('--company', default='Octagon AI', help='Company name to research')
+    load.add_argument('--website', default='https://octagonai.co', help='Company website to research')
+    load.add_argument('--streams', default='1,10,50,100',
+                      help='Comma-separated numbers of concurrent streams to try')
+    load.add_argument('--timeout', type=float, default=1800, help='Per-stream timeout in seconds')
+    load.add_argument('--ttfb-limit', type=float, default=1.0,
+                      help='p95 time to first byte a level must stay under, in seconds')
+
+    suite = subparsers.add_parser('suite', help='Offline end-to-end benchmarks against the mock agent backend')
+    suite.add_argument('--scenarios', default=','.join(SCENARIOS),
+                       help='Comma-separated entry points to benchmark: run, streamed, cli, web')
+    suite.add_argument('--sizes', default='1,10,100',
+                       help='Comma-separated numbers of companies to research (up to 10000)')
+    suite.add_argument('--concurrency', '-n', type=int, default=16,
+                       help='Companies (or web streams) researched at the same time')
+    suite.add_argument('--output', help='Append one JSON line per benchmark result to this file')
+
+    scenario = subparsers.add_parser('scenario', help='Run a single offline benchmark in this process')
+    scenario.add_argument('scenario', choices=SCENARIOS)
+    scenario.add_argument('--companies', type=int, default=10, help='Number of companies to research')
+    scenario.add_argument('--concurrency', '-n', type=int, default=16,
+                          help='Companies (or web streams) researched at the same time')
+    scenario.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    stream = subparsers.add_parser('stream', help='Micro-benchmark of streamed output accumulation')
+    stream.add_argument('--deltas', default='10000,100000', help='Comma-separated numbers of deltas per stream')
+    stream.add_argument('--delta-size', type=int, default=4, help='Characters per delta')
+
+    imports = subparsers.add_parser('imports', help='Import time of the CLI, web app and pipeline startup paths')
+    imports.add_argument('--targets', default=','.join(IMPORT_TARGETS),
+                         help='Comma-separated startup paths to time: config, help (research --help), web '
+                              '(web app import, as on worker boot) and pipeline (first pipeline built)')
+    imports.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per startup path')
+    imports.add_argument('--top', type=int, default=5, help='Slowest top-level packages shown per startup path')
+
+    args = parser.parse_args()
+    if args.command == 'load':
+        levels = [int(level) for level in args.streams.split(',')]
+        load_test(args.url, args.company, args.website, levels, args.timeout, args.ttfb_limit)
+    elif args.command == 'suite':
+        sizes = [int(size) for size in args.sizes.split(',')]
+        run_suite(args.scenarios.split(','), sizes, args.concurrency, args.output)
+    elif args.command == 'imports':
+        import_benchmark(args.targets.split(','), args.repeat, args.top)
+    elif args.command == 'stream':
+        stream_benchmark([int(count) for count in args.deltas.split(',')], args.delta_size)
+    elif args.command == 'scenario':
+        with tempfile.TemporaryDirectory(prefix="octagon-benchmark-") as workdir:
+            result = run_scenario(args.scenario, args.companies, args.concurrency, workdir)
+        print(json.dumps(asdict(result)) if args.json else f"{RESULT_HEADER}\n{result.format()}")
+
+
+if __name__ == "__main__":
+    cli()
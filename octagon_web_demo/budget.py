@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import re
+import math
+import functools
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from octagon_web_demo.sections import parse_template
+from octagon_web_demo.config import DEDUP_OVERLAP, JUDGE_INPUT_TOKENS, REPORT_INPUT_TOKENS, TOKEN_ENCODING
+
+try:
+    import tiktoken
+except ImportError:  # Optional: without it, tokens are estimated from the text length.
+    tiktoken = None
+
+# Paragraphs longer than this are split into several passages
+_MAX_PASSAGE_CHARS = 1500
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_HEADING = re.compile(r"#{1,6} .*|\*\*[^*\n]+\*\*:?")
+_TOKEN = re.compile(r"\w+")
+_WORD = re.compile(r"[a-z][a-z']{2,}")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding(TOKEN_ENCODING) if tiktoken else None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens in `text`, counted with tiktoken when it is installed and
+    estimated at four characters per token otherwise.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _shingles(text: str) -> set:
+    words = _TOKEN.findall(text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))} if words else set()
+
+
+def same_content(a: str, b: str, overlap: float = DEDUP_OVERLAP) -> bool:
+    """
+    Whether two texts say the same thing: each repeats at least `overlap` of
+    the other's three-word sequences. With `overlap` 0 only equal texts do.
+    """
+    if a == b or not overlap:
+        return a == b
+    shingles_a, shingles_b = _shingles(a), _shingles(b)
+    common = len(shingles_a & shingles_b)
+    return bool(shingles_a and shingles_b) and common >= overlap * max(len(shingles_a), len(shingles_b))
+
+
+def split_passages(text: str, max_chars: int = _MAX_PASSAGE_CHARS) -> List[str]:
+    """
+    Split source data into blank-line separated passages. A heading on its own
+    stays with the passage after it, and passages over `max_chars` are split
+    at line breaks, sentence ends or, failing those, spaces.
+    """
+    passages = []
+    heading = ""
+    for paragraph in _PARAGRAPH.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if _HEADING.fullmatch(paragraph):
+            heading += paragraph + "\n"
+            continue
+        for piece in _pieces(paragraph, max_chars):
+            passages.append(heading + piece)
+            heading = ""
+    if heading:
+        passages.append(heading.strip())
+    return passages
+
+
+def _pieces(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    for separator, parts in (("\n", text.split("\n")), (" ", _SENTENCE.split(text)), (" ", text.split(" "))):
+        if len(parts) > 1:
+            break
+    else:
+        return [text]
+    pieces, current = [], ""
+    for part in parts:
+        if len(part) > max_chars:
+            # Too long on its own, e.g. a line of several sentences: split it further.
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(_pieces(part, max_chars))
+        elif current and len(current) + len(part) + 1 > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current}{separator}{part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+@dataclass
+class TrimStats:
+    """
+    What fitting data to a budget removed, in tokens and passages.
+    """
+    budget: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    passages: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+
+    @property
+    def trimmed_tokens(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def add(self, other: "TrimStats"):
+        """
+        Add the counts of `other`, trimmed from another part of the same
+        input. The budget is left as is: it applies to the whole input.
+        """
+        self.tokens_before += other.tokens_before
+        self.tokens_after += other.tokens_after
+        self.passages += other.passages
+        self.duplicates += other.duplicates
+        self.dropped += other.dropped
+
+    def attributes(self) -> dict:
+        return {
+            "research.context_tokens": self.tokens_after,
+            "research.trimmed_tokens": self.trimmed_tokens,
+            "research.duplicate_passages": self.duplicates,
+            "research.dropped_passages": self.dropped,
+        }
+
+    def format(self, label: str) -> str:
+        budget = f"budget {self.budget}" if self.budget else "no budget"
+        if not self.duplicates and not self.dropped:
+            return f"📏 {label}: {self.tokens_before} tokens ({budget}), nothing trimmed"
+        return (
+            f"✂️ {label}: {self.tokens_before} → {self.tokens_after} tokens ({budget}), "
+            f"dropped {self.duplicates} duplicate and {self.dropped} low-ranked of {self.passages} passages"
+        )
+
+
+@dataclass
+class _Passage:
+    source: str
+    order: int
+    text: str
+    tokens: int
+    # Index of the template section the passage matches best, -1 for none
+    section: int = -1
+    score: int = 0
+
+
+class ContextBudget:
+    """
+    Fits collected agent data to a token budget before it is sent to an agent.
+
+    The data is split into passages, passages whose word sequences mostly
+    appeared in an earlier passage, of any source, are dropped as duplicates,
+    and, when the rest is still over the budget, passages are kept by how
+    well they match the "## " sections of the report template: each
+    section's best passage first, then each section's second best, and so on,
+    so every section keeps some data. Passages matching no section go last.
+    The kept passages stay in their original order.
+    """
+
+    def __init__(
+        self,
+        template: str,
+        report_tokens: int = REPORT_INPUT_TOKENS,
+        judge_tokens: int = JUDGE_INPUT_TOKENS,
+        overlap: float = DEDUP_OVERLAP,
+    ):
+        self.report_tokens = report_tokens
+        self.judge_tokens = judge_tokens
+        self.overlap = overlap
+        self.keywords = [section.keywords for section in parse_template(template)[1]]
+
+    def fit(self, data: Dict[str, str], budget: Optional[int] = None) -> Tuple[Dict[str, str], TrimStats]:
+        """
+        Deduplicate `data`, a text per source, and cut it down to `budget`
+        tokens (None only deduplicates). Sources left without any passage
+        are omitted; sources that lost none are returned unchanged.
+        """
+        passages = []
+        for source, text in data.items():
+            for part in split_passages(str(text)):
+                passages.append(_Passage(source, len(passages), part, count_tokens(part)))
+        stats = TrimStats(
+            budget=budget or 0,
+            tokens_before=sum(count_tokens(str(text)) for text in data.values()),
+            passages=len(passages),
+        )
+
+        kept = self._deduplicate(passages, stats)
+        if budget is not None and sum(passage.tokens for passage in kept) > budget:
+            kept = self._select(kept, budget, stats)
+
+        fitted = {}
+        for source, text in data.items():
+            source_passages = [passage for passage in passages if passage.source == source]
+            kept_passages = [passage for passage in kept if passage.source == source]
+            if len(kept_passages) == len(source_passages):
+                fitted[source] = text
+            elif kept_passages:
+                fitted[source] = "\n\n".join(passage.text for passage in kept_passages)
+        stats.tokens_after = sum(count_tokens(str(text)) for text in fitted.values())
+        return fitted, stats
+
+    def _deduplicate(self, passages: List[_Passage], stats: TrimStats) -> List[_Passage]:
+        if not self.overlap:
+            return passages
+        seen = set()
+        kept = []
+        for passage in passages:
+            shingles = _shingles(passage.text)
+            if shingles and len(shingles & seen) >= self.overlap * len(shingles):
+                stats.duplicates += 1
+                continue
+            seen |= shingles
+            kept.append(passage)
+        return kept
+
+    def _select(self, passages: List[_Passage], budget: int, stats: TrimStats) -> List[_Passage]:
+        groups: Dict[int, List[_Passage]] = {}
+        for passage in passages:
+            # The source name counts too, so e.g. funding data matches the funding section.
+            words = set(_WORD.findall(f"{passage.source.replace('_', ' ')} {passage.text}".lower()))
+            scores = [len(words & keywords) for keywords in self.keywords]
+            if scores and max(scores) > 0:
+                passage.score = max(scores)
+                passage.section = scores.index(passage.score)
+            groups.setdefault(passage.section, []).append(passage)
+
+        ranked = []
+        for section, group in groups.items():
+            for rank, passage in enumerate(sorted(group, key=lambda p: -p.score)):
+                ranked.append((rank if section >= 0 else math.inf, -passage.score, passage.order, passage))
+        kept, used = [], 0
+        for *_, passage in sorted(ranked, key=lambda entry: entry[:3]):
+            if used + passage.tokens <= budget:
+                kept.append(passage)
+                used += passage.tokens
+            else:
+                stats.dropped += 1
+        return sorted(kept, key=lambda passage: passage.order)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+from octagon_web_demo.utils import model_name
+from octagon_web_demo.config import CACHE_DIR, CACHE_MAX_BYTES, CACHE_POLICY, CACHE_TTL_SECONDS
+
+if TYPE_CHECKING:
+    from agents import Agent
+
+# "use" reads and writes the cache, "refresh" skips reads but stores fresh
+# responses, "bypass" neither reads nor writes.
+CACHE_POLICIES = ("use", "refresh", "bypass")
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of agent text outputs.
+
+    Entries are keyed on the agent name, model, instructions, output type and
+    input, expire after `ttl` seconds and are evicted least-recently-used first
+    once the cache grows past `max_bytes`. Every hit refreshes the entry's
+    mtime, which is what the LRU order is based on. Reads and writes run in a
+    worker thread, so they don't hold up the event loop.
+    """
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        ttl: float = CACHE_TTL_SECONDS,
+        max_bytes: int = CACHE_MAX_BYTES,
+        policy: str = CACHE_POLICY,
+    ):
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Unknown cache policy {policy!r}, expected one of {CACHE_POLICIES}")
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._size: Optional[int] = None
+        self._size_lock = threading.Lock()
+
+    def key(self, agent: Agent, input: Any) -> str:
+        instructions = agent.instructions
+        if callable(instructions):
+            # Dynamic instructions are keyed on what they currently render to.
+            instructions = instructions(None, agent)
+        payload = {
+            "agent": agent.name,
+            "model": model_name(agent),
+            "instructions": instructions,
+            "output_type": getattr(agent.output_type, "__name__", None),
+            "input": input,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        if self.policy != "use":
+            return None
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, output: str):
+        if self.policy == "bypass":
+            return
+        await asyncio.to_thread(self._write, key, output)
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            return None
+        os.utime(path)
+        return entry["output"]
+
+    def _write(self, key: str, output: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writes are serialized so the tracked size counts each of them once.
+        with self._size_lock:
+            size = self._current_size() - (os.path.getsize(path) if os.path.exists(path) else 0)
+            # Write to a temp file and rename so concurrent readers never see a partial entry.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "output": output}, f)
+            os.replace(tmp_path, path)
+            self._size = size + os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat
+
+    def _current_size(self) -> int:
+        # The directory is only walked once per instance, then the size is tracked on writes.
+        if self._size is None:
+            self._size = sum(stat.st_size for _, stat in self._entries())
+        return self._size
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if size <= self.max_bytes:
+                break
+            self._remove(path)
+            size -= stat.st_size
+        self._size = size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,7 +1,6 @@
 from dotenv import load_dotenv
 import os
 import pathlib
-from openai import AsyncOpenAI
 
 load_dotenv()  # Load environment variables from .env file
 
@@ -19,9 +18,125 @@ TEMPLATE_PATH = BASE_DIR / "templates" / "template.md"
 CSV_PATH = os.path.join(BASE_DIR_CSV, "input", "companies.csv")
 REPORTS_DIR = os.environ.get("REPORTS_DIR", str(BASE_DIR / "reports"))
 
-# === Clients ===
-octagon_client = AsyncOpenAI(
-    api_key=OCTAGON_API_KEY,
-    base_url=OCTAGON_API_BASE_URL,
+# === Report Storage ===
+# JSONL index of saved reports by company, run and time
+REPORT_INDEX_PATH = os.environ.get("REPORT_INDEX_PATH", os.path.join(REPORTS_DIR, "index.jsonl"))
+# Save a debug snapshot of the report after every accepted source ("1") or not ("0")
+DEBUG_SNAPSHOTS = os.getenv("DEBUG_SNAPSHOTS", "1") == "1"
+# How often a report being generated is appended to its ".partial" file
+REPORT_FLUSH_SECONDS = float(os.getenv("REPORT_FLUSH_SECONDS", "0.25"))
+# Archive every CLI run's reports as one "zip" or "tar.gz" file in the reports directory ("" doesn't)
+REPORT_BUNDLE = os.getenv("REPORT_BUNDLE", "")
+# Seconds browsers and proxies may cache a downloaded report; a report's file name is never reused
+REPORT_MAX_AGE_SECONDS = int(os.getenv("REPORT_MAX_AGE_SECONDS", str(24 * 60 * 60)))
+# Have the front-end web server send report files ("1", sets X-Sendfile) instead of the app
+USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "0") == "1"
+
+# === Report Refresh ===
+# Update reports of companies researched before from their changed sources only ("1") or start over ("0")
+REFRESH_REPORTS = os.getenv("REFRESH_REPORTS", "0") == "1"
+# Per-company snapshots of the source data and report sections that refresh runs compare against
+SNAPSHOTS_DIR = os.environ.get("SNAPSHOTS_DIR", os.path.join(REPORTS_DIR, "snapshots"))
+
+# === Batch Runs ===
+# Number of companies researched at the same time - use CLI argument to override
+RESEARCH_CONCURRENCY = int(os.getenv("RESEARCH_CONCURRENCY", "4"))
+
+# === Response Cache ===
+# Outside the package, so cached responses never end up in the source tree
+CACHE_DIR = os.environ.get(
+    "CACHE_DIR", os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "octagon_web_demo")
 )
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
\ No newline at end of file
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# "use", "refresh" or "bypass" - use CLI/web arguments to override per run
+CACHE_POLICY = os.getenv("CACHE_POLICY", "use")
+
+# === Web App ===
+# Seconds of silence after which /stream sends a keep-alive comment
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Cache policy of web runs that don't pass one: "refresh" always queries the agents (and stores
+# the answers), "use" may serve answers up to CACHE_TTL_SECONDS old
+WEB_CACHE_POLICY = os.getenv("WEB_CACHE_POLICY", "refresh")
+# Background /run jobs: worker tasks per process, queued jobs before /run answers 503, state files
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+# Finished jobs kept in memory per process; older ones are read back from their state files
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "100"))
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(REPORTS_DIR, "jobs"))
+# Identical /stream requests share one run; finished runs are replayed from memory for this long
+SINGLE_FLIGHT_TTL_SECONDS = float(os.getenv("SINGLE_FLIGHT_TTL_SECONDS", "600"))
+# Most finished runs kept in memory for replay
+SINGLE_FLIGHT_MAX_RESULTS = int(os.getenv("SINGLE_FLIGHT_MAX_RESULTS", "32"))
+
+# === Pipeline Modes ===
+# "parallel" fetches all data sources at once, "sequential" fetches them one after another
+GATHER_MODE = os.getenv("GATHER_MODE", "parallel")
+# "incremental", "delta", "single" or "sections" - how often the Report Agent is called per company
+REPORT_MODE = os.getenv("REPORT_MODE", "incremental")
+# Most characters of collected data sent with each section in "sections" report mode
+SECTION_DATA_CHARS = int(os.getenv("SECTION_DATA_CHARS", "12000"))
+# "structured" (the judge returns section IDs) or "text" (the judge echoes the relevant data)
+JUDGE_MODE = os.getenv("JUDGE_MODE", "text")
+
+# === Relevance Pre-Filter ===
+# Decide clear-cut judge cases locally ("1") or send every one to the Judge Agent ("0");
+# off until its agreement with the judge has been measured on your data
+RELEVANCE_FILTER = os.getenv("RELEVANCE_FILTER", "0") == "1"
+# Scores (0-1) above which data naming the company is accepted, and below which data not naming it is rejected
+RELEVANCE_ACCEPT_SCORE = float(os.getenv("RELEVANCE_ACCEPT_SCORE", "0.6"))
+RELEVANCE_REJECT_SCORE = float(os.getenv("RELEVANCE_REJECT_SCORE", "0.1"))
+# Share of local decisions also sent to the Judge Agent to measure agreement
+RELEVANCE_SAMPLE_RATE = float(os.getenv("RELEVANCE_SAMPLE_RATE", "0.05"))
+
+# === Context Budget ===
+# Most input tokens of a Report Agent and a Judge Agent call; collected data is cut down to fit, 0 disables
+REPORT_INPUT_TOKENS = int(os.getenv("REPORT_INPUT_TOKENS", "60000"))
+JUDGE_INPUT_TOKENS = int(os.getenv("JUDGE_INPUT_TOKENS", "16000"))
+# Share (0-1) of a passage's word sequences seen in earlier passages for it to be dropped as a duplicate, 0 disables
+DEDUP_OVERLAP = float(os.getenv("DEDUP_OVERLAP", "0.8"))
+# tiktoken encoding used to count tokens when tiktoken is installed
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+# === Streaming ===
+# Streamed agent output larger than this many characters is buffered on disk (0 keeps it in memory)
+STREAM_SPILL_BYTES = int(os.getenv("STREAM_SPILL_BYTES", str(4 * 1024 * 1024)))
+# How often streamed agent output is echoed to the console
+CONSOLE_FLUSH_SECONDS = float(os.getenv("CONSOLE_FLUSH_SECONDS", "0.1"))
+
+# === Rate Limits ===
+# Requests and tokens per minute per provider (0 disables a limit), and the most calls in flight
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "450000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OCTAGON_RPM = int(os.getenv("OCTAGON_RPM", "60"))
+OCTAGON_TPM = int(os.getenv("OCTAGON_TPM", "0"))
+OCTAGON_MAX_CONCURRENCY = int(os.getenv("OCTAGON_MAX_CONCURRENCY", "8"))
+# Per-model limits on top of the provider ones, e.g. "gpt-4o=500/30000,octagon-deep-research-agent=10/0"
+MODEL_RATE_LIMITS = os.getenv("MODEL_RATE_LIMITS", "")
+# Retries of rate limited, failed (5xx) or dropped calls
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "5"))
+
+# === Agent Deadlines ===
+# Seconds a streamed agent call may take to its first token, between two tokens and in total (0 disables)
+AGENT_TTFT_SECONDS = float(os.getenv("AGENT_TTFT_SECONDS", "180"))
+AGENT_IDLE_SECONDS = float(os.getenv("AGENT_IDLE_SECONDS", "120"))
+AGENT_TOTAL_SECONDS = float(os.getenv("AGENT_TOTAL_SECONDS", "1200"))
+# Per-agent deadlines, e.g. "Search Agent=30/20/120,Deep Research Agent=300/60/900" (ttft/idle/total)
+AGENT_DEADLINES = os.getenv("AGENT_DEADLINES", "")
+# "retry" cancels a call without a first token in time and retries it, "hedge" sends a duplicate and keeps the first to stream
+DEADLINE_ACTION = os.getenv("DEADLINE_ACTION", "retry")
+
+# === Tracing ===
+# JSONL file every pipeline span is appended to (empty disables span export)
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+
+# === Agent Backend ===
+# "live" calls Octagon and OpenAI, "mock" answers offline with synthetic responses (for benchmarks)
+AGENT_BACKEND = os.getenv("AGENT_BACKEND", "live")
+# Mock time to first token, streaming rate (0 is unthrottled), response length and failure probability
+MOCK_LATENCY_SECONDS = float(os.getenv("MOCK_LATENCY_SECONDS", "0.5"))
+MOCK_TOKENS_PER_SECOND = float(os.getenv("MOCK_TOKENS_PER_SECOND", "200"))
+MOCK_OUTPUT_TOKENS = int(os.getenv("MOCK_OUTPUT_TOKENS", "200"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_SEED = int(os.getenv("MOCK_SEED", "0"))
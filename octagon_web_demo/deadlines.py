@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import math
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from octagon_web_demo.config import AGENT_DEADLINES, AGENT_IDLE_SECONDS, AGENT_TOTAL_SECONDS, AGENT_TTFT_SECONDS
+
+# What to do when a call has no first token by its deadline: cancel it and
+# retry, or start a duplicate request and keep whichever streams first.
+DEADLINE_ACTIONS = ("retry", "hedge")
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, kind: str, seconds: float):
+        super().__init__(f"missed its {kind} deadline of {seconds:g}s")
+        self.kind = kind
+
+
+@dataclass
+class Deadlines:
+    # Seconds to the first token, between two tokens and for the whole call; 0 disables a deadline
+    ttft: float = AGENT_TTFT_SECONDS
+    idle: float = AGENT_IDLE_SECONDS
+    total: float = AGENT_TOTAL_SECONDS
+
+
+def parse_agent_deadlines(spec: str) -> Dict[str, Deadlines]:
+    """
+    Parse "Search Agent=30/20/120,Deep Research Agent=300/60/900" into
+    per-agent deadlines (time to first token / idle / total seconds).
+    """
+    deadlines = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, values = entry.rpartition("=")
+        ttft, idle, total = (float(value) for value in values.split("/"))
+        deadlines[name.strip()] = Deadlines(ttft, idle, total)
+    return deadlines
+
+
+_agent_deadlines = parse_agent_deadlines(AGENT_DEADLINES)
+
+
+def deadlines_for(agent_name: str) -> Deadlines:
+    return _agent_deadlines.get(agent_name, Deadlines())
+
+
+def _timeout(at: float) -> Optional[float]:
+    return None if at == math.inf else max(0.0, at - time.monotonic())
+
+
+_END = object()
+
+
+class _Pump:
+    """
+    Reads a stream in a task of its own into a queue. Each stream is iterated
+    in one task from start to end, since the SDK's streamed runs reset
+    context variables when they end, and stopping the stream is a matter of
+    cancelling the task.
+    """
+
+    def __init__(self, start: Callable[[], AsyncIterator]):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.held: list = []
+        self.task = asyncio.create_task(self._run(start))
+
+    async def _run(self, start: Callable[[], AsyncIterator]):
+        try:
+            async for event in start():
+                self.queue.put_nowait((event, None))
+            self.queue.put_nowait((_END, None))
+        except Exception as e:
+            self.queue.put_nowait((_END, e))
+
+    async def close(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+async def stream_with_deadlines(
+    start: Callable[[], AsyncIterator],
+    is_token: Callable[[object], bool],
+    deadlines: Deadlines,
+    hedge: Optional[Callable[[], AsyncIterator]] = None,
+) -> AsyncIterator:
+    """
+    Yield the events of the stream `start()` returns, raising DeadlineExceeded
+    when its first token, the next token or its end doesn't arrive in time.
+
+    With `hedge`, a missed time-to-first-token deadline starts a duplicate
+    stream with `hedge()` instead of failing: the events of whichever stream
+    produces a token first are yielded and the other stream is stopped.
+    Events that precede the first token are held back until a stream wins.
+    """
+    now = time.monotonic()
+    total_at = now + deadlines.total if deadlines.total else math.inf
+    ttft_at = now + deadlines.ttft if deadlines.ttft else math.inf
+    pumps: List[_Pump] = [_Pump(start)]
+    reads: Dict[asyncio.Future, _Pump] = {}
+    winner = None
+    try:
+        while winner is None:
+            reading = set(reads.values())
+            for pump in pumps:
+                if pump not in reading:
+                    reads[asyncio.ensure_future(pump.queue.get())] = pump
+            done, _ = await asyncio.wait(reads, timeout=_timeout(min(ttft_at, total_at)),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if time.monotonic() >= total_at:
+                    raise DeadlineExceeded("total", deadlines.total)
+                if hedge is None or len(pumps) > 1:
+                    raise DeadlineExceeded("time to first token", deadlines.ttft)
+                pumps.append(_Pump(hedge))
+                ttft_at = time.monotonic() + deadlines.ttft
+                continue
+            for read in done:
+                pump = reads.pop(read)
+                event, error = read.result()
+                if error is not None:
+                    pumps.remove(pump)
+                    if not pumps:
+                        raise error
+                    continue
+                pump.held.append(event)
+                # A stream that ends without any token still completed.
+                if event is _END or is_token(event):
+                    winner = pump
+                    break
+
+        for read in reads:
+            read.cancel()
+        reads.clear()
+        for pump in pumps:
+            if pump is not winner:
+                await pump.close()
+        pumps = [winner]
+        for event in winner.held:
+            if event is _END:
+                return
+            yield event
+        while True:
+            idle_at = time.monotonic() + deadlines.idle if deadlines.idle else math.inf
+            try:
+                event, error = await asyncio.wait_for(winner.queue.get(), _timeout(min(idle_at, total_at)))
+            except asyncio.TimeoutError:
+                if total_at <= idle_at:
+                    raise DeadlineExceeded("total", deadlines.total)
+                raise DeadlineExceeded("idle", deadlines.idle)
+            if error is not None:
+                raise error
+            if event is _END:
+                return
+            yield event
+    finally:
+        for read in reads:
+            read.cancel()
+        for pump in pumps:
+            await pump.close()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator, Optional
+
+_STREAM_END = object()
+
+
+class BackgroundLoop:
+    """
+    A long-lived asyncio event loop running in a daemon thread.
+
+    Web requests submit their coroutines to this loop instead of creating a
+    loop of their own, so every in-flight research run in a process shares one
+    loop and the AsyncOpenAI connection pools bound to it. The loop starts on
+    first use and is recreated in a forked child, since threads don't survive
+    a fork.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name="research-loop", daemon=True).start()
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and block the calling thread for its result.
+        """
+        return self.submit(coro).result(timeout)
+
+    def iterate(
+        self,
+        async_gen_factory: Callable[[], AsyncIterator],
+        heartbeat: float,
+    ) -> Iterator[Optional[Any]]:
+        """
+        Run an async generator on the loop and yield its items to the calling
+        thread as they arrive, or None after `heartbeat` seconds without one.
+        Closing this generator cancels the async generator.
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in async_gen_factory():
+                    items.put(item)
+            except Exception as e:
+                print(f"❌ Stream failed: {e}")
+            finally:
+                items.put(_STREAM_END)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+                    continue
+                if item is _STREAM_END:
+                    break
+                yield item
+        finally:
+            # Cancelling the concurrent future cancels the task on the loop.
+            future.cancel()
+
+
+shared_loop = BackgroundLoop()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Set
+
+from octagon_web_demo.batch import CompanyResult, run_batch
+from octagon_web_demo.event_loop import BackgroundLoop
+from octagon_web_demo.storage import write_atomic
+from octagon_web_demo.config import JOB_MAX_FINISHED, JOB_QUEUE_MAX, JOB_WORKERS, JOBS_DIR, RESEARCH_CONCURRENCY
+
+if TYPE_CHECKING:
+    from octagon_web_demo.pipeline import ResearchPipeline
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    # One entry per company: name, website, status, path and error
+    companies: List[Dict[str, Optional[str]]]
+    cache_policy: str
+    # Update the reports of companies researched before instead of starting over
+    refresh_reports: bool = False
+    # Run ID the job's reports are indexed under, known once it starts
+    run_id: Optional[str] = None
+    status: str = QUEUED
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobQueue:
+    """
+    In-process queue of research jobs, processed by worker tasks on a shared
+    event loop.
+
+    A job runs independently of the HTTP request that submitted it, so it
+    survives browser disconnects. Its state is written to `<jobs_dir>/<id>.json`
+    on every change, without blocking the event loop, so any worker process
+    can report on it and finished jobs can still be looked up after a restart.
+    Only the `max_finished` most recently finished jobs are also kept in
+    memory; older ones are read back from their state files.
+    """
+
+    def __init__(
+        self,
+        loop: BackgroundLoop,
+        pipeline_factory: Callable[[str, bool], ResearchPipeline],
+        workers: int = JOB_WORKERS,
+        max_depth: int = JOB_QUEUE_MAX,
+        jobs_dir: str = JOBS_DIR,
+        concurrency: int = RESEARCH_CONCURRENCY,
+        max_finished: int = JOB_MAX_FINISHED,
+    ):
+        self.loop = loop
+        self.pipeline_factory = pipeline_factory
+        self.workers = workers
+        self.max_depth = max_depth
+        self.jobs_dir = jobs_dir
+        self.concurrency = concurrency
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Job] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._finished: Deque[str] = deque()
+        # Jobs with a state change not yet written, and the tasks writing them
+        self._dirty: Set[str] = set()
+        self._saving: Dict[str, asyncio.Task] = {}
+        self._queue: Optional[asyncio.Queue] = None
+
+    def submit(self, companies: List[Dict[str, str]], cache_policy: str, refresh_reports: bool = False) -> Job:
+        """
+        Queue a job researching `companies`. Raises JobQueueFull when
+        `max_depth` jobs are already waiting.
+        """
+        job = Job(
+            id=uuid.uuid4().hex,
+            companies=[
+                {"name": company["name"], "website": company.get("website"), "status": "pending",
+                 "path": None, "error": None}
+                for company in companies
+            ],
+            cache_policy=cache_policy,
+            refresh_reports=refresh_reports,
+        )
+        self.loop.run(self._enqueue(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        # Jobs owned by another worker process, or by a previous run of this one
+        try:
+            with open(self._path(job_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def watch(self, job_id: str):
+        """
+        Yield the job's state now and again after every change until it finishes.
+        """
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            changed = self._changed.get(job_id)
+            yield job
+            if job["status"] == FINISHED or changed is None:
+                return
+            await changed.wait()
+
+    async def _enqueue(self, job: Job):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_depth)
+            for _ in range(self.workers):
+                asyncio.create_task(self._worker())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"{self.max_depth} jobs are already queued")
+        self._jobs[job.id] = job
+        self._changed[job.id] = asyncio.Event()
+        # Written before /run answers, so every worker process can look the job up.
+        await self._save(job.to_dict())
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+            finally:
+                job.status = FINISHED
+                job.finished = time.time()
+                self._update(job)
+                self._finished.append(job.id)
+                self._evict()
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = RUNNING
+        job.started = time.time()
+        self._update(job)
+
+        def on_start(index: int, company: dict):
+            job.companies[index]["status"] = "running"
+            self._update(job)
+
+        def on_result(result: CompanyResult):
+            job.companies[result.index].update(status=result.status, path=result.path, error=result.error)
+            self._update(job)
+
+        # Off the event loop: the first pipeline of a process imports the agents SDK.
+        pipeline = await asyncio.to_thread(self.pipeline_factory, job.cache_policy, job.refresh_reports)
+        job.run_id = pipeline.store.run_id
+        self._update(job)
+        await run_batch(pipeline, job.companies, self.concurrency, on_result=on_result, on_start=on_start)
+
+    def _update(self, job: Job):
+        self._dirty.add(job.id)
+        if job.id not in self._saving:
+            self._saving[job.id] = asyncio.create_task(self._flush(job))
+        # Wake every watcher, then arm a fresh event for the next change.
+        self._changed[job.id].set()
+        self._changed[job.id] = asyncio.Event()
+
+    async def _flush(self, job: Job):
+        # One writer per job, writing its latest state until no change is left,
+        # so writes never land out of order and bursts of changes are coalesced.
+        try:
+            while job.id in self._dirty:
+                self._dirty.discard(job.id)
+                try:
+                    await self._save(job.to_dict())
+                except OSError as e:
+                    print(f"⚠️ Could not save job {job.id}: {e}")
+        finally:
+            del self._saving[job.id]
+        self._evict()
+
+    def _evict(self):
+        # Jobs still being written stay until their state file is up to date.
+        kept = deque()
+        while len(self._finished) + len(kept) > self.max_finished and self._finished:
+            job_id = self._finished.popleft()
+            if job_id in self._saving:
+                kept.append(job_id)
+                continue
+            del self._jobs[job_id]
+            del self._changed[job_id]
+        self._finished.extendleft(reversed(kept))
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{os.path.basename(job_id)}.json")
+
+    async def _save(self, state: dict):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        await write_atomic(self._path(state["id"]), json.dumps(state))
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+from typing import Any, Dict, Optional
+
+# Stage recorded once a company is finished, holding its report path and status.
+DONE_STAGE = "done"
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of the stages each company has completed in a
+    batch run, and what those stages produced.
+
+    Every line is one completed stage: {"company", "stage", "value", "at"}.
+    Loading a journal replays the lines in order, so the last value recorded
+    for a stage wins and a partially written trailing line is ignored.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        # Where an unfinished journal at `path` was moved, when not resuming
+        self.previous: Optional[str] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume:
+            self._load()
+        else:
+            self.previous = start_journal(path)
+
+    def company(self, key: str) -> "CompanyCheckpoint":
+        return CompanyCheckpoint(self, key)
+
+    def is_done(self, key: str) -> bool:
+        return DONE_STAGE in self._stages.get(key, {})
+
+    def completed_stages(self, key: str) -> Dict[str, Any]:
+        return self._stages.get(key, {})
+
+    def record(self, key: str, stage: str, value: Any):
+        self._stages.setdefault(key, {})[stage] = value
+        line = json.dumps({"company": key, "stage": stage, "value": value, "at": time.time()}) + "\n"
+        # One O_APPEND write per line, so worker processes can share a journal without interleaving lines.
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The process died while writing this line.
+                    continue
+                self._stages.setdefault(entry["company"], {})[entry["stage"]] = entry["value"]
+
+
+def start_journal(path: str) -> Optional[str]:
+    """
+    Start a new journal at `path`. A journal there with unfinished companies
+    is moved to `<name>.<its last write time>.jsonl` rather than lost, and
+    the new path is returned; a journal of a finished run is emptied.
+    """
+    previous = RunJournal(path, resume=True) if os.path.exists(path) else None
+    if previous is not None and any(DONE_STAGE not in stages for stages in previous._stages.values()):
+        base, ext = os.path.splitext(path)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(os.path.getmtime(path)))
+        kept = f"{base}.{stamp}{ext}"
+        os.replace(path, kept)
+        open(path, "w").close()
+        return kept
+    open(path, "w").close()
+    return None
+
+
+def journal_kept_message(kept: str) -> str:
+    return f"🗄️ The previous, unfinished run's journal was moved to {kept} (continue it with --journal {kept} --resume)"
+
+
+class CompanyCheckpoint:
+    """
+    The journal entries of a single company, as seen by ResearchPipeline.
+    """
+
+    def __init__(self, journal: RunJournal, key: str):
+        self.journal = journal
+        self.key = key
+
+    def has(self, stage: str) -> bool:
+        return stage in self.journal.completed_stages(self.key)
+
+    def get(self, stage: str) -> Optional[Any]:
+        return self.journal.completed_stages(self.key).get(stage)
+
+    def record(self, stage: str, value: Any):
+        self.journal.record(self.key, stage, value)
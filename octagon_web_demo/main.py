@@ -1,56 +1,165 @@
 from __future__ import annotations
 
+import os
 import asyncio
 import argparse
+from typing import TYPE_CHECKING
 
-from octagon_web_demo.utils import load_template, read_companies_from_csv
-from octagon_web_demo.pipeline import ResearchPipeline
-from octagon_web_demo.config import TEMPLATE_PATH, CSV_PATH
-from octagon_web_demo.agents import search_agent, deep_research_agent, companies_agent, funding_agent, report_agent, judge_agent
+from octagon_web_demo.utils import iter_companies_from_csv, parse_shard, report_template
+from octagon_web_demo.modes import GATHER_MODES, JUDGE_MODES, REPORT_MODES
+from octagon_web_demo.batch import run_batch, results_writer
+from octagon_web_demo.cache import ResponseCache
+from octagon_web_demo.journal import RunJournal, journal_kept_message
+from octagon_web_demo.storage import ReportStore
+from octagon_web_demo.snapshots import SnapshotStore
+from octagon_web_demo.tracing import Tracer, null_tracer
+from octagon_web_demo.archive import ARCHIVE_FORMATS, bundle_run
+from octagon_web_demo.config import (
+    CSV_PATH, REPORTS_DIR, CACHE_POLICY, GATHER_MODE, REPORT_MODE, RESEARCH_CONCURRENCY, TRACE_PATH,
+    RELEVANCE_FILTER, JUDGE_MODE, DEBUG_SNAPSHOTS, REFRESH_REPORTS, REPORT_BUNDLE,
+)
 
-# === Templates & CSV Input ===
-md_template = load_template(TEMPLATE_PATH)
+# The pipeline and the agents import the openai and agents packages, which
+# take seconds, so they are imported when a run starts rather than for --help.
+if TYPE_CHECKING:
+    from octagon_web_demo.pipeline import ResearchPipeline
 
 
-# === Entry Point ===
-async def async_main(csv_path=None):
-    pipeline = ResearchPipeline(
-        search_agent=search_agent,
-        companies_agent=companies_agent,
-        funding_agent=funding_agent,
-        deep_research_agent=deep_research_agent,
-        report_agent=report_agent,
-        judge_agent=judge_agent,
-        template=md_template
+def default_journal_path(csv_path: str) -> str:
+    csv_name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(REPORTS_DIR, f"journal_{csv_name}.jsonl")
+
+
+def build_pipeline(gather_mode=GATHER_MODE, report_mode=REPORT_MODE, cache_policy=CACHE_POLICY,
+                   tracer=None, relevance_filter=RELEVANCE_FILTER, judge_mode=JUDGE_MODE,
+                   debug_snapshots=DEBUG_SNAPSHOTS, run_id=None, refresh_reports=REFRESH_REPORTS) -> ResearchPipeline:
+    from octagon_web_demo.agents import research_agents
+    from octagon_web_demo.pipeline import ResearchPipeline
+
+    return ResearchPipeline(
+        **research_agents(),
+        template=report_template(),
+        gather_mode=gather_mode,
+        report_mode=report_mode,
+        cache=ResponseCache(policy=cache_policy),
+        tracer=tracer or null_tracer,
+        relevance_filter=relevance_filter,
+        judge_mode=judge_mode,
+        store=ReportStore(debug_snapshots=debug_snapshots, run_id=run_id),
+        snapshots=SnapshotStore() if refresh_reports else None,
     )
+
+
+# === Entry Point ===
+async def async_main(csv_path=None, concurrency=RESEARCH_CONCURRENCY, results_path=None, gather_mode=GATHER_MODE,
+                     report_mode=REPORT_MODE, cache_policy=CACHE_POLICY, journal_path=None, resume=False,
+                     trace_path=TRACE_PATH, shard=(0, 1), relevance_filter=RELEVANCE_FILTER, judge_mode=JUDGE_MODE,
+                     debug_snapshots=DEBUG_SNAPSHOTS, refresh_reports=REFRESH_REPORTS, bundle=REPORT_BUNDLE):
+    tracer = Tracer(path=trace_path or None)
+    pipeline = build_pipeline(gather_mode, report_mode, cache_policy, tracer, relevance_filter, judge_mode,
+                              debug_snapshots, refresh_reports=refresh_reports)
     # Use provided csv_path or fall back to config CSV_PATH
     path_to_use = csv_path or CSV_PATH
-    companies = read_companies_from_csv(path_to_use)
-    
-    for company in companies:
-        try:
-            company_name = company["name"]
-            website = company.get("website")
-            print(f"\nStarting Octagon Private Markets Research for: {company_name}")
-            if website:
-                prompt = f"Get all available data for this company: {website}"
-                filename_hint = website.replace("https://", "").replace("http://", "").split("/")[0]
-            else:
-                prompt = f"Get all available data for this company: {company_name}"
-                filename_hint = company_name
-            await pipeline.run(prompt, filename_hint)
-        except Exception as e:
-            print(f"Failed to process {company_name}: {e}")
+    # Companies are read lazily, so research starts while a large CSV is still being read.
+    companies = iter_companies_from_csv(path_to_use, *shard)
+
+    journal = RunJournal(journal_path or default_journal_path(path_to_use), resume=resume)
+    print(f"🗒️ Run journal: {journal.path}{' (resuming)' if resume else ''}")
+    if journal.previous:
+        print(journal_kept_message(journal.previous))
+    print(f"🆔 Run ID: {pipeline.store.run_id}")
+    summary = await run_batch(pipeline, companies, concurrency, on_result=results_writer(results_path),
+                              journal=journal)
+    print(summary.format())
+    print(pipeline.report_stats.format())
+    if pipeline.relevance:
+        print(pipeline.relevance.stats.format())
+    if pipeline.snapshots:
+        print(pipeline.refresh_stats.format())
+    print(tracer.summary())
+    if trace_path:
+        print(f"🧵 Spans written to: {trace_path}")
+    if bundle:
+        bundle_path = bundle_run(pipeline.store.run_id, bundle)
+        print(f"📦 Reports bundled in: {bundle_path}" if bundle_path else "📦 No reports to bundle")
+    return summary
 
 def cli():
     """Command line interface entry point"""
     parser = argparse.ArgumentParser(description='Octagon Research Tool')
     parser.add_argument('--csv', '-c', dest='csv_path', 
                         help='Path to the input CSV file containing companies to research')
+    parser.add_argument('--concurrency', '-n', type=int, default=RESEARCH_CONCURRENCY,
+                        help='Number of companies to research at the same time '
+                             '(default: RESEARCH_CONCURRENCY or %(default)s)')
+    parser.add_argument('--results', dest='results_path',
+                        help='Append one JSON line per finished company to this file')
+    parser.add_argument('--gather', dest='gather_mode', choices=GATHER_MODES, default=GATHER_MODE,
+                        help='Fetch the data sources of a company in parallel or one after another '
+                             '(default: GATHER_MODE or %(default)s)')
+    parser.add_argument('--report-mode', dest='report_mode', choices=REPORT_MODES, default=REPORT_MODE,
+                        help='Synthesize the report after every source (incremental), from only the newly '
+                             'accepted source (delta), once from all data (single) or section by section in '
+                             'parallel (sections) '
+                             '(default: REPORT_MODE or %(default)s)')
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--no-cache', dest='cache_policy', action='store_const', const='bypass',
+                             help='Neither read nor write the agent response cache')
+    cache_group.add_argument('--refresh-cache', dest='cache_policy', action='store_const', const='refresh',
+                             help='Re-query every agent and overwrite the cached responses')
+    parser.set_defaults(cache_policy=CACHE_POLICY)
+    parser.add_argument('--journal', dest='journal_path',
+                        help='Run journal recording the completed stages of every company '
+                             '(default: journal_<csv name>.jsonl in the reports directory)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip companies finished in the journal and continue the others '
+                             'from their last completed stage')
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1), metavar='I/N',
+                        help='Only research the companies in shard I of N (0-based), so N processes or '
+                             'machines can split one CSV')
+    parser.add_argument('--trace', dest='trace_path', default=TRACE_PATH,
+                        help='Append one OpenTelemetry-shaped JSON span per pipeline stage to this file '
+                             '(default: TRACE_PATH)')
+    parser.add_argument('--judge-mode', dest='judge_mode', choices=JUDGE_MODES, default=JUDGE_MODE,
+                        help='Have the Judge Agent return the IDs of the relevant sections (structured) or echo '
+                             'the relevant data back (text) (default: JUDGE_MODE or %(default)s)')
+    prefilter_group = parser.add_mutually_exclusive_group()
+    prefilter_group.add_argument('--prefilter', dest='relevance_filter', action='store_true',
+                                 help='Decide clear-cut judge cases with the local relevance pre-filter instead of '
+                                      'sending every one to the Judge Agent (default: RELEVANCE_FILTER)')
+    prefilter_group.add_argument('--no-prefilter', dest='relevance_filter', action='store_false',
+                                 help='Send every judge decision to the Judge Agent')
+    parser.set_defaults(relevance_filter=RELEVANCE_FILTER)
+    parser.add_argument('--no-debug-snapshots', dest='debug_snapshots', action='store_false',
+                        default=DEBUG_SNAPSHOTS,
+                        help='Don\'t save a debug copy of the report after every accepted source')
+    parser.add_argument('--refresh-reports', dest='refresh_reports', action='store_true', default=REFRESH_REPORTS,
+                        help='Update the reports of companies researched before instead of starting over: only '
+                             'sources whose data changed are judged and only the report sections they affect '
+                             'are rewritten (default: REFRESH_REPORTS)')
+    parser.add_argument('--bundle', choices=ARCHIVE_FORMATS, default=REPORT_BUNDLE or None,
+                        help='Also archive the reports of this run as run_<run ID>.zip or .tar.gz in the '
+                             'reports directory (default: REPORT_BUNDLE)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Split the companies across this many worker processes, each researching '
+                             '--concurrency companies at a time (default: %(default)s)')
     args = parser.parse_args()
-    
+
+    if args.workers > 1:
+        from octagon_web_demo.workers import run_workers
+
+        csv_path = args.csv_path or CSV_PATH
+        run_workers(args.workers, csv_path, args.concurrency, args.results_path, args.gather_mode,
+                    args.report_mode, args.cache_policy, args.journal_path or default_journal_path(csv_path),
+                    args.resume, args.trace_path, args.shard, args.relevance_filter, args.judge_mode,
+                    args.debug_snapshots, args.refresh_reports, args.bundle)
+        return
+
     # Don't set environment variable, just pass the argument directly
-    asyncio.run(async_main(args.csv_path))
+    asyncio.run(async_main(args.csv_path, args.concurrency, args.results_path, args.gather_mode,
+                           args.report_mode, args.cache_policy, args.journal_path, args.resume,
+                           args.trace_path, args.shard, args.relevance_filter, args.judge_mode,
+                           args.debug_snapshots, args.refresh_reports, args.bundle))
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+import openai
+from agents.agent_output import AgentOutputSchema
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails
+
+from octagon_web_demo.config import (
+    MOCK_ERROR_RATE,
+    MOCK_LATENCY_SECONDS,
+    MOCK_OUTPUT_TOKENS,
+    MOCK_SEED,
+    MOCK_TOKENS_PER_SECOND,
+)
+
+_WORDS = (
+    "revenue growth customers platform market funding round investors product team enterprise "
+    "expansion valuation partnership launch pipeline margin acquisition segment strategy"
+).split()
+# Like OpenAI's prompt caching, prompt prefixes of at least 1024 tokens are cached, in 128 token steps
+_CACHE_MIN_TOKENS = 1024
+_CACHE_BLOCK_TOKENS = 128
+
+
+class MockModel(Model):
+    """
+    Offline stand-in for the Octagon and OpenAI models.
+
+    Answers with synthetic text after `latency` seconds and streams it word by
+    word at `tokens_per_second` (0 streams as fast as possible). A call fails
+    with a connection error, before producing any output, with probability
+    `error_rate`. Outputs and failures are derived from the seed and the
+    input, so a benchmark run is reproducible. Input tokens are reported as
+    cached when the prompt starts with the same 1024 or more tokens as an
+    earlier prompt to this model, as with provider prompt caching.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        latency: float = MOCK_LATENCY_SECONDS,
+        tokens_per_second: float = MOCK_TOKENS_PER_SECOND,
+        output_tokens: int = MOCK_OUTPUT_TOKENS,
+        error_rate: float = MOCK_ERROR_RATE,
+        seed: int = MOCK_SEED,
+    ):
+        self.model = model
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.seed = seed
+        self._attempts = {}
+        self._prefixes = set()
+
+    async def get_response(self, system_instructions: Optional[str], input: Any, model_settings, tools,
+                           output_schema: Optional[AgentOutputSchema], handoffs, tracing) -> ModelResponse:
+        rng = self._rng(system_instructions, input)
+        await asyncio.sleep(self.latency)
+        self._maybe_fail(rng)
+        text = self._text(rng, input, output_schema)
+        await asyncio.sleep(len(text.split()) / self.tokens_per_second if self.tokens_per_second else 0)
+        response = self._response(text, input, self._cached_tokens(system_instructions, input))
+        return ModelResponse(
+            output=response.output,
+            usage=Usage(
+                requests=1,
+                input_tokens=response.usage.input_tokens,
+                output_tokens=response.usage.output_tokens,
+                total_tokens=response.usage.total_tokens,
+            ),
+            referenceable_id=None,
+        )
+
+    async def stream_response(self, system_instructions: Optional[str], input: Any, model_settings, tools,
+                              output_schema: Optional[AgentOutputSchema], handoffs, tracing) -> AsyncIterator:
+        rng = self._rng(system_instructions, input)
+        await asyncio.sleep(self.latency)
+        self._maybe_fail(rng)
+        text = self._text(rng, input, output_schema)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for word in text.split(" "):
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta", item_id="mock", output_index=0, content_index=0, delta=word + " "
+            )
+            await asyncio.sleep(delay)
+        response = self._response(text, input, self._cached_tokens(system_instructions, input))
+        yield ResponseCompletedEvent.model_construct(type="response.completed", response=response)
+
+    def _rng(self, system_instructions: Optional[str], input: Any) -> random.Random:
+        # Retries of the same request draw again, so an error isn't repeated forever.
+        key = hashlib.sha256(json.dumps([self.model, system_instructions, input], default=str).encode()).hexdigest()
+        attempt = self._attempts.get(key, 0)
+        self._attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def _cached_tokens(self, system_instructions: Optional[str], input: Any) -> int:
+        """
+        Count the leading blocks of the prompt seen in earlier prompts, and
+        remember this prompt's blocks.
+        """
+        prompt = json.dumps([system_instructions, input], default=str)
+        block = _CACHE_BLOCK_TOKENS * 4
+        cached = 0
+        for end in range(block, len(prompt) + 1, block):
+            digest = hashlib.blake2b(prompt[:end].encode(), digest_size=16).digest()
+            if digest in self._prefixes and cached == end - block:
+                cached = end
+            self._prefixes.add(digest)
+        return cached // 4 if cached >= _CACHE_MIN_TOKENS * 4 else 0
+
+    def _maybe_fail(self, rng: random.Random):
+        if rng.random() < self.error_rate:
+            raise openai.APIConnectionError(request=httpx.Request("POST", f"http://mock/{self.model}"))
+
+    def _text(self, rng: random.Random, input: Any, output_schema: Optional[AgentOutputSchema]) -> str:
+        if output_schema is not None and not output_schema.is_plain_text():
+            return json.dumps(self._from_schema(rng, output_schema.json_schema()))
+        if '"decision"' in (input if isinstance(input, str) else str([item.get("content") for item in input])):
+            return json.dumps({"decision": True, "selected_data": self._words(rng, self.output_tokens // 4)})
+        sections = ["Company Overview", "Products", "Funding", "Market"]
+        per_section = max(1, self.output_tokens // len(sections))
+        body = "\n\n".join(f"## {section}\n{self._words(rng, per_section)}[^{i}]" for i, section in
+                           enumerate(sections, 1))
+        return f"# Report from {self.model}\n\n{body}"
+
+    def _from_schema(self, rng: random.Random, schema: dict) -> Any:
+        """
+        Synthesize a value matching a (strict, non-recursive) JSON schema.
+        """
+        kind = schema.get("type")
+        if kind == "object":
+            return {name: self._from_schema(rng, prop) for name, prop in schema.get("properties", {}).items()}
+        if kind == "array":
+            return [self._from_schema(rng, schema.get("items", {})) for _ in range(rng.randint(1, 3))]
+        if kind == "boolean":
+            return True
+        if kind == "integer":
+            return rng.randint(1, 3)
+        if kind == "number":
+            return rng.random()
+        return self._words(rng, 5)
+
+    def _words(self, rng: random.Random, count: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(count))
+
+    def _response(self, text: str, input: Any, cached_tokens: int = 0) -> Response:
+        input_tokens = len(json.dumps(input, default=str)) // 4
+        output_tokens = len(text.split())
+        message = ResponseOutputMessage.model_construct(
+            id="mock",
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[ResponseOutputText.model_construct(type="output_text", text=text, annotations=[])],
+        )
+        usage = ResponseUsage.model_construct(
+            input_tokens=input_tokens,
+            input_tokens_details=InputTokensDetails.model_construct(cached_tokens=min(cached_tokens, input_tokens)),
+            output_tokens=output_tokens,
+            total_tokens=input_tokens + output_tokens,
+        )
+        return Response.model_construct(id="mock", model=self.model, output=[message], usage=usage)
@@ -0,0 +1,16 @@
+# Pipeline modes, kept apart from the pipeline so the CLI can list them
+# without importing the agents SDK.
+
+GATHER_MODES = ("parallel", "sequential")
+
+# "structured" has the judge return section IDs through schema-constrained output,
+# "text" has it echo the selected data back as free-form JSON.
+JUDGE_MODES = ("structured", "text")
+
+# "incremental" re-synthesizes the report from all collected data after every source,
+# "delta" sends only the newly accepted source plus the current report,
+# "single" collects all judged data first and calls the Report Agent once,
+# "sections" collects all judged data first and generates every template section in parallel.
+REPORT_MODES = ("incremental", "delta", "single", "sections")
+# Modes that write the report once, after all sources are collected
+ONE_PASS_REPORT_MODES = ("single", "sections")
@@ -1,25 +1,145 @@
 from __future__ import annotations
 
+import os
 import json
 import re
-from typing import Union
+import time
+import asyncio
+import contextlib
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from dataclasses import dataclass
 
-from agents import Agent, Runner
-from openai.types.responses import ResponseTextDeltaEvent
+from agents import Agent, AgentsException, RunResultStreaming, Runner
+from pydantic import BaseModel
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
 
 from octagon_web_demo.utils import (
+    TokenUsage,
+    build_deep_research_query,
+    build_fallback_report,
     build_llm_report_input,
-    extract_report_text,
-    generate_report_path,
-    save_report
+    format_collected_data,
+    model_name,
+    is_fallback_report,
 )
+from octagon_web_demo.cache import ResponseCache
+from octagon_web_demo.journal import CompanyCheckpoint
+from octagon_web_demo.deadlines import DEADLINE_ACTIONS, DeadlineExceeded, deadlines_for, stream_with_deadlines
+from octagon_web_demo.budget import ContextBudget, TrimStats, count_tokens, same_content
+from octagon_web_demo.storage import DEBUG, FALLBACK, FINAL, ReportDraft, ReportStore
+from octagon_web_demo.snapshots import CompanySnapshot, RefreshStats, SnapshotStore, SourceSnapshot, content_hash
+from octagon_web_demo.tracing import Span, Tracer, null_tracer
+from octagon_web_demo.stream_buffer import ConsoleBatcher, StreamBuffer
+from octagon_web_demo.relevance import ACCEPT, ESCALATE, RelevanceFilter
+from octagon_web_demo.sections import (
+    TemplateSection,
+    assemble_report,
+    build_section_input,
+    parse_template,
+    relevant_data,
+    split_report,
+)
+from octagon_web_demo.ratelimit import RateLimiter, estimate_tokens, rate_limiter as shared_rate_limiter
+from octagon_web_demo.modes import GATHER_MODES, JUDGE_MODES, ONE_PASS_REPORT_MODES, REPORT_MODES
+from octagon_web_demo.config import DEADLINE_ACTION, GATHER_MODE, JUDGE_MODE, RELEVANCE_FILTER, REPORT_MODE
+
+# Data sources in the order they are merged into the report:
+# (collected_data key, agent label, whether the judge screens the data)
+SOURCES = (
+    ("search", "Search Agent", False),
+    ("companies", "Companies Agent", True),
+    ("funding", "Funding Agent", True),
+    ("deep_research", "Deep Research Agent", False),
+)
+
+_STREAM_DONE = object()
+
+
+class JudgeVerdict(BaseModel):
+    decision: bool
+    section_ids: List[int]
+
+
+def split_sections(data: str) -> List[str]:
+    """
+    Split source data into the blank-line separated sections the structured
+    judge refers to by number.
+    """
+    return [section.strip() for section in re.split(r"\n\s*\n", data.strip()) if section.strip()]
+
+
+async def _gather_or_cancel(coros: Iterable[Awaitable]) -> List:
+    """
+    Like asyncio.gather, but cancels the remaining awaitables when one fails.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 @dataclass
 class JudgeOutput:
     decision: bool
     selected_data: Union[str, dict]
 
+async def _stream_events(run_stream: RunResultStreaming):
+    """
+    Iterate over a streamed run's events. RunResultStreaming.stream_events ends
+    quietly when it is cancelled, so re-raise the cancellation here rather than
+    let a cut-off stream pass for a complete output.
+    """
+    async for event in run_stream.stream_events():
+        yield event
+    if not run_stream.is_complete:
+        raise asyncio.CancelledError()
+
+
+def _is_text_delta(event) -> bool:
+    return event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent)
+
+
+@dataclass
+class ReportStats:
+    """
+    Token and latency totals of the Report Agent calls made by a pipeline.
+    """
+    mode: str
+    calls: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    seconds: float = 0.0
+    # Collected data tokens cut by the context budget
+    trimmed_tokens: int = 0
+
+    def record(self, usage: TokenUsage, seconds: float):
+        self.calls += 1
+        self.input_tokens += usage.input_tokens
+        self.cached_input_tokens += usage.cached_input_tokens
+        self.output_tokens += usage.output_tokens
+        self.seconds += seconds
+
+    def add(self, other: "ReportStats"):
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.cached_input_tokens += other.cached_input_tokens
+        self.output_tokens += other.output_tokens
+        self.seconds += other.seconds
+        self.trimmed_tokens += other.trimmed_tokens
+
+    def format(self) -> str:
+        cached_share = f"{self.cached_input_tokens / self.input_tokens:.0%}" if self.input_tokens else "n/a"
+        return (
+            f"\n🧮 Report Agent ({self.mode} mode): {self.calls} calls, "
+            f"{self.input_tokens} input ({self.cached_input_tokens} cached, {cached_share}) / "
+            f"{self.output_tokens} output tokens, {self.seconds:.1f}s, "
+            f"{self.trimmed_tokens} data tokens trimmed to the context budget\n"
+        )
+
 class ResearchPipeline:
     def __init__(
         self,
@@ -29,198 +149,440 @@ class ResearchPipeline:
         funding_agent: Agent,
         report_agent: Agent,
         judge_agent: Agent,
-        template: str
+        template: str,
+        gather_mode: str = GATHER_MODE,
+        report_mode: str = REPORT_MODE,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: RateLimiter = shared_rate_limiter,
+        tracer: Tracer = null_tracer,
+        relevance_filter: bool = RELEVANCE_FILTER,
+        judge_mode: str = JUDGE_MODE,
+        store: Optional[ReportStore] = None,
+        deadline_action: str = DEADLINE_ACTION,
+        context_budget: Optional[ContextBudget] = None,
+        snapshots: Optional[SnapshotStore] = None,
     ):
+        if gather_mode not in GATHER_MODES:
+            raise ValueError(f"Unknown gather mode {gather_mode!r}, expected one of {GATHER_MODES}")
+        if report_mode not in REPORT_MODES:
+            raise ValueError(f"Unknown report mode {report_mode!r}, expected one of {REPORT_MODES}")
+        if judge_mode not in JUDGE_MODES:
+            raise ValueError(f"Unknown judge mode {judge_mode!r}, expected one of {JUDGE_MODES}")
+        if deadline_action not in DEADLINE_ACTIONS:
+            raise ValueError(f"Unknown deadline action {deadline_action!r}, expected one of {DEADLINE_ACTIONS}")
         self.search_agent = search_agent
         self.companies_agent = companies_agent
         self.funding_agent = funding_agent
         self.deep_research_agent = deep_research_agent
         self.report_agent = report_agent
         self.judge_agent = judge_agent
+        self.judge_mode = judge_mode
+        self._structured_judge_agent = judge_agent.clone(output_type=JudgeVerdict)
         self.template = template
+        self.gather_mode = gather_mode
+        self.report_mode = report_mode
+        self.report_stats = ReportStats(mode=report_mode)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.tracer = tracer
+        self.relevance = RelevanceFilter() if relevance_filter else None
+        self.store = store or ReportStore()
+        self.deadline_action = deadline_action
+        self.context_budget = context_budget or ContextBudget(template)
+        # With snapshots, companies researched before are refreshed rather than researched again.
+        self.snapshots = snapshots
+        self.refresh_stats = RefreshStats()
 
-    async def run(self, query: str, filename_hint: str) -> str:
+    async def run(self, query: str, filename_hint: str, checkpoint: Optional[CompanyCheckpoint] = None) -> str:
         print(f"\n🔍 Query: {query}")
         print(f"📝 Template Preview:\n{self.template[:300]}...\n")
+        return await self._research(query, filename_hint, checkpoint=checkpoint)
+
+    async def run_streamed(self, query: str, filename_hint: str):
+        # The research runs as a task that pushes progress messages onto a queue,
+        # so agent output can be forwarded while other sources are still running.
+        queue = asyncio.Queue()
+        task = asyncio.create_task(self._research(query, filename_hint, emit=queue.put_nowait))
+        task.add_done_callback(lambda _: queue.put_nowait(_STREAM_DONE))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is _STREAM_DONE:
+                    break
+                yield chunk
+            report_path = task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        if await is_fallback_report(report_path):
+            yield "\n⚠️ No valid data found. Fallback report saved.\n"
+        else:
+            yield f"\n✅ Finished {filename_hint}\n"
+        yield f"[DOWNLOAD_LINK]:/download/reports/{report_path.split('/')[-1]}"
+
+    async def _research(
+        self,
+        query: str,
+        filename_hint: str,
+        emit: Optional[Callable[[str], None]] = None,
+        checkpoint: Optional[CompanyCheckpoint] = None,
+    ) -> str:
+        """
+        Gather data from every source, judge and merge it into a report, and
+        save the report. Returns the path of the saved report.
+
+        When `emit` is given, progress messages and Deep Research Agent output
+        are passed to it as they are produced. When `checkpoint` is given, every
+        completed stage is recorded to it, and stages it already holds are
+        replayed instead of being run again.
+        """
+        with self.tracer.span("company", **{"research.company": filename_hint}):
+            draft = self.store.draft(filename_hint)
+            try:
+                return await self._research_company(query, filename_hint, emit, checkpoint, draft)
+            finally:
+                if not draft.committed:
+                    draft.discard()
+
+    async def _research_company(
+        self,
+        query: str,
+        filename_hint: str,
+        emit: Optional[Callable[[str], None]],
+        checkpoint: Optional[CompanyCheckpoint],
+        draft: ReportDraft,
+    ) -> str:
+        if self.snapshots:
+            snapshot = await self.snapshots.load(filename_hint)
+            if snapshot is not None:
+                return await self._refresh_company(query, filename_hint, emit, checkpoint, draft, snapshot)
+            self.refresh_stats.new += 1
 
         collected_data = {}
+        fetched_data = {}
         temp_report = ""
+        section_texts = None
 
-        # --- Process Search Agent (no judge) ---
-        search_data = await self._run_agent_streamed(self.search_agent, "Search Agent", query)
-        print(f"\n📦 Search Agent Data:\n{search_data}\n")
-        if not self._is_invalid(search_data):
-            collected_data["search"] = search_data
-            temp_report = await self._update_report(collected_data, temp_report)
-            debug_path = self._save_debug_report(temp_report, filename_hint)
-            print(f"\n📝 Temp Report after Search Agent (debug saved at {debug_path}):\n{temp_report[:500]}...\n")
-        else:
-            print("⚠️ Search agent returned invalid data.")
-
-        # --- Companies Agent ---
-        companies_data = await self._run_agent_streamed(self.companies_agent, "Companies Agent", query)
-        print(f"\n📦 Companies Agent Data:\n{companies_data}\n")
-        if not self._is_invalid(companies_data):
-            if temp_report:
-                judge_result = await self._judge_data(new_data=companies_data, base_report=temp_report)
-                if not judge_result["decision"]:
-                    print("Judge determined Companies Agent data is not relevant. Skipping this data source.")
-                else:
-                    companies_data = judge_result["selected_data"] or companies_data
-                    collected_data["companies"] = companies_data
-                    temp_report = await self._update_report(collected_data, temp_report)
-                    debug_path = self._save_debug_report(temp_report, filename_hint)
-                    print(f"\n📝 Temp Report after Companies Agent (debug saved at {debug_path}):\n{temp_report[:500]}...\n")
+        if self.gather_mode == "parallel":
+            # The data sources don't depend on each other, so fetch them all at once
+            # and only then run the judge and report steps in the usual order.
+            self._notify(emit, f"\n\n🚀 Running {len(SOURCES)} data source agents in parallel...\n")
+            fetched = await _gather_or_cancel(
+                self._fetch_source(key, label, query, emit, checkpoint) for key, label, _ in SOURCES
+            )
+        for index, (key, label, judged) in enumerate(SOURCES):
+            if self.gather_mode == "parallel":
+                data = fetched[index]
             else:
-                collected_data["companies"] = companies_data
-                temp_report = await self._update_report(collected_data, temp_report)
-        else:
-            print("⚠️ Companies agent returned invalid data.")
-
-        # --- Funding Agent ---
-        funding_data = await self._run_agent_streamed(self.funding_agent, "Funding Agent", query)
-        print(f"\n📦 Funding Agent Data:\n{funding_data}\n")
-        if not self._is_invalid(funding_data):
-            if temp_report:
-                judge_result = await self._judge_data(new_data=funding_data, base_report=temp_report)
-                if not judge_result["decision"]:
-                    print("Judge determined Funding Agent data is not relevant. Skipping this data source.")
-                else:
-                    funding_data = judge_result["selected_data"] or funding_data
-                    collected_data["funding"] = funding_data
-                    temp_report = await self._update_report(collected_data, temp_report)
-                    debug_path = self._save_debug_report(temp_report, filename_hint)
-                    print(f"\n📝 Temp Report after Funding Agent (debug saved at {debug_path}):\n{temp_report[:500]}...\n")
+                data = await self._fetch_source(key, label, query, emit, checkpoint)
+            fetched_data[key] = data
+            temp_report = await self._accept_source(
+                key, label, data, judged, collected_data, temp_report, filename_hint, emit, checkpoint, draft
+            )
+
+        if self.report_mode in ONE_PASS_REPORT_MODES and collected_data:
+            if checkpoint and checkpoint.has("report"):
+                temp_report = checkpoint.get("report")
+                section_texts = checkpoint.get("sections")
+            elif self.report_mode == "sections":
+                temp_report, section_texts = await self._generate_sections(
+                    collected_data, self._extract_company_name_from_query(query), emit
+                )
+                if checkpoint:
+                    checkpoint.record("sections", section_texts)
+                    checkpoint.record("report", temp_report)
             else:
-                collected_data["funding"] = funding_data
-                temp_report = await self._update_report(collected_data, temp_report)
-        else:
-            print("⚠️ Funding agent returned invalid data.")
-
-        # --- Deep Research Agent (no judge) ---
-        deep_research_query = (
-            f"Using the following template, collect all the required information to populate it:\n\n"
-            f"For this company: {query}\n\n"
-            f"Here is the template:\n\n"
-            f"{self.template}\n\n"
-        )
-        deep_research_data = await self._run_agent_streamed(self.deep_research_agent, "Deep Research Agent", deep_research_query)
-        print(f"\n📦 Deep Research Agent Data:\n{deep_research_data}\n")
-        if not self._is_invalid(deep_research_data):
-            collected_data["deep_research"] = deep_research_data
-            temp_report = await self._update_report(collected_data, temp_report)
-            debug_path = self._save_debug_report(temp_report, filename_hint)
-            print(f"\n📝 Temp Report after Deep Research Agent (debug saved at {debug_path}):\n{temp_report[:500]}...\n")
-        else:
-            print("⚠️ Deep research agent returned invalid data.")
+                temp_report = await self._update_report(collected_data, temp_report, draft=draft, emit=emit)
+                if checkpoint:
+                    checkpoint.record("report", temp_report)
 
+        sources = {
+            key: SourceSnapshot(content_hash(data), collected_data.get(key, ""), data) for key, data in fetched_data.items()
+        }
+        return await self._finish(query, filename_hint, collected_data, temp_report, draft, sources, section_texts)
+
+    async def _finish(
+        self,
+        query: str,
+        filename_hint: str,
+        collected_data: dict,
+        report: str,
+        draft: ReportDraft,
+        sources: Dict[str, SourceSnapshot],
+        section_texts: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Save the report, or the fallback report when no data was collected,
+        and with snapshots, what it was made from.
+        """
         if not collected_data:
             company_name = self._extract_company_name_from_query(query)
-            fallback_path = generate_report_path(filename_hint)
-            fallback_md = (
-                f"# No Data Found for {company_name}\n\n"
-                "Unfortunately, no meaningful data could be retrieved for this company.\n\n"
-            )
-            save_report(fallback_md, fallback_path)
-            print(f"⚠️ No valid data found. Fallback report saved to: {fallback_path}")
-            return fallback_path
-
-        company_name = extract_report_text(temp_report)
-        report_path = generate_report_path(filename_hint)
-        save_report(temp_report, report_path)
-        print(f"\n✅ Final report saved to: {report_path}")
+            fallback_md = build_fallback_report(company_name)
+            report_path = await self._save(fallback_md, filename_hint, kind=FALLBACK, draft=draft)
+            print(f"⚠️ No valid data found. Fallback report saved to: {report_path}")
+            section_texts = {}
+        else:
+            report_path = await self._save(report, filename_hint, kind=FINAL, draft=draft)
+            print(f"\n✅ Final report saved to: {report_path}")
+
+        if self.snapshots:
+            if section_texts is None:
+                section_texts = split_report(report, parse_template(self.template)[1])
+            await self.snapshots.save(CompanySnapshot(
+                company=filename_hint, sources=sources, sections=section_texts, report_path=report_path,
+            ))
         return report_path
 
-    async def run_streamed(self, query: str, filename_hint: str):
-        # Emit a single starting message.
-        yield f"\nRunning research for: {filename_hint}\n"
+    async def _refresh_company(
+        self,
+        query: str,
+        filename_hint: str,
+        emit: Optional[Callable[[str], None]],
+        checkpoint: Optional[CompanyCheckpoint],
+        draft: ReportDraft,
+        snapshot: CompanySnapshot,
+    ) -> str:
+        """
+        Update the report of a company researched before. Every source is
+        queried again, but only sources whose data changed since `snapshot`
+        are judged, and only the template sections whose relevant data changed
+        are written again. When nothing changed, the previous report is kept.
+        """
+        if self.gather_mode == "parallel":
+            self._notify(emit, f"\n\n🚀 Running {len(SOURCES)} data source agents in parallel...\n")
+            fetched = await _gather_or_cancel(
+                self._fetch_source(key, label, query, emit, checkpoint) for key, label, _ in SOURCES
+            )
+        else:
+            fetched = [await self._fetch_source(key, label, query, emit, checkpoint) for key, label, _ in SOURCES]
+
         collected_data = {}
-        temp_report = ""
-        
-        # --- Execute Search Agent without streaming debug output ---
-        search_data = ""
-        yield "\n\n🚀 Running Search Agent...\n"
-        async for chunk in self._run_agent_streamed_yielding(self.search_agent, query):
-            search_data += chunk
-        if not self._is_invalid(search_data):
-            collected_data["search"] = search_data
-            temp_report = await self._update_report(collected_data, temp_report)
-        
-        # --- Execute Companies Agent ---
-        company_data = ""
-        yield "\n\n🚀 Running Companies Agent...\n"
-        async for chunk in self._run_agent_streamed_yielding(self.companies_agent, query):
-            company_data += chunk
-        if not self._is_invalid(company_data):
-            if temp_report:
-                judge_result = await self._judge_data(new_data=company_data, base_report=temp_report)
-                if judge_result["decision"]:
-                    company_data = judge_result["selected_data"] or company_data
-                    collected_data["companies"] = company_data
-                    temp_report = await self._update_report(collected_data, temp_report)
-            else:
-                collected_data["companies"] = company_data
-                temp_report = await self._update_report(collected_data, temp_report)
-        
-        # --- Execute Funding Agent ---
-        funding_data = ""
-        yield "\n\n🚀 Running Funding Agent...\n"
-        async for chunk in self._run_agent_streamed_yielding(self.funding_agent, query):
-            funding_data += chunk
-        if not self._is_invalid(funding_data):
-            if temp_report:
-                judge_result = await self._judge_data(new_data=funding_data, base_report=temp_report)
-                if judge_result["decision"]:
-                    funding_data = judge_result["selected_data"] or funding_data
-                    collected_data["funding"] = funding_data
-                    temp_report = await self._update_report(collected_data, temp_report)
-            else:
-                collected_data["funding"] = funding_data
-                temp_report = await self._update_report(collected_data, temp_report)
+        sources = {}
+        changed = []
+        for (key, label, judged), data in zip(SOURCES, fetched):
+            previous = snapshot.sources.get(key)
+            digest = content_hash(data)
+            # Agents rarely answer in the same words twice, so data saying the same thing counts as
+            # unchanged. A source that failed this time keeps its previous data rather than dropping out.
+            if previous is not None and (
+                previous.hash == digest
+                or self._is_invalid(data)
+                or same_content(previous.raw, data, self.context_budget.overlap)
+            ):
+                sources[key] = previous
+                if previous.data:
+                    collected_data[key] = previous.data
+                continue
+            changed.append(label)
+            await self._accept_source(
+                key, label, data, judged, collected_data, "", filename_hint, emit, checkpoint, collect_only=True
+            )
+            sources[key] = SourceSnapshot(digest, collected_data.get(key, ""), data)
 
+        previous_report = snapshot.report_path if snapshot.report_path and os.path.exists(snapshot.report_path) else None
+        with self.tracer.span("refresh", **{"research.changed_sources": len(changed)}) as span:
+            if previous_report and not changed:
+                self.refresh_stats.unchanged += 1
+                self._notify(emit, f"\n♻️ No source changed since the last run, keeping {previous_report}\n")
+                return previous_report
+            self._notify(emit, f"\n🔁 Changed sources: {', '.join(changed) or 'none'}\n")
 
-        # --- Deep Research Agent ---
-        yield "\n\n🚀 Running Deep Research Agent...\n"
-        deep_research_query = (
-            f"Using the following template, collect all the required information to populate it:\n\n"
-            f"For this company: {query}\n\n"
-            f"Here is the template:\n\n"
-            f"{self.template}\n\n"
-        )
-        deep_research_data = ""
-        async for chunk in self._run_agent_streamed_yielding(self.deep_research_agent, deep_research_query):
-            deep_research_data += chunk
-            yield chunk
-        if not self._is_invalid(deep_research_data):
-            collected_data["deep_research"] = deep_research_data
-            temp_report = await self._update_report(collected_data, temp_report)
-            debug_hint = self._extract_company_name_from_query(query)
-            debug_path = self._save_debug_report(temp_report, debug_hint)
-            yield f"\n\n📝 Temp Report after Deep Research Agent (debug saved at {debug_path}):\n{temp_report[:500]}...\n"
-        else:
-            yield "\n⚠️ Deep research agent returned invalid data.\n"
-        
-        # --- If no valid data, use fallback ---
-        if not collected_data:
-            company_name = self._extract_company_name_from_query(query)
-            fallback_path = generate_report_path(company_name)
-            fallback_md = (
-                f"# No Data Found for {company_name}\n\n"
-                "Unfortunately, no meaningful data could be retrieved for this company.\n\n"
+            report, section_texts = "", {}
+            if collected_data:
+                report, section_texts, regenerated = await self._refresh_sections(
+                    collected_data, snapshot, self._extract_company_name_from_query(query), emit
+                )
+                span.set(**{"research.sections_regenerated": regenerated})
+                if previous_report and not regenerated:
+                    # The changes didn't reach the report, e.g. the judge rejected them.
+                    self.refresh_stats.unchanged += 1
+                    await self.snapshots.save(CompanySnapshot(
+                        company=filename_hint, sources=sources, sections=section_texts, report_path=previous_report,
+                    ))
+                    self._notify(emit, f"\n♻️ No report section affected, keeping {previous_report}\n")
+                    return previous_report
+            self.refresh_stats.updated += 1
+            return await self._finish(query, filename_hint, collected_data, report, draft, sources, section_texts)
+
+    async def _refresh_sections(
+        self,
+        collected_data: dict,
+        snapshot: CompanySnapshot,
+        company_name: str,
+        emit: Optional[Callable[[str], None]],
+    ) -> Tuple[str, Dict[str, str], int]:
+        """
+        Write again the template sections that the previous report lacks or
+        whose relevant data changed, and assemble them with the others. A
+        section no data matched, before or after, stays as it was.
+        Returns the report, the text of every section and how many were written.
+        """
+        preamble, sections = parse_template(self.template)
+        collected_data, trim = self.context_budget.fit(collected_data)
+        previous_data, _ = self.context_budget.fit(snapshot.collected_data)
+        self.report_stats.trimmed_tokens += trim.trimmed_tokens
+        stale = [
+            section for section in sections
+            if section.title not in snapshot.sections
+            or relevant_data(section, collected_data, fallback=False)
+            != relevant_data(section, previous_data, fallback=False)
+        ]
+        self.refresh_stats.sections_regenerated += len(stale)
+        self.refresh_stats.sections_kept += len(sections) - len(stale)
+        section_texts = {title: text for title, text in snapshot.sections.items()}
+        if stale:
+            self._notify(emit, f"\n🧠 Rewriting {len(stale)} of {len(sections)} report sections: "
+                               f"{', '.join(section.title for section in stale)}\n")
+            texts = await _gather_or_cancel(
+                self._generate_section(section, company_name, collected_data) for section in stale
             )
-            save_report(fallback_md, fallback_path)
-            yield "\n⚠️ No valid data found. Fallback report saved.\n"
-            yield f"[DOWNLOAD_LINK]:/download/reports/{fallback_path.split('/')[-1]}"
-            return
+            section_texts.update((section.title, text) for section, text in zip(stale, texts))
+        section_texts = {section.title: section_texts[section.title] for section in sections}
+        report = assemble_report(self._report_title(preamble, company_name), list(section_texts.values()))
+        return report, section_texts, len(stale)
 
-        # --- Save final report and yield final messages ---
-        report_path = generate_report_path(filename_hint)
-        save_report(temp_report, report_path)
-        yield f"\n✅ Finished {filename_hint}\n"
-        yield f"[DOWNLOAD_LINK]:/download/reports/{report_path.split('/')[-1]}"
+    async def _fetch_source(
+        self,
+        key: str,
+        label: str,
+        query: str,
+        emit: Optional[Callable[[str], None]],
+        checkpoint: Optional[CompanyCheckpoint] = None,
+    ) -> str:
+        if checkpoint and checkpoint.has(key):
+            self._notify(emit, f"\n⏭️ {label} data restored from checkpoint.\n")
+            return checkpoint.get(key)
+        try:
+            data = await self._run_source_agent(key, label, query, emit)
+        except DeadlineExceeded as e:
+            # A hung source shouldn't hold up the company; it is left out, and not checkpointed.
+            self._notify(emit, f"\n⏰ {label} {e}, continuing without it.\n")
+            return ""
+        if checkpoint:
+            checkpoint.record(key, data)
+        return data
+
+    async def _run_source_agent(self, key: str, label: str, query: str, emit: Optional[Callable[[str], None]]) -> str:
+        agent = getattr(self, f"{key}_agent")
+        if key == "deep_research":
+            query = self._deep_research_query(query)
+
+        if emit is None:
+            data = await self._run_agent_streamed(agent, label, query)
+            print(f"\n📦 {label} Data:\n{data}\n")
+            return data
+
+        emit(f"\n\n🚀 Running {label}...\n")
+        input_items = [{"role": "user", "content": query}]
+        with StreamBuffer() as buffer:
+            async for delta in self._stream_agent(agent, input_items, buffer):
+                # Only the Deep Research Agent output is forwarded to stream clients.
+                if key == "deep_research" and not delta.isspace():
+                    emit(delta)
+            return buffer.getvalue()
+
+    async def _accept_source(
+        self,
+        key: str,
+        label: str,
+        data: str,
+        judged: bool,
+        collected_data: dict,
+        temp_report: str,
+        filename_hint: str,
+        emit: Optional[Callable[[str], None]],
+        checkpoint: Optional[CompanyCheckpoint] = None,
+        draft: Optional[ReportDraft] = None,
+        collect_only: bool = False,
+    ) -> str:
+        """
+        Judge a source's data (when it has a judge and there is a report to judge
+        against), add it to `collected_data` and return the updated report.
+        With `collect_only`, or in a one-pass report mode, the report isn't updated.
+        """
+        if self._is_invalid(data):
+            self._notify(emit, f"\n⚠️ {label} returned invalid data.\n")
+            return temp_report
+
+        # In single-pass mode there is no report yet, so judge against the data collected so far.
+        base_report = temp_report or format_collected_data(collected_data)
+        if judged and base_report:
+            judge_stage = f"judge:{key}"
+            if checkpoint and checkpoint.has(judge_stage):
+                judge_result = checkpoint.get(judge_stage)
+            else:
+                judge_result = await self._judge_source(label, data, base_report, filename_hint, emit)
+                if checkpoint:
+                    checkpoint.record(judge_stage, judge_result)
+            if not judge_result["decision"]:
+                self._notify(emit, f"\nJudge determined {label} data is not relevant. Skipping this data source.\n")
+                return temp_report
+            data = judge_result["selected_data"] or data
+
+        collected_data[key] = data
+        if collect_only or self.report_mode in ONE_PASS_REPORT_MODES:
+            self._notify(emit, f"\n📥 Collected {label} data.\n")
+            return temp_report
+        report_stage = f"report:{key}"
+        if checkpoint and checkpoint.has(report_stage):
+            self._notify(emit, f"\n⏭️ Report after {label} restored from checkpoint.\n")
+            return checkpoint.get(report_stage)
+        temp_report = await self._update_report(collected_data, temp_report, new_key=key, draft=draft, emit=emit)
+        if checkpoint:
+            checkpoint.record(report_stage, temp_report)
+        debug_note = ""
+        if self.store.debug_snapshots:
+            debug_path = await self._save(temp_report, filename_hint, kind=DEBUG)
+            debug_note = f" (debug saved at {debug_path})"
+        print(f"\n\n📝 Temp Report after {label}{debug_note}:\n{temp_report[:500]}...\n")
+        if emit:
+            # Stream clients already received the report as it was written.
+            emit(f"\n\n📝 Report updated after {label}{debug_note}.\n")
+        return temp_report
+
+    def _deep_research_query(self, query: str) -> str:
+        return build_deep_research_query(self.template, query)
 
+    def _notify(self, emit: Optional[Callable[[str], None]], message: str):
+        print(message)
+        if emit is not None:
+            emit(message)
+
+    async def _judge_source(
+        self,
+        label: str,
+        data: str,
+        base_report: str,
+        filename_hint: str,
+        emit: Optional[Callable[[str], None]],
+    ) -> dict:
+        """
+        Decide whether a source's data is relevant, locally when the relevance
+        pre-filter is confident and with the Judge Agent otherwise.
+        """
+        if self.relevance is None:
+            return await self._judge_data(new_data=data, base_report=base_report)
+
+        with self.tracer.span("relevance") as span:
+            relevance = self.relevance.assess(data, base_report, filename_hint)
+            span.set(**{"research.verdict": relevance.verdict, "research.relevance_score": relevance.score})
+        if relevance.verdict == ESCALATE:
+            print(f"🔎 {label} relevance unclear (score {relevance.score:.2f}), asking the judge")
+            return await self._judge_data(new_data=data, base_report=base_report)
+
+        self._notify(emit, f"\n🔎 Pre-filter {relevance.verdict}ed {label} data (score {relevance.score:.2f}).\n")
+        if self.relevance.should_sample():
+            judge_result = await self._judge_data(new_data=data, base_report=base_report)
+            self.relevance.record_agreement(relevance.verdict, judge_result["decision"])
+            return judge_result
+        accepted = relevance.verdict == ACCEPT
+        return {"decision": accepted, "selected_data": data if accepted else ""}
 
     async def _judge_data(self, new_data: str, base_report: str) -> dict:
+        if self.judge_mode == "structured":
+            return await self._judge_data_structured(new_data, base_report)
         judge_prompt = (
             "You are a judge that evaluates if new research data is relevant to the company described in the base report. "
             "Analyze the information and decide if it is relevant or not. "
@@ -231,65 +593,309 @@ class ResearchPipeline:
             "If decision is false, leave this as an empty string. "
             "Ensure the JSON is valid and nothing else is output."
         )
-        input_items = [{"role": "user", "content": f"Base Report:\n{base_report}\n\nNew Data:\n{new_data}\n\n{judge_prompt}"}]
-        judge_result = await Runner.run(self.judge_agent, input=input_items)
-        judge_text = extract_report_text(judge_result).strip()
-        judge_text = re.sub(r"^```(?:json)?\s*", "", judge_text)
-        judge_text = re.sub(r"\s*```$", "", judge_text)
+        new_data, base_report, trim = self._fit_judge_input(judge_prompt, new_data, base_report)
+        # The instructions come first: they are the same for every company.
+        input_items = [{"role": "user", "content": f"{judge_prompt}\n\nBase Report:\n{base_report}\n\nNew Data:\n{new_data}"}]
+        with self.tracer.span("judge", **{"research.judge_mode": "text"}, **trim.attributes()) as span:
+            judge_text, _ = await self._run_agent(self.judge_agent, input_items, span)
+            judge_text = judge_text.strip()
+            judge_text = re.sub(r"^```(?:json)?\s*", "", judge_text)
+            judge_text = re.sub(r"\s*```$", "", judge_text)
 
-        try:
-            judge_dict = json.loads(judge_text)
-            verdict = judge_dict["decision"]
-            judge_selected_data = judge_dict["selected_data"]
-        except Exception as e:
-            print("❌ Failed to parse judge JSON:", e)
-            return {"decision": False, "selected_data": ""}
+            try:
+                judge_dict = json.loads(judge_text)
+                verdict = judge_dict["decision"]
+                judge_selected_data = judge_dict["selected_data"]
+            except Exception as e:
+                print("❌ Failed to parse judge JSON:", e)
+                span.set(**{"research.outcome": "parse_error"})
+                return {"decision": False, "selected_data": ""}
+            span.set(**{"research.decision": bool(verdict)})
 
         return {
             "decision": verdict,
             "selected_data": judge_selected_data if verdict else ""
         }
 
-    async def _update_report(self, collected_data: dict, previous_report: str) -> str:
-        template_to_use = self.template if not previous_report else previous_report
-        report_input = build_llm_report_input(template_to_use, collected_data)
+    async def _judge_data_structured(self, new_data: str, base_report: str) -> dict:
+        """
+        Judge with schema-constrained output: the judge returns its decision and
+        the IDs of the relevant sections of the new data, which are then copied
+        from the data here instead of being re-generated by the model.
+        """
+        judge_prompt = (
+            "You are a judge that evaluates if new research data is relevant to the company described in the base report. "
+            "The new data is split into numbered sections. Decide if it is relevant, and if it is, list the numbers "
+            "of the relevant sections in section_ids. Be as flexible as possible and include as MANY SECTIONS AS POSSIBLE."
+        )
+        new_data, base_report, trim = self._fit_judge_input(judge_prompt, new_data, base_report)
+        sections = split_sections(new_data)
+        numbered = "\n\n".join(f"[{i}] {section}" for i, section in enumerate(sections, 1))
+        input_items = [{"role": "user", "content": f"{judge_prompt}\n\nBase Report:\n{base_report}\n\nNew Data:\n{numbered}"}]
+        with self.tracer.span("judge", **{"research.judge_mode": "structured"}, **trim.attributes()) as span:
+            try:
+                judge_text, _ = await self._run_agent(self._structured_judge_agent, input_items, span)
+                verdict = JudgeVerdict.model_validate_json(judge_text)
+            except (ValueError, AgentsException) as e:
+                # Keep the data rather than silently dropping it on a malformed verdict.
+                print("❌ Structured judge failed, keeping the data:", e)
+                span.set(**{"research.outcome": "parse_error"})
+                return {"decision": True, "selected_data": new_data}
+            span.set(**{"research.decision": verdict.decision, "research.sections": len(sections)})
+
+        if not verdict.decision:
+            return {"decision": False, "selected_data": ""}
+        selected = [sections[i - 1] for i in sorted(set(verdict.section_ids)) if 1 <= i <= len(sections)]
+        # A relevant verdict without valid sections keeps all of the data.
+        return {"decision": True, "selected_data": "\n\n".join(selected) if selected else new_data}
+
+    async def _update_report(
+        self,
+        collected_data: dict,
+        previous_report: str,
+        new_key: Optional[str] = None,
+        draft: Optional[ReportDraft] = None,
+        emit: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Run the Report Agent over the collected data. In delta mode only the newly
+        accepted source (`new_key`) is sent along with the previous report.
+
+        The report is appended to `draft` and passed to `emit` as it is written:
+        "[REPORT_START]" announces a new pass, then every "[REPORT_DELTA]:"
+        message carries the next piece of text.
+        """
+        if self.report_mode == "delta" and new_key is not None:
+            report_data = {new_key: collected_data[new_key]}
+        else:
+            report_data = collected_data
+        report_data, trim = self._fit_report_data(report_data, previous_report)
+        report_input = build_llm_report_input(self.template, report_data, previous_report)
         print(f"\n🛠️  Report Input Payload:\n{json.dumps(report_input, indent=2)[:1000]}...\n")
-        print("\n🧠 Running Report Agent for incremental update...")
-        report_result = await Runner.run(self.report_agent, input=report_input)
-        updated_report = extract_report_text(report_result)
+        print(f"\n🧠 Running Report Agent ({self.report_mode} mode)...")
+        started = time.perf_counter()
+        with self.tracer.span("report.update", **{"research.report_mode": self.report_mode}, **trim.attributes()) as span:
+            if draft:
+                await draft.restart()
+            if emit:
+                emit("[REPORT_START]")
+
+            async def on_delta(delta: str):
+                if draft:
+                    await draft.append(delta)
+                if emit:
+                    emit(f"[REPORT_DELTA]:{delta}")
+
+            updated_report, usage = await self._run_agent(self.report_agent, report_input, span, on_delta)
+        if usage is not None:
+            self.report_stats.record(usage, time.perf_counter() - started)
+            print(
+                f"🧮 Report Agent tokens: {usage.input_tokens} in ({usage.cached_input_tokens} cached, "
+                f"{usage.uncached_input_tokens} uncached) / {usage.output_tokens} out"
+            )
         return updated_report
 
-    def _save_debug_report(self, report: str, hint: str) -> str:
-        debug_filename = f"debug_{hint}"
-        debug_path = generate_report_path(debug_filename)
-        save_report(report, debug_path)
-        return debug_path
+    def _fit_report_data(self, report_data: dict, previous_report: str) -> Tuple[dict, TrimStats]:
+        """
+        Fit the data of a Report Agent call to what its budget leaves after the
+        instructions, template and previous report, but to no less than a
+        quarter of the budget.
+        """
+        budget = self.context_budget.report_tokens
+        if budget:
+            fixed = sum(count_tokens(item["content"]) for item in build_llm_report_input(self.template, {}, previous_report))
+            budget = max(budget - fixed, budget // 4)
+        report_data, trim = self.context_budget.fit(report_data, budget or None)
+        self.report_stats.trimmed_tokens += trim.trimmed_tokens
+        print(trim.format("Report Agent data"))
+        return report_data, trim
+
+    def _fit_judge_input(self, judge_prompt: str, new_data: str, base_report: str) -> Tuple[str, str, TrimStats]:
+        """
+        Fit a Judge Agent call to its budget. The base report only tells the
+        judge which company the data should be about, so it gets at most half
+        of the budget, and the new data what is left.
+        """
+        budget = self.context_budget.judge_tokens
+        fitted, trim = self.context_budget.fit({"base_report": base_report}, budget // 2 if budget else None)
+        base_report = fitted.get("base_report", "")
+        if budget:
+            budget = max(budget - count_tokens(judge_prompt) - count_tokens(base_report), budget // 4)
+        fitted, data_trim = self.context_budget.fit({"new_data": new_data}, budget or None)
+        trim.add(data_trim)
+        trim.budget = self.context_budget.judge_tokens
+        print(trim.format("Judge Agent input"))
+        return fitted.get("new_data", ""), base_report, trim
+
+    async def _generate_sections(
+        self,
+        collected_data: dict,
+        company_name: str,
+        emit: Optional[Callable[[str], None]],
+    ) -> Tuple[str, Dict[str, str]]:
+        """
+        Generate every "## " section of the template concurrently, each from
+        the collected data relevant to it, and assemble them into one report.
+        Returns the report and the text of each section by title.
+        """
+        preamble, sections = parse_template(self.template)
+        # Each section gets its own share of the data, so only duplicates are removed here.
+        collected_data, trim = self.context_budget.fit(collected_data)
+        self.report_stats.trimmed_tokens += trim.trimmed_tokens
+        print(trim.format("Report sections data"))
+        self._notify(emit, f"\n🧠 Writing {len(sections)} report sections in parallel...\n")
+        texts = await _gather_or_cancel(
+            self._generate_section(section, company_name, collected_data) for section in sections
+        )
+        print(f"🧮 Report sections written: {len(texts)}")
+        report = assemble_report(self._report_title(preamble, company_name), texts)
+        return report, {section.title: text for section, text in zip(sections, texts)}
+
+    async def _generate_section(self, section: TemplateSection, company_name: str, collected_data: dict) -> str:
+        section_input = build_section_input(section, company_name, relevant_data(section, collected_data))
+        started = time.perf_counter()
+        with self.tracer.span("report.section", **{"research.section": section.title}) as span:
+            text, usage = await self._run_agent(self.report_agent, section_input, span)
+        if usage is not None:
+            self.report_stats.record(usage, time.perf_counter() - started)
+        return text
+
+    def _report_title(self, preamble: str, company_name: str) -> str:
+        return re.sub(r"\{\{\s*company_name\s*\}\}", company_name, preamble)
+
+    async def _run_agent(
+        self,
+        agent: Agent,
+        input_items: list,
+        span: Span,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> Tuple[str, Optional[TokenUsage]]:
+        """
+        Run an agent to completion through the response cache. Returns the text
+        output and the run's token usage, which is None when the output came
+        from the cache. The run is streamed: only the streamed responses carry
+        the count of input tokens read from the provider's prompt cache.
+        `on_delta` is awaited with every piece of text as it arrives.
+        """
+        with StreamBuffer() as buffer:
+            async for delta in self._stream_agent(agent, input_items, buffer, span):
+                if on_delta:
+                    await on_delta(delta)
+            return buffer.getvalue(), buffer.usage
+
+    async def _save(self, content: str, filename_hint: str, kind: str, draft: Optional[ReportDraft] = None) -> str:
+        """
+        Save a report, committing `draft` when the report was streamed to it.
+        """
+        with self.tracer.span("report.save", **{"research.report_kind": kind, "research.bytes": len(content.encode())}):
+            if draft:
+                return await draft.commit(content, kind)
+            return await self.store.save(content, filename_hint, kind)
 
     async def _run_agent_streamed(self, agent: Agent, label: str, query: str) -> str:
         print(f"\n🚀 {label} → Query:\n{query}\n")
         input_items = [{"role": "user", "content": query}]
-        run_stream = Runner.run_streamed(agent, input=input_items)
-        output = ""
-        async for event in run_stream.stream_events():
-            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-                delta = event.data.delta
-                output += delta
+        console = ConsoleBatcher()
+        with StreamBuffer() as buffer:
+            async for delta in self._stream_agent(agent, input_items, buffer):
                 if not delta.isspace():
-                    print(delta, end="", flush=True)
-            elif event.type == "agent_updated_stream_event":
-                print(f"\n🔄 Handoff to {event.new_agent.name}")
-        return output
+                    console.write(delta)
+            console.flush()
+            return buffer.getvalue()
 
-    async def _run_agent_streamed_yielding(self, agent: Agent, query: str):
-        input_items = [{"role": "user", "content": query}]
-        run_stream = Runner.run_streamed(agent, input=input_items)
-        async for event in run_stream.stream_events():
-            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-                delta = event.data.delta
-                if not delta.isspace():
-                    yield delta
-            elif event.type == "agent_updated_stream_event":
-                yield f"\n🔄 Handoff to {event.new_agent.name}\n"
+    async def _stream_agent(self, agent: Agent, input_items: list, buffer: StreamBuffer, span: Optional[Span] = None):
+        """
+        Yield the text deltas of an agent run, appending them to `buffer` and
+        setting its token usage at the end. Cached outputs are replayed line by
+        line so stream consumers behave as on a live run; live runs go through
+        the rate limiter and are retried as long as they haven't produced any
+        output, but only once after a missed deadline. The run is recorded in
+        `span`, or in an "agent.stream" span.
+        """
+        model = model_name(agent)
+        attributes = {"gen_ai.agent.name": agent.name, "gen_ai.request.model": model}
+        # Not activated: an async generator runs in its consumer's context.
+        span_context = contextlib.nullcontext(span) if span else self.tracer.span("agent.stream", activate=False)
+        with span_context as span:
+            span.set(**attributes)
+            cache_key = self.cache.key(agent, input_items) if self.cache else None
+            cached = await self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                print(f"♻️ {agent.name} response served from cache")
+                span.set(**{"research.cache_hit": True, "research.bytes": len(cached.encode())})
+                for line in cached.splitlines(keepends=True):
+                    buffer.append(line)
+                    yield line
+                return
+
+            estimated_tokens = estimate_tokens(input_items)
+            deadlines = deadlines_for(agent.name)
+
+            def hedge():
+                print(f"🏁 {agent.name} has no output after {deadlines.ttft:g}s, sending a hedged request")
+                span.set(**{"research.hedged": True})
+                return self._agent_events(agent, input_items, model, estimated_tokens)
+
+            def start():
+                return _stream_events(Runner.run_streamed(agent, input=input_items))
+
+            attempt = 0
+            deadline_retries = 0
+            while True:
+                usage = TokenUsage()
+                try:
+                    async with self.rate_limiter.slot(model, estimated_tokens):
+                        events = stream_with_deadlines(
+                            start,
+                            _is_text_delta,
+                            deadlines,
+                            hedge if self.deadline_action == "hedge" else None,
+                        )
+                        async for event in events:
+                            if _is_text_delta(event):
+                                span.first_token()
+                                buffer.append(event.data.delta)
+                                yield event.data.delta
+                            elif event.type == "raw_response_event" and isinstance(event.data, ResponseCompletedEvent):
+                                usage.add_response(event.data.response)
+                            elif event.type == "agent_updated_stream_event":
+                                print(f"\n🔄 Handoff to {event.new_agent.name}")
+                    break
+                except Exception as e:
+                    if isinstance(e, DeadlineExceeded):
+                        span.set(**{"research.deadline_missed": e.kind})
+                        # A hung call gets one more request, the retry or the hedge, before its
+                        # source is given up, rather than every retry of a failed call.
+                        if self.deadline_action == "hedge" or deadline_retries:
+                            raise
+                        deadline_retries += 1
+                    delay = None if buffer.size else self.rate_limiter.backoff(model, e, attempt)
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+            self.rate_limiter.succeeded(model, estimated_tokens, usage.input_tokens + usage.output_tokens)
+            buffer.usage = usage
+            span.set(**{
+                "gen_ai.usage.input_tokens": usage.input_tokens,
+                "gen_ai.usage.cache_read.input_tokens": usage.cached_input_tokens,
+                "gen_ai.usage.output_tokens": usage.output_tokens,
+                "research.bytes": buffer.size,
+                "research.retries": attempt,
+                "research.spilled": buffer.spilled,
+            })
+            if cache_key:
+                await self.cache.set(cache_key, buffer.getvalue())
+
+    async def _agent_events(self, agent: Agent, input_items: list, model: str, estimated_tokens: int):
+        """
+        The events of another run of an agent, such as a hedged request, which
+        takes a rate limiter slot of its own.
+        """
+        async with self.rate_limiter.slot(model, estimated_tokens):
+            async for event in _stream_events(Runner.run_streamed(agent, input=input_items)):
+                yield event
 
     def _is_invalid(self, data: str) -> bool:
         return (
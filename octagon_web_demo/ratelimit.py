@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import time
+import random
+import asyncio
+import email.utils
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import openai
+
+from octagon_web_demo.config import (
+    API_MAX_RETRIES,
+    MODEL_RATE_LIMITS,
+    OCTAGON_MAX_CONCURRENCY,
+    OCTAGON_RPM,
+    OCTAGON_TPM,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_RPM,
+    OPENAI_TPM,
+)
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` tokens per minute and
+    holding at most one minute's worth. A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    async def acquire(self, amount: float):
+        if not self.per_minute:
+            return
+        # A request larger than the bucket can never fit, so wait for a full bucket instead.
+        amount = min(amount, self.per_minute)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) * 60 / self.per_minute)
+
+    def adjust(self, amount: float):
+        """
+        Take `amount` more tokens (or give them back, if negative) once the
+        actual usage of a request is known. The bucket may go into debt.
+        """
+        if self.per_minute:
+            self._refill()
+            self.tokens = min(self.per_minute, self.tokens - amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on in-flight calls that halves whenever the provider throttles and
+    grows back by one after each `limit` consecutive successes (AIMD).
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.active = 0
+        self._successes = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        while self.active >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Woken but cancelled before taking the slot: hand it to the next waiter.
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+            self._wake()
+
+    def on_throttle(self):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+    def _wake(self):
+        free = self.limit - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+@dataclass
+class Limits:
+    requests: TokenBucket
+    tokens: TokenBucket
+
+
+class RateLimiter:
+    """
+    Client-side throughput governor for Octagon and OpenAI calls.
+
+    Every call takes a request and its estimated tokens from the per-provider
+    buckets and, when MODEL_RATE_LIMITS sets one, the per-model buckets, and
+    holds a slot of the provider's adaptive concurrency limit while it runs.
+    Rate limit errors, server errors and connection errors are retried with
+    exponential backoff and full jitter, honoring Retry-After.
+    """
+
+    def __init__(
+        self,
+        provider_limits: Optional[Dict[str, Tuple[int, int, int]]] = None,
+        model_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        max_retries: int = API_MAX_RETRIES,
+    ):
+        provider_limits = provider_limits or {
+            "openai": (OPENAI_RPM, OPENAI_TPM, OPENAI_MAX_CONCURRENCY),
+            "octagon": (OCTAGON_RPM, OCTAGON_TPM, OCTAGON_MAX_CONCURRENCY),
+        }
+        model_limits = parse_model_limits(MODEL_RATE_LIMITS) if model_limits is None else model_limits
+        self.max_retries = max_retries
+        self._providers = {
+            provider: Limits(TokenBucket(rpm), TokenBucket(tpm))
+            for provider, (rpm, tpm, _) in provider_limits.items()
+        }
+        self._concurrency = {
+            provider: AdaptiveConcurrency(max_concurrency)
+            for provider, (_, _, max_concurrency) in provider_limits.items()
+        }
+        self._models = {
+            model: Limits(TokenBucket(rpm), TokenBucket(tpm))
+            for model, (rpm, tpm) in model_limits.items()
+        }
+
+    @asynccontextmanager
+    async def slot(self, model: str, estimated_tokens: int):
+        for limits in self._limits(model):
+            await limits.requests.acquire(1)
+            await limits.tokens.acquire(estimated_tokens)
+        concurrency = self._concurrency[provider_for(model)]
+        await concurrency.acquire()
+        try:
+            yield
+        finally:
+            concurrency.release()
+
+    def succeeded(self, model: str, estimated_tokens: int, actual_tokens: int):
+        """
+        Settle the token estimate of a finished call and let the provider's
+        concurrency limit grow back.
+        """
+        if actual_tokens:
+            for limits in self._limits(model):
+                limits.tokens.adjust(actual_tokens - estimated_tokens)
+        self._concurrency[provider_for(model)].on_success()
+
+    def backoff(self, model: str, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying a call that failed with `error`, or
+        None if it should not be retried.
+        """
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        if isinstance(error, openai.RateLimitError):
+            self._concurrency[provider_for(model)].on_throttle()
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+        print(f"⏳ {model} call failed ({error.__class__.__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _limits(self, model: str):
+        yield self._providers[provider_for(model)]
+        if model in self._models:
+            yield self._models[model]
+
+
+def provider_for(model: str) -> str:
+    return "octagon" if model.startswith("octagon-") else "openai"
+
+
+def parse_model_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parse "model=rpm/tpm,model=rpm/tpm" into {model: (rpm, tpm)}.
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition("/")
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+
+def is_retryable(error: Exception) -> bool:
+    # TimeoutError covers calls cancelled for missing their time-to-first-token deadline.
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def estimate_tokens(input_items) -> int:
+    """
+    Rough token estimate of a request, at about four characters per token.
+    """
+    return sum(len(str(item.get("content", ""))) for item in input_items) // 4
+
+
+rate_limiter = RateLimiter()
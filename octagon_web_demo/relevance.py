@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import re
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Set
+
+from octagon_web_demo.config import RELEVANCE_ACCEPT_SCORE, RELEVANCE_REJECT_SCORE, RELEVANCE_SAMPLE_RATE
+
+ACCEPT = "accept"
+REJECT = "reject"
+ESCALATE = "escalate"
+
+_STOPWORDS = set(
+    "the and for with that this from are was were has have had its their our your not but you all any can "
+    "also into more than over per about company data information report based inc ltd llc corp".split()
+)
+_WORD = re.compile(r"[a-z0-9][a-z0-9&'-]{2,}")
+_ENTITY = re.compile(r"\b[A-Z][A-Za-z0-9&.-]+(?:\s+[A-Z][A-Za-z0-9&.-]+)*")
+
+
+@dataclass
+class RelevanceStats:
+    """
+    How often the pre-filter decided on its own or escalated to the LLM
+    judge, and how often it agreed with the judge on the sampled decisions.
+    """
+    accepted: int = 0
+    rejected: int = 0
+    escalated: int = 0
+    sampled: int = 0
+    agreed: int = 0
+
+    def add(self, other: "RelevanceStats"):
+        self.accepted += other.accepted
+        self.rejected += other.rejected
+        self.escalated += other.escalated
+        self.sampled += other.sampled
+        self.agreed += other.agreed
+
+    def format(self) -> str:
+        agreement = f"{self.agreed / self.sampled:.0%}" if self.sampled else "n/a"
+        return (
+            f"\n🔎 Relevance pre-filter: {self.accepted} accepted, {self.rejected} rejected, "
+            f"{self.escalated} escalated to the judge; agreement with the judge {agreement} "
+            f"({self.agreed}/{self.sampled} sampled)\n"
+        )
+
+
+@dataclass
+class Relevance:
+    verdict: str
+    score: float
+    # Whether the new data names the company's domain (1), its name (0.5) or neither (0)
+    identity: float
+    entities: float
+    similarity: float
+
+
+class RelevanceFilter:
+    """
+    Local relevance check run before the LLM judge.
+
+    New data is scored on whether it names the company (by website domain or
+    name), how many of the base report's named entities it mentions and the
+    cosine similarity of their word counts. Data that names the company and
+    scores at least `accept_score` is accepted, data that doesn't name it and
+    scores below `reject_score` is rejected, and everything in between is
+    escalated to the judge. A `sample_rate` share of the decisions made
+    locally is also sent to the judge to measure agreement.
+    """
+
+    def __init__(
+        self,
+        accept_score: float = RELEVANCE_ACCEPT_SCORE,
+        reject_score: float = RELEVANCE_REJECT_SCORE,
+        sample_rate: float = RELEVANCE_SAMPLE_RATE,
+    ):
+        self.accept_score = accept_score
+        self.reject_score = reject_score
+        self.sample_rate = sample_rate
+        self.stats = RelevanceStats()
+
+    def assess(self, new_data: str, base_report: str, filename_hint: str) -> Relevance:
+        identity = _identity_score(new_data, filename_hint)
+        entities = _overlap(_entities(new_data), _entities(base_report))
+        similarity = _cosine(_words(new_data), _words(base_report))
+        score = 0.5 * identity + 0.25 * entities + 0.25 * similarity
+        if identity and score >= self.accept_score:
+            verdict = ACCEPT
+        elif not identity and score < self.reject_score:
+            verdict = REJECT
+        else:
+            verdict = ESCALATE
+        self._count(verdict)
+        return Relevance(verdict, score, identity, entities, similarity)
+
+    def should_sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+    def record_agreement(self, verdict: str, judge_decision: bool):
+        self.stats.sampled += 1
+        if (verdict == ACCEPT) == bool(judge_decision):
+            self.stats.agreed += 1
+
+    def _count(self, verdict: str):
+        if verdict == ACCEPT:
+            self.stats.accepted += 1
+        elif verdict == REJECT:
+            self.stats.rejected += 1
+        else:
+            self.stats.escalated += 1
+
+
+def _identity_score(text: str, filename_hint: str) -> float:
+    """
+    1 if the text names the company's domain, 0.5 if it names the company
+    (the domain's first label, or the name itself), 0 otherwise.
+    """
+    hint = filename_hint.strip().lower()
+    lowered = text.lower()
+    if hint.startswith("www."):
+        hint = hint[4:]
+    if "." in hint and hint in lowered:
+        return 1.0
+    name = hint.split(".")[0] if "." in hint else hint
+    if len(name) >= 3 and re.search(rf"\b{re.escape(name)}\b", lowered):
+        return 0.5
+    return 0.0
+
+
+def _entities(text: str) -> Set[str]:
+    return {match.lower() for match in _ENTITY.findall(text) if match.lower() not in _STOPWORDS}
+
+
+def _overlap(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _words(text: str) -> Counter:
+    return Counter(word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS)
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[word] for word, count in a.items())
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import re
+import functools
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from octagon_web_demo.config import SECTION_DATA_CHARS
+
+_FOOTNOTE_DEFINITION = re.compile(r"^\[\^([^\]]+)\]:[ \t]*(.*)$", re.MULTILINE)
+_FOOTNOTE_REFERENCE = re.compile(r"\[\^([^\]]+)\](?!:)")
+_TEMPLATE_SYNTAX = re.compile(r"\{\{.*?\}\}|\{%.*?%\}|[*#\-:()$]")
+_WORD = re.compile(r"[a-z][a-z']{2,}")
+_IGNORED_WORDS = {"and", "the", "for", "with", "data", "analysis", "description", "comparison", "summary", "round"}
+
+
+@dataclass
+class TemplateSection:
+    title: str
+    # The section's template text, heading included
+    template: str
+
+    @property
+    def keywords(self) -> set:
+        """
+        Words of the section's heading, labels and placeholder names, used to
+        find the collected data relevant to it.
+        """
+        text = " ".join([self.title] + re.findall(r"\{\{\s*([\w.]+)", self.template) + [self.template])
+        text = _TEMPLATE_SYNTAX.sub(" ", text.replace("_", " ").replace(".", " ")).lower()
+        return {word for word in _WORD.findall(text) if word not in _IGNORED_WORDS}
+
+
+def parse_template(template: str) -> Tuple[str, List[TemplateSection]]:
+    """
+    Split a Markdown report template into its preamble (the title) and its
+    "## " sections, each including its "###" subsections.
+    """
+    parts = re.split(r"(?m)^(?=## )", template)
+    preamble = parts[0].strip()
+    sections = []
+    for part in parts[1:]:
+        title = part.splitlines()[0][3:].strip()
+        sections.append(TemplateSection(title=title, template=part.strip()))
+    return preamble, sections
+
+
+def relevant_data(
+    section: TemplateSection,
+    collected_data: Dict[str, str],
+    budget: int = SECTION_DATA_CHARS,
+    fallback: bool = True,
+) -> str:
+    """
+    The paragraphs of the collected data that share the most keywords with a
+    section, best first and grouped by source, within `budget` characters.
+    When nothing matches, the first paragraphs of each source are used so the
+    section can still say what is unknown, unless `fallback` is False.
+    """
+    keywords = section.keywords
+    scored = []
+    for order, (source, data) in enumerate(collected_data.items()):
+        for position, paragraph in enumerate(p.strip() for p in re.split(r"\n\s*\n", str(data))):
+            if paragraph:
+                # The source name counts too, so e.g. funding data matches the funding section.
+                words = set(_WORD.findall(f"{source.replace('_', ' ')} {paragraph}".lower()))
+                scored.append((len(words & keywords), order, position, source, paragraph))
+
+    matching = [entry for entry in scored if entry[0] > 0]
+    if matching:
+        candidates = sorted(matching, key=lambda entry: -entry[0])
+    else:
+        candidates = sorted(scored, key=lambda entry: entry[2]) if fallback else []
+    selected, used = [], 0
+    for entry in candidates:
+        if used + len(entry[4]) > budget and selected:
+            break
+        selected.append(entry)
+        used += len(entry[4])
+
+    by_source: Dict[str, List[str]] = {}
+    for _, _, _, source, paragraph in sorted(selected, key=lambda entry: (entry[1], entry[2])):
+        by_source.setdefault(source, []).append(paragraph)
+    return "\n\n".join(f"### {source}\n" + "\n\n".join(paragraphs) for source, paragraphs in by_source.items())
+
+
+def split_report(report: str, sections: List[TemplateSection]) -> Dict[str, str]:
+    """
+    The text of each template section in a finished report, by section title,
+    followed by the definitions of the footnotes it cites. Sections without a
+    "## " heading of the same title in the report are left out.
+    """
+    definitions = {label: text.strip() for label, text in _FOOTNOTE_DEFINITION.findall(report)}
+    titles = {_heading_key(section.title): section.title for section in sections}
+    found: Dict[str, str] = {}
+    for part in re.split(r"(?m)^(?=## )", _FOOTNOTE_DEFINITION.sub("", report))[1:]:
+        title = titles.get(_heading_key(part.splitlines()[0][3:]))
+        if title is None or title in found:
+            continue
+        part = part.strip()
+        labels = dict.fromkeys(_FOOTNOTE_REFERENCE.findall(part))
+        notes = "\n".join(f"[^{label}]: {definitions[label]}" for label in labels if label in definitions)
+        found[title] = f"{part}\n\n{notes}" if notes else part
+    return found
+
+
+def _heading_key(title: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", title.lower()))
+
+
+@functools.lru_cache(maxsize=128)
+def _section_instructions(title: str, template: str) -> str:
+    return (
+        f"Write only the \"{title}\" section of an investor research report, "
+        f"starting with its \"## {title}\" heading and following this template:\n\n"
+        f"{template}\n\n"
+        "Use only the research data below and USE AS MUCH OF IT AS POSSIBLE. If something in the template "
+        "isn't covered, say it is not available. Cite every fact with Markdown footnotes ([^1], [^2], ...) "
+        "and define each footnote with its source at the end of the section."
+    )
+
+
+def build_section_input(section: TemplateSection, company_name: str, data: str) -> List[Dict[str, str]]:
+    """
+    The prompt for one section. Everything but the company name and its data
+    is the same for every company and comes first, so it can be served from
+    the provider's prompt cache.
+    """
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert analyst creating investor reports in Markdown format. "
+                "You write one section of a larger report at a time."
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                f"{_section_instructions(section.title, section.template)}\n\n"
+                f"Company: {company_name}\n\nResearch data:\n\n{data}"
+            )
+        },
+    ]
+
+
+def assemble_report(title: str, sections: List[str]) -> str:
+    """
+    Join independently generated sections into one document, renumbering
+    their footnotes globally in order of appearance. Footnotes citing the same
+    source in different sections share a number, and all definitions are
+    listed once at the end.
+    """
+    definitions: Dict[str, int] = {}
+    notes: List[str] = []
+    bodies = []
+    for section in sections:
+        local_definitions = {label: text.strip() for label, text in _FOOTNOTE_DEFINITION.findall(section)}
+        body = _FOOTNOTE_DEFINITION.sub("", section).strip()
+        numbers: Dict[str, int] = {}
+
+        def renumber(match: re.Match) -> str:
+            label = match.group(1)
+            if label not in numbers:
+                text = local_definitions.get(label)
+                if text is not None and text in definitions:
+                    numbers[label] = definitions[text]
+                else:
+                    notes.append(text or "")
+                    numbers[label] = len(notes)
+                    if text is not None:
+                        definitions[text] = numbers[label]
+            return f"[^{numbers[label]}]"
+
+        bodies.append(_FOOTNOTE_REFERENCE.sub(renumber, body))
+
+    footnotes = "\n".join(f"[^{number}]: {text}" for number, text in enumerate(notes, 1) if text)
+    document = "\n\n".join([title] + bodies)
+    return f"{document}\n\n{footnotes}\n" if footnotes else f"{document}\n"
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import time
+import asyncio
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Hashable, List, Optional
+
+from octagon_web_demo.config import SINGLE_FLIGHT_MAX_RESULTS, SINGLE_FLIGHT_TTL_SECONDS
+
+
+class SharedRun:
+    """
+    The chunks produced so far by one run, and whether it has finished.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.finished: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self.finished = time.monotonic()
+        self._notify()
+
+    async def changed(self):
+        await self._changed.wait()
+
+    def _notify(self):
+        # Wake every subscriber, then arm a fresh event for the next change.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Coalesces identical streaming runs on one event loop.
+
+    The first subscriber for a key starts the run; later subscribers attach
+    to it, receiving the chunks already produced and then the live tail. A
+    run is cancelled once its last subscriber leaves before it finishes.
+    Finished runs are replayed from memory for `ttl` seconds, up to
+    `max_results` of them; failed runs are not.
+    """
+
+    def __init__(self, ttl: float = SINGLE_FLIGHT_TTL_SECONDS, max_results: int = SINGLE_FLIGHT_MAX_RESULTS):
+        self.ttl = ttl
+        self.max_results = max_results
+        self._runs: OrderedDict[Hashable, SharedRun] = OrderedDict()
+
+    async def subscribe(
+        self,
+        key: Hashable,
+        start: Callable[[], AsyncIterator[str]],
+        replay: bool = True,
+    ) -> AsyncIterator[str]:
+        """
+        Yield the chunks of the run for `key`, starting it with `start()` if
+        none is in flight. Without `replay`, a finished run isn't reused.
+        """
+        run = self._runs.get(key)
+        if run is not None and run.done and (not replay or time.monotonic() - run.finished > self.ttl):
+            del self._runs[key]
+            run = None
+        if run is None:
+            run = SharedRun()
+            self._runs[key] = run
+            run.task = asyncio.create_task(self._produce(key, run, start()))
+        else:
+            print(f"🔗 Joining the {'finished' if run.done else 'running'} research for {key}")
+
+        run.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(run.chunks):
+                    yield run.chunks[position]
+                    position += 1
+                if run.done:
+                    break
+                await run.changed()
+            if run.error is not None:
+                raise run.error
+        finally:
+            run.subscribers -= 1
+            if not run.subscribers and not run.done:
+                run.task.cancel()
+
+    async def _produce(self, key: Hashable, run: SharedRun, chunks: AsyncIterator[str]):
+        try:
+            async for chunk in chunks:
+                run.publish(chunk)
+        except (Exception, asyncio.CancelledError) as e:
+            run.finish(e)
+            if self._runs.get(key) is run:
+                del self._runs[key]
+            return
+        run.finish()
+        if self._runs.get(key) is run:
+            self._runs.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        finished = [key for key, run in self._runs.items() if run.done]
+        for key in finished[:max(0, len(finished) - self.max_results)]:
+            del self._runs[key]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import hashlib
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional
+
+import aiofiles
+
+from octagon_web_demo.storage import write_atomic
+from octagon_web_demo.config import SNAPSHOTS_DIR
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SourceSnapshot:
+    # Hash of the data the source's agent returned
+    hash: str
+    # The part of it that went into the report, "" when it was invalid or rejected by the judge
+    data: str = ""
+    # The data the source's agent returned, to tell a rewording from a change
+    raw: str = ""
+
+
+@dataclass
+class CompanySnapshot:
+    """
+    What the last report of a company was made from: the data of each source
+    and the report's text for each template section.
+    """
+    company: str
+    sources: Dict[str, SourceSnapshot] = field(default_factory=dict)
+    # Template section title -> the report's text for it, with the footnotes it cites
+    sections: Dict[str, str] = field(default_factory=dict)
+    report_path: Optional[str] = None
+    at: float = field(default_factory=time.time)
+
+    @property
+    def collected_data(self) -> Dict[str, str]:
+        return {key: source.data for key, source in self.sources.items() if source.data}
+
+
+@dataclass
+class RefreshStats:
+    """
+    How the companies of refresh runs were handled.
+    """
+    # Companies without a snapshot, researched from scratch
+    new: int = 0
+    unchanged: int = 0
+    updated: int = 0
+    sections_regenerated: int = 0
+    sections_kept: int = 0
+
+    def add(self, other: "RefreshStats"):
+        self.new += other.new
+        self.unchanged += other.unchanged
+        self.updated += other.updated
+        self.sections_regenerated += other.sections_regenerated
+        self.sections_kept += other.sections_kept
+
+    def format(self) -> str:
+        return (
+            f"\n🔁 Refresh: {self.unchanged} unchanged, {self.updated} updated "
+            f"({self.sections_regenerated} sections regenerated, {self.sections_kept} kept), "
+            f"{self.new} researched from scratch\n"
+        )
+
+
+class SnapshotStore:
+    """
+    One JSON snapshot per company in `directory`, replaced atomically.
+    """
+
+    def __init__(self, directory: str = SNAPSHOTS_DIR):
+        self.directory = directory
+
+    async def load(self, company: str) -> Optional[CompanySnapshot]:
+        try:
+            async with aiofiles.open(self._path(company), "r", encoding="utf-8") as f:
+                raw = json.loads(await f.read())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"⚠️ Ignoring unreadable snapshot of {company}: {e}")
+            return None
+        raw["sources"] = {key: SourceSnapshot(**source) for key, source in raw["sources"].items()}
+        return CompanySnapshot(**raw)
+
+    async def save(self, snapshot: CompanySnapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        await write_atomic(self._path(snapshot.company), json.dumps(asdict(snapshot)))
+
+    def _path(self, company: str) -> str:
+        slug = re.sub(r"\W+", "_", company.lower()).strip("_")
+        return os.path.join(self.directory, f"{slug}.json")
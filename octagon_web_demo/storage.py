@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+import contextlib
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import aiofiles
+import aiofiles.os
+
+from octagon_web_demo.utils import generate_report_path
+from octagon_web_demo.config import DEBUG_SNAPSHOTS, REPORT_FLUSH_SECONDS, REPORT_INDEX_PATH, REPORTS_DIR
+
+FINAL = "final"
+FALLBACK = "fallback"
+DEBUG = "debug"
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@dataclass
+class ReportEntry:
+    company: str
+    run: str
+    # FINAL, FALLBACK or DEBUG
+    kind: str
+    # File name within the reports directory
+    filename: str
+    bytes: int
+    at: float
+
+
+class ReportIndex:
+    """
+    Append-only JSONL index of saved reports, one line per report.
+
+    Every line is appended with a single O_APPEND write, so worker processes
+    and web app processes can share one index. Entries are kept in memory by
+    company; each lookup only reads the lines added since the previous one,
+    so neither the reports directory nor the whole index is scanned again.
+    """
+
+    def __init__(self, path: str = REPORT_INDEX_PATH):
+        self.path = path
+        self._by_company: Dict[str, List[ReportEntry]] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def add(self, entry: ReportEntry):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(asdict(entry)) + "\n"
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def latest(self, company: str) -> Optional[ReportEntry]:
+        """
+        The company's most recent final or fallback report.
+        """
+        entries = self.list(company=company, limit=1)
+        return entries[0] if entries else None
+
+    def list(
+        self,
+        company: Optional[str] = None,
+        run: Optional[str] = None,
+        include_debug: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[ReportEntry]:
+        """
+        Indexed reports, newest first, optionally only those of one company or run.
+        """
+        self._refresh()
+        with self._lock:
+            if company is not None:
+                entries = list(self._by_company.get(company, []))
+            else:
+                entries = [entry for company_entries in self._by_company.values() for entry in company_entries]
+        entries = [
+            entry for entry in entries
+            if (run is None or entry.run == run) and (include_debug or entry.kind != DEBUG)
+        ]
+        entries.sort(key=lambda entry: entry.at, reverse=True)
+        return entries[:limit] if limit is not None else entries
+
+    def _refresh(self):
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # A trailing line without a newline is still being written; it is read next time.
+            complete = data[:data.rfind(b"\n") + 1]
+            self._offset += len(complete)
+            for line in complete.splitlines():
+                try:
+                    entry = ReportEntry(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                self._by_company.setdefault(entry.company, []).append(entry)
+
+
+class ReportStore:
+    """
+    Saves reports without blocking the event loop and records them in the
+    report index.
+
+    Every report gets a new, collision-free file name and is written to a
+    temporary file that is then renamed into place, so a report is either
+    complete or absent, never half written. Debug snapshots of intermediate
+    reports are only saved with `debug_snapshots`.
+    """
+
+    def __init__(
+        self,
+        reports_dir: str = REPORTS_DIR,
+        index: Optional[ReportIndex] = None,
+        debug_snapshots: bool = DEBUG_SNAPSHOTS,
+        run_id: Optional[str] = None,
+    ):
+        self.reports_dir = reports_dir
+        self.index = index or ReportIndex()
+        self.debug_snapshots = debug_snapshots
+        self.run_id = run_id or new_run_id()
+
+    async def save(self, content: str, company: str, kind: str = FINAL) -> str:
+        """
+        Save a report for `company` and return its path.
+        """
+        path = generate_report_path(f"debug_{company}" if kind == DEBUG else company, self.reports_dir)
+        await write_atomic(path, content)
+        await self._record(path, content, company, kind)
+        return path
+
+    def draft(self, company: str) -> "ReportDraft":
+        """
+        A report for `company` that can be written while it is generated.
+        """
+        return ReportDraft(self, company, generate_report_path(company, self.reports_dir))
+
+    async def _record(self, path: str, content: str, company: str, kind: str):
+        # The index append is a blocking write, so it runs in a worker thread.
+        await asyncio.to_thread(self.index.add, ReportEntry(
+            company=company,
+            run=self.run_id,
+            kind=kind,
+            filename=os.path.basename(path),
+            bytes=len(content.encode("utf-8")),
+            at=time.time(),
+        ))
+
+
+class ReportDraft:
+    """
+    A report streamed to disk as it is generated.
+
+    Each generation pass is appended to `<path>.partial`, in batches every
+    `flush_interval` seconds, so readers can follow it; a new pass starts the
+    file over. `commit` then renames the file into place if it holds the
+    final report, or writes the final report atomically otherwise, and
+    indexes it. `discard` removes an uncommitted draft.
+    """
+
+    def __init__(self, store: ReportStore, company: str, path: str, flush_interval: float = REPORT_FLUSH_SECONDS):
+        self.store = store
+        self.company = company
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.flush_interval = flush_interval
+        self.committed = False
+        self._pending: List[str] = []
+        self._digest = None
+        self._flushed = 0.0
+
+    async def restart(self):
+        """
+        Start a new generation pass, emptying the partial file.
+        """
+        if self._digest is None:
+            print(f"📝 Writing report to: {self.partial_path}")
+        self._pending = []
+        self._digest = hashlib.sha256()
+        async with aiofiles.open(self.partial_path, "w", encoding="utf-8"):
+            pass
+        self._flushed = time.monotonic()
+
+    async def append(self, delta: str):
+        self._pending.append(delta)
+        self._digest.update(delta.encode("utf-8"))
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            await self.flush()
+
+    async def flush(self):
+        if self._pending:
+            text = "".join(self._pending)
+            self._pending = []
+            async with aiofiles.open(self.partial_path, "a", encoding="utf-8") as f:
+                await f.write(text)
+        self._flushed = time.monotonic()
+
+    async def commit(self, content: str, kind: str = FINAL) -> str:
+        """
+        Save `content` as the report and return its path.
+        """
+        if self._digest is not None and self._digest.digest() == hashlib.sha256(content.encode("utf-8")).digest():
+            await self.flush()
+            await aiofiles.os.replace(self.partial_path, self.path)
+        else:
+            await write_atomic(self.path, content)
+            self.discard()
+        self.committed = True
+        await self.store._record(self.path, content, self.company, kind)
+        return self.path
+
+    def discard(self):
+        if self._digest is not None:
+            with contextlib.suppress(OSError):
+                os.remove(self.partial_path)
+
+
+async def write_atomic(path: str, content: str):
+    """
+    Write `content` to a temporary file next to `path` and rename it to `path`.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+            await f.write(content)
+        await aiofiles.os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
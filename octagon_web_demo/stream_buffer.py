@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import sys
+import time
+import tempfile
+from typing import Optional, TextIO
+
+from octagon_web_demo.utils import TokenUsage
+from octagon_web_demo.config import CONSOLE_FLUSH_SECONDS, STREAM_SPILL_BYTES
+
+
+class StreamBuffer:
+    """
+    Accumulates the text deltas of a streamed agent run.
+
+    Appending is amortized constant time, unlike repeated string concatenation,
+    and once more than `spill_bytes` characters have been buffered the text
+    moves to a temporary file, so many concurrent long outputs don't all sit in
+    memory while they stream. A threshold of 0 never spills.
+    """
+
+    def __init__(self, spill_bytes: int = STREAM_SPILL_BYTES):
+        self.spill_bytes = spill_bytes
+        max_size = spill_bytes if spill_bytes > 0 else sys.maxsize
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+", encoding="utf-8")
+        self.size = 0
+        # Usage of the run that produced the text; None when it was replayed from the cache
+        self.usage: Optional[TokenUsage] = None
+
+    def append(self, delta: str):
+        self._file.write(delta)
+        self.size += len(delta)
+
+    @property
+    def spilled(self) -> bool:
+        return 0 < self.spill_bytes < self.size
+
+    def getvalue(self) -> str:
+        self._file.seek(0)
+        text = self._file.read()
+        self._file.seek(0, 2)
+        return text
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> StreamBuffer:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ConsoleBatcher:
+    """
+    Echoes streamed deltas to the console in batches, one write and flush
+    every `interval` seconds instead of one per delta.
+    """
+
+    def __init__(self, interval: float = CONSOLE_FLUSH_SECONDS, stream: TextIO = None):
+        self.interval = interval
+        self.stream = stream
+        self._pending = []
+        self._flushed = time.monotonic()
+
+    def write(self, delta: str):
+        self._pending.append(delta)
+        if time.monotonic() - self._flushed >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self._pending))
+            stream.flush()
+            self._pending = []
+        self._flushed = time.monotonic()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import time
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from octagon_web_demo.utils import percentile
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """
+    A timed pipeline stage, shaped like an OpenTelemetry span: IDs are hex
+    encoded, times are Unix nanoseconds and attribute names follow the
+    OpenTelemetry GenAI conventions where one exists.
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_time_unix_nano: int
+    end_time_unix_nano: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: Dict[str, str] = field(default_factory=lambda: {"code": "OK"})
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def first_token(self):
+        """
+        Record the time to first token, if it hasn't been recorded yet.
+        """
+        if "research.ttft_ms" not in self.attributes:
+            self.attributes["research.ttft_ms"] = (time.time_ns() - self.start_time_unix_nano) / 1e6
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e6
+
+
+class Tracer:
+    """
+    Records pipeline spans, appending each finished span as a JSON line to
+    `path` and, when `collect` is set, keeping it for `summary()`.
+    """
+
+    def __init__(self, path: Optional[str] = None, collect: bool = True):
+        self.path = path
+        self.collect = collect
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, activate: bool = True, **attributes: Any):
+        """
+        Time the enclosed block as a span, a child of the current span. With
+        `activate`, spans started inside the block become its children; pass
+        activate=False inside async generators, whose context is the caller's.
+        """
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_span_id=parent.span_id if parent else None,
+            start_time_unix_nano=time.time_ns(),
+            attributes=dict(attributes),
+        )
+        token = _current_span.set(span) if activate else None
+        try:
+            yield span
+        except BaseException as e:
+            span.status = {"code": "ERROR", "message": f"{e.__class__.__name__}: {e}"}
+            span.attributes.setdefault("research.outcome", "error")
+            raise
+        finally:
+            if token is not None:
+                _current_span.reset(token)
+            span.end_time_unix_nano = time.time_ns()
+            span.attributes.setdefault("research.outcome", "ok")
+            self._finish(span)
+
+    def summary(self) -> str:
+        """
+        Table of span count, latency, time to first token, tokens (input, of
+        which cached, and output) and bytes, per span name and agent.
+        """
+        groups: Dict[str, List[Span]] = {}
+        for span in self.spans:
+            label = span.name
+            agent = span.attributes.get("gen_ai.agent.name")
+            if agent:
+                label = f"{label} [{agent}]"
+            groups.setdefault(label, []).append(span)
+
+        lines = [
+            "\n⏱️ Stage Summary",
+            f"  {'stage':<42} {'count':>5} {'total s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'ttft p50':>9} {'in tok':>8} {'cached':>8} {'out tok':>8} {'bytes':>9} {'errors':>6}",
+        ]
+        for label, spans in sorted(groups.items(), key=lambda item: -sum(s.duration_ms for s in item[1])):
+            durations = [span.duration_ms for span in spans]
+            ttfts = [span.attributes["research.ttft_ms"] for span in spans if "research.ttft_ms" in span.attributes]
+            lines.append(
+                f"  {label:<42} {len(spans):>5} {sum(durations) / 1000:>8.1f} "
+                f"{percentile(durations, 50):>8.0f} {percentile(durations, 95):>8.0f} "
+                f"{percentile(ttfts, 50):>9.0f} "
+                f"{sum(span.attributes.get('gen_ai.usage.input_tokens', 0) for span in spans):>8} "
+                f"{sum(span.attributes.get('gen_ai.usage.cache_read.input_tokens', 0) for span in spans):>8} "
+                f"{sum(span.attributes.get('gen_ai.usage.output_tokens', 0) for span in spans):>8} "
+                f"{sum(span.attributes.get('research.bytes', 0) for span in spans):>9} "
+                f"{sum(1 for span in spans if span.status['code'] == 'ERROR'):>6}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def _finish(self, span: Span):
+        with self._lock:
+            if self.collect:
+                self.spans.append(span)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(span), default=str) + "\n")
+
+
+# Used when no tracer is configured: spans are timed but not kept anywhere.
+null_tracer = Tracer(collect=False)
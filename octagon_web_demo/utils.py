@@ -2,20 +2,72 @@
 import os
 import re
 import csv
+import math
+import hashlib
+import secrets
+import functools
 from datetime import datetime
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
 
-from octagon_web_demo.config import REPORTS_DIR
+import aiofiles
+
+from octagon_web_demo.config import REPORTS_DIR, TEMPLATE_PATH
 
 def load_template(path: str) -> str:
     with open(path, "r") as f:
         return f.read()
 
 
-def extract_report_text(result) -> str:
-    if isinstance(result, str):
-        return result
-    return getattr(result, "final_output", str(result))
+@functools.lru_cache(maxsize=1)
+def report_template() -> str:
+    """
+    The report template at TEMPLATE_PATH, read on first use.
+    """
+    return load_template(TEMPLATE_PATH)
+
+
+@dataclass
+class TokenUsage:
+    """
+    Token usage of one agent run. `cached_input_tokens` of the input tokens
+    were served from the provider's prompt cache.
+    """
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+
+    @property
+    def uncached_input_tokens(self) -> int:
+        return self.input_tokens - self.cached_input_tokens
+
+    def add_response(self, response):
+        """
+        Add the usage of a Responses API response. Cached tokens count as 0
+        when the provider doesn't report them.
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        details = getattr(usage, "input_tokens_details", None)
+        self.cached_input_tokens += getattr(details, "cached_tokens", 0) or 0
+
+
+def model_name(agent) -> str:
+    return getattr(agent.model, "model", str(agent.model))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of `values`, or 0 when there are none.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
 
 
 def extract_company_name(report_text: str) -> str:
@@ -27,61 +79,158 @@ def generate_report_path(company_name: str, base_dir: str = REPORTS_DIR) -> str:
     slug = re.sub(r'\W+', '_', company_name.lower()).strip("_")
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     os.makedirs(base_dir, exist_ok=True)
-    return os.path.join(base_dir, f"report_{slug}_{timestamp}.md")
+    # The random suffix keeps concurrent runs for the same company from overwriting each other.
+    return os.path.join(base_dir, f"report_{slug}_{timestamp}_{secrets.token_hex(4)}.md")
 
 
-def save_report(content: str, path: str):
-    with open(path, "w") as f:
-        f.write(content)
+FALLBACK_TITLE = "# No Data Found for"
 
 
-def build_llm_report_input(template: str, collected_data: Dict[str, str]) -> List[Dict[str, str]]:
-    """
-    Format the company and funding data along with the markdown template
-    into a prompt suitable for a GPT-style LLM.
-    """
-    report_summary = "\n\n".join([
+def build_fallback_report(company_name: str) -> str:
+    return (
+        f"{FALLBACK_TITLE} {company_name}\n\n"
+        "Unfortunately, no meaningful data could be retrieved for this company.\n\n"
+    )
+
+
+async def is_fallback_report(path: str) -> bool:
+    async with aiofiles.open(path, "r") as f:
+        return (await f.readline()).startswith(FALLBACK_TITLE)
+
+
+def format_collected_data(collected_data: Dict[str, str]) -> str:
+    return "\n\n".join([
         f"=== {key.upper()} DATA ===\n{value}"
         for key, value in collected_data.items()
     ])
 
+
+@functools.lru_cache(maxsize=32)
+def report_system_prompt(template: str) -> str:
+    """
+    The Report Agent's instructions and report template, rendered once per
+    template. The text is the same for every company and goes first in the
+    prompt, so providers that cache prompt prefixes can reuse it.
+    """
+    return (
+        "You are an expert analyst creating investor reports in Markdown format. "
+        "You are given a template and a summary of company and funding data. "
+        "Your task is to synthesize the data into a complete investor research report. "
+        "Also, for each data entry, include the source of the data in the report and list it as a source.\n\n"
+        f"Here is the template you must follow when generating the report:\n\n{template}"
+    )
+
+
+def build_llm_report_input(
+    template: str,
+    collected_data: Dict[str, str],
+    previous_report: str = "",
+) -> List[Dict[str, str]]:
+    """
+    Format the company and funding data along with the markdown template
+    into a prompt suitable for a GPT-style LLM. The static template prefix
+    comes first and the company's data last; with a `previous_report`, the
+    model updates that report instead of starting from the template.
+    """
+    if previous_report:
+        task = (
+            f"Here is the current report:\n\n{previous_report}\n\n"
+            "Update it with the following company and funding data, keeping the template's structure:"
+        )
+    else:
+        task = "Using this format, synthesize the following company and funding data into a complete investor research report:"
     return [
-        {
-            "role": "system",
-            "content": (
-                "You are an expert analyst creating investor reports in Markdown format. "
-                "Use the following Markdown template to structure your output."
-            )
-        },
-        {
-            "role": "user",
-            "content": f"""
-            You are an expert analyst creating investor reports in Markdown format.
-            You are given a template and a summary of company and funding data.
-            Your task is to synthesize the data into a complete investor research report.
-            Also, for each data entry, include the source of the data in the report and list it as a source.
-            Here is the template you must follow when generating the report:
-
-            {template}
-
-            Now, using this format, synthesize the following company and funding data into a complete investor research report:
-
-            {collected_data}
-            """
-                    }
-                ]
+        {"role": "system", "content": report_system_prompt(template)},
+        {"role": "user", "content": f"{task}\n\n{format_collected_data(collected_data)}"},
+    ]
 
 
-def read_companies_from_csv(path: str) -> List[Dict[str, str]]:
-    companies = []
+@functools.lru_cache(maxsize=32)
+def deep_research_prefix(template: str) -> str:
+    return (
+        "Using the following template, collect all the required information to populate it.\n\n"
+        f"Here is the template:\n\n{template}\n\n"
+    )
+
+
+def build_deep_research_query(template: str, query: str) -> str:
+    """
+    The Deep Research Agent's query: the shared template prefix, then the company.
+    """
+    return f"{deep_research_prefix(template)}For this company: {query}"
+
+
+def build_company_prompt(company: Dict[str, str]) -> Tuple[str, str]:
+    """
+    Return the research prompt and the report filename hint for a company row.
+    """
+    company_name = company["name"]
+    website = company.get("website")
+    if website:
+        prompt = f"Get all available data for this company: {website}"
+        filename_hint = website.replace("https://", "").replace("http://", "").split("/")[0]
+    else:
+        prompt = f"Get all available data for this company: {company_name}"
+        filename_hint = company_name
+    return prompt, filename_hint
+
+
+def company_key(company: Dict[str, str]) -> str:
+    """
+    Identity of a company for deduplication: its website domain, or its name
+    when it has no website, normalized like the report filename hint.
+    """
+    return build_company_prompt(company)[1].strip().lower()
+
+
+def company_digest(key: str) -> int:
+    """
+    Stable 64-bit hash of a company key, the same in every process (unlike hash()).
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse "i/N" into (i, N), with shards numbered from 0 to N-1.
+    """
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"Shard {spec!r} must be i/N with 0 <= i < N")
+    return index, count
+
+
+def iter_companies_from_csv(path: str, shard: int = 0, shards: int = 1, dedupe: bool = True) -> Iterator[Dict[str, str]]:
+    """
+    Yield the companies of a CSV file one row at a time, so research can start
+    before a large file has been read. Repeated companies are skipped when
+    `dedupe` is set, and with `shards` > 1 only the companies whose key hashes
+    to `shard` are yielded, so N processes or machines given shards 0..N-1 of
+    the same file each take a disjoint slice of it.
+    """
+    seen = set()
     with open(path, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
             name = row.get("Name")
             website = row.get("Website")
-            if name:
-                companies.append({
-                    "name": name.strip(),
-                    "website": website.strip() if website else None
-                })
-    return companies
+            if not name:
+                continue
+            company = {
+                "name": name.strip(),
+                "website": website.strip() if website else None
+            }
+            digest = company_digest(company_key(company))
+            if shards > 1 and digest % shards != shard:
+                continue
+            if dedupe:
+                # Only the 64-bit digests are remembered, which keeps memory small for large files.
+                if digest in seen:
+                    continue
+                seen.add(digest)
+            yield company
+
+
+def read_companies_from_csv(path: str) -> List[Dict[str, str]]:
+    return list(iter_companies_from_csv(path))
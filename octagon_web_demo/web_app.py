@@ -1,20 +1,62 @@
 import os
+import json
 import asyncio
+import hashlib
 import tempfile
+from dataclasses import asdict
+from typing import TYPE_CHECKING
 from flask import send_from_directory
 from werkzeug.utils import secure_filename
-from flask import Flask, request, render_template, redirect, url_for
+from flask import Flask, Response, jsonify, request, render_template, redirect, stream_template, url_for
 
-from octagon_web_demo.pipeline import ResearchPipeline
-from octagon_web_demo.utils import load_template, read_companies_from_csv
-from octagon_web_demo.agents import search_agent, deep_research_agent, companies_agent, funding_agent, report_agent, judge_agent
+from octagon_web_demo.tracing import Tracer, null_tracer
+from octagon_web_demo.event_loop import shared_loop
+from octagon_web_demo.jobs import JobQueue, JobQueueFull
+from octagon_web_demo.storage import ReportIndex, ReportStore
+from octagon_web_demo.singleflight import SingleFlight
+from octagon_web_demo.snapshots import SnapshotStore
+from octagon_web_demo.archive import ARCHIVE_FORMATS, ARCHIVE_MIMETYPES, run_reports, stream_archive
+from octagon_web_demo.utils import build_company_prompt, company_key, iter_companies_from_csv, report_template
 
-from octagon_web_demo.config import TEMPLATE_PATH, REPORTS_DIR
+from octagon_web_demo.cache import CACHE_POLICIES, ResponseCache
+from octagon_web_demo.config import (
+    WEB_CACHE_POLICY, SSE_HEARTBEAT_SECONDS, REPORTS_DIR, TRACE_PATH, REPORT_MAX_AGE_SECONDS, USE_X_SENDFILE,
+)
+
+if TYPE_CHECKING:
+    from octagon_web_demo.pipeline import ResearchPipeline
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+app.config['USE_X_SENDFILE'] = USE_X_SENDFILE
+
+# Spans are only exported, never kept in memory, since the server runs indefinitely.
+tracer = Tracer(path=TRACE_PATH, collect=False) if TRACE_PATH else null_tracer
+report_index = ReportIndex()
+# One cache per policy for the whole process, so the cache directory's size
+# is only measured once rather than on every run's first write.
+response_caches = {policy: ResponseCache(policy=policy) for policy in CACHE_POLICIES}
+
+
+def make_pipeline(cache_policy: str, refresh_reports: bool = False) -> "ResearchPipeline":
+    # Imported on the first run rather than at boot, so web workers start and
+    # fork without the openai and agents packages or any client loaded.
+    from octagon_web_demo.agents import research_agents
+    from octagon_web_demo.pipeline import ResearchPipeline
+
+    return ResearchPipeline(
+        **research_agents(),
+        template=report_template(),
+        cache=response_caches[cache_policy],
+        tracer=tracer,
+        store=ReportStore(index=report_index),
+        snapshots=SnapshotStore() if refresh_reports else None,
+    )
 
-md_template = load_template(str(TEMPLATE_PATH))
+
+job_queue = JobQueue(shared_loop, make_pipeline)
+# Concurrent /stream requests for the same company share one run (per process).
+single_flight = SingleFlight()
 
 
 # === Routes ===
@@ -40,94 +82,161 @@ def upload():
 @app.route("/process")
 def process():
     filepath = request.args.get("filepath")
-    companies = read_companies_from_csv(filepath)
-    print("Companies loaded:", companies)
-    return render_template("process.html", companies=companies, filepath=filepath)
+    # The table is rendered while the CSV is read, so large files don't have to fit in memory first.
+    companies = iter_companies_from_csv(filepath)
+    return Response(stream_template("process.html", companies=companies, filepath=filepath))
 
 
 @app.route("/run", methods=["POST"])
 def run_pipeline():
     filepath = request.form["filepath"]
-    companies = read_companies_from_csv(filepath)
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    async def run_all():
-        pipeline = ResearchPipeline(
-            search_agent=search_agent,
-            deep_research_agent=deep_research_agent,
-            companies_agent=companies_agent,
-            funding_agent=funding_agent,
-            report_agent=report_agent,
-            judge_agent=judge_agent,
-            template=md_template
-        )
-        paths = []
-        for company in companies:
-            name = company["name"]
-            website = company.get("website")
-            prompt = f"Get all available data for this company: {website or name}"
-            path = await pipeline.run(prompt, name)
-            paths.append((name, path))
-        return paths
-
-    report_paths = loop.run_until_complete(run_all())
-
-    return render_template("results.html", reports=report_paths)
+    cache_policy = request.form.get("cache", WEB_CACHE_POLICY)
+    if cache_policy not in CACHE_POLICIES:
+        return f"Unknown cache policy: {cache_policy}", 400
+    refresh_reports = request.form.get("refresh") == "1"
+    companies = iter_companies_from_csv(filepath)
+
+    try:
+        job = job_queue.submit(companies, cache_policy, refresh_reports)
+    except JobQueueFull as e:
+        return f"Job queue is full, try again later: {e}", 503
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(id=job.id, status_url=url_for("job_status", job_id=job.id)), 202
+    return redirect(url_for("job_page", job_id=job.id), code=303)
+
+
+@app.route("/jobs/<job_id>")
+def job_page(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+    return render_template("results.html", job=job)
+
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    if job_queue.get(job_id) is None:
+        return jsonify(error="Unknown job"), 404
+
+    def generate():
+        for job in shared_loop.iterate(lambda: job_queue.watch(job_id), heartbeat=SSE_HEARTBEAT_SECONDS):
+            if job is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _format_sse(json.dumps(job))
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), content_type='text/event-stream', headers=headers)
+
+
+@app.route("/api/reports")
+def list_reports():
+    """
+    Indexed reports, newest first. Filter with ?company= (the website domain or
+    name) and ?run=, include debug snapshots with ?debug=1, and cap the number
+    of entries with ?limit= (default 100).
+    """
+    entries = report_index.list(
+        company=request.args.get("company"),
+        run=request.args.get("run"),
+        include_debug=request.args.get("debug") == "1",
+        limit=request.args.get("limit", 100, type=int),
+    )
+    return jsonify([
+        dict(asdict(entry), url=url_for("download_report", filename=entry.filename)) for entry in entries
+    ])
 
 
 @app.route('/download/reports/<path:filename>')
 def download_report(filename):
-    return send_from_directory(REPORTS_DIR, filename, as_attachment=True)
-
+    # Reports are never rewritten under the same name, so they can be cached. Conditional
+    # requests (ETag, Last-Modified) and byte ranges are answered from the file's metadata,
+    # and whole files go out through the server's sendfile support (or X-Sendfile).
+    return send_from_directory(REPORTS_DIR, filename, as_attachment=True, conditional=True, etag=True,
+                               max_age=REPORT_MAX_AGE_SECONDS)
+
+
+@app.route("/download/runs/<run_id>")
+def download_run(run_id):
+    """
+    All reports of a run as one archive, built while it is sent. Choose the
+    format with ?format=zip (default) or ?format=tar.gz, and include debug
+    snapshots with ?debug=1.
+    """
+    fmt = request.args.get("format", "zip")
+    if fmt not in ARCHIVE_FORMATS:
+        return f"Unknown archive format: {fmt}", 400
+    entries, files = run_reports(run_id, report_index, REPORTS_DIR, include_debug=request.args.get("debug") == "1")
+    if not files:
+        return "No reports for this run", 404
+
+    filename = secure_filename(f"run_{run_id}.{fmt}")
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "X-Accel-Buffering": "no"}
+    response = Response(stream_archive(files, fmt), mimetype=ARCHIVE_MIMETYPES[fmt], headers=headers)
+    # The archive changes while the run is still adding reports, so it is only cached by validator.
+    response.set_etag(hashlib.sha256(
+        f"{fmt}\n".encode() + b"\n".join(f"{entry.filename}:{entry.bytes}".encode() for entry in entries)
+    ).hexdigest())
+    response.last_modified = max(entry.at for entry in entries)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
-from flask import Response, stream_with_context
-import time
 
 @app.route("/stream/<company_name>")
 def stream(company_name):
     website = request.args.get("website")
+    cache_policy = request.args.get("cache", WEB_CACHE_POLICY)
+    if cache_policy not in CACHE_POLICIES:
+        return f"Unknown cache policy: {cache_policy}", 400
+    refresh_reports = request.args.get("refresh") == "1"
+    # replay=0 starts a new run even when an identical one finished recently.
+    replay = request.args.get("replay") != "0"
+
+    async def run_stream():
+        prompt, filename_hint = build_company_prompt({"name": company_name, "website": website})
+        yield f"\nRunning research for: {filename_hint}\n"
+
+        # The first run of a process imports the openai and agents packages, which takes
+        # about a second; a thread does it, so the event loop keeps serving other streams.
+        pipeline = await asyncio.to_thread(make_pipeline, cache_policy, refresh_reports)
+        async for chunk in pipeline.run_streamed(prompt, filename_hint):
+            yield chunk
+        yield "[DONE]"
+
+    # A run is shared with other requests for the same company, cache policy and
+    # refresh setting, and one finished within SINGLE_FLIGHT_TTL_SECONDS is replayed.
+    key = (company_key({"name": company_name, "website": website}), cache_policy, refresh_reports)
+
+    def subscribe():
+        return single_flight.subscribe(key, run_stream, replay=replay)
 
     def generate():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        async def run_stream():
-            pipeline = ResearchPipeline(
-                search_agent=search_agent,
-                companies_agent=companies_agent,
-                funding_agent=funding_agent,
-                deep_research_agent=deep_research_agent,
-                report_agent=report_agent,
-                judge_agent=judge_agent,
-                template=md_template
-            )
-
-            if website:
-                prompt = f"Get all available data for this company: {website}"
-                filename_hint = website.replace("https://", "").replace("http://", "").split("/")[0]
+        # Each chunk is written to the client as soon as the pipeline produces it.
+        # Heartbeat comments keep idle connections open and, since every write fails
+        # once the client is gone, let a disconnect cancel the pipeline promptly
+        # (once no other client is following the same run).
+        for chunk in shared_loop.iterate(subscribe, heartbeat=SSE_HEARTBEAT_SECONDS):
+            if chunk is None:
+                yield ": keep-alive\n\n"
             else:
-                prompt = f"Get all available data for this company: {company_name}"
-                filename_hint = company_name
-            
-            async for chunk in pipeline.run_streamed(prompt, filename_hint):
-                yield f"data: {chunk}\n\n"
-            yield "data: [DONE]\n\n"
-
-        # Use loop.run_until_complete to yield from async gen
-        for message in loop.run_until_complete(_collect_streamed_output(run_stream)):
-            yield message
-
-    return Response(generate(), content_type='text/event-stream')
+                yield _format_sse(chunk)
 
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), content_type='text/event-stream', headers=headers)
 
-async def _collect_streamed_output(async_gen):
-    output = []
-    async for chunk in async_gen():
-        output.append(chunk)
-    return output
 
+def _format_sse(chunk: str) -> str:
+    # Multi-line chunks need one "data:" field per line to survive SSE framing.
+    return "".join(f"data: {line}\n" for line in chunk.split("\n")) + "\n"
 
 
 # === Run App ===
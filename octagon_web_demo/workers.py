@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import os
+import math
+import time
+import queue
+import signal
+import asyncio
+import contextlib
+import multiprocessing
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+
+from octagon_web_demo.archive import bundle_run
+from octagon_web_demo.batch import BatchSummary, CompanyResult, run_batch, results_writer
+from octagon_web_demo.journal import RunJournal, journal_kept_message, start_journal
+from octagon_web_demo.pipeline import ReportStats
+from octagon_web_demo.tracing import Span, Tracer
+from octagon_web_demo.ratelimit import parse_model_limits
+from octagon_web_demo.relevance import RelevanceStats
+from octagon_web_demo.storage import new_run_id
+from octagon_web_demo.snapshots import RefreshStats
+from octagon_web_demo.utils import iter_companies_from_csv
+from octagon_web_demo.config import (
+    MODEL_RATE_LIMITS,
+    OCTAGON_MAX_CONCURRENCY,
+    OCTAGON_RPM,
+    OCTAGON_TPM,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_RPM,
+    OPENAI_TPM,
+)
+
+# Seconds a worker gets to cancel its runs after Ctrl-C before it is killed
+SHUTDOWN_TIMEOUT = 30
+
+
+def run_workers(
+    workers: int,
+    csv_path: str,
+    concurrency: int,
+    results_path: Optional[str],
+    gather_mode: str,
+    report_mode: str,
+    cache_policy: str,
+    journal_path: str,
+    resume: bool,
+    trace_path: Optional[str],
+    shard: Tuple[int, int] = (0, 1),
+    relevance_filter: bool = False,
+    judge_mode: str = "text",
+    debug_snapshots: bool = True,
+    refresh_reports: bool = False,
+    bundle: str = "",
+) -> BatchSummary:
+    """
+    Research the companies of a CSV file with a pool of worker processes.
+
+    Each worker runs its own event loop and pipeline over a disjoint hash
+    shard of the file, with an equal share of the rate limits, and logs its
+    console output to `<journal>.worker<i>.log`. Finished companies are
+    reported back to this process, which prints progress, writes the results
+    file and the final summaries. All workers share one journal, so an
+    interrupted run resumes with --resume regardless of the worker count,
+    and index their reports under one run ID, which `bundle` archives at the end.
+    """
+    shard_index, shard_count = shard
+    kept = None if resume else start_journal(journal_path)
+    print(f"🗒️ Run journal: {journal_path}{' (resuming)' if resume else ''}")
+    if kept:
+        print(journal_kept_message(kept))
+    run_id = new_run_id()
+    print(f"🆔 Run ID: {run_id}")
+    print(f"👷 Starting {workers} workers, {concurrency} companies each")
+
+    context = multiprocessing.get_context("spawn")
+    messages = context.Queue()
+    processes = []
+    # The children read their rate limits from the environment when they import the config.
+    with _environment(_worker_limits(workers)):
+        for index in range(workers):
+            options = {
+                "csv_path": csv_path,
+                # Shard i of a shard s/M is s + M*i of M*N: those companies are all in s/M.
+                "shard": (shard_index + shard_count * index, shard_count * workers),
+                "concurrency": concurrency,
+                "gather_mode": gather_mode,
+                "report_mode": report_mode,
+                "cache_policy": cache_policy,
+                "journal_path": journal_path,
+                "resume": resume,
+                "trace_path": trace_path,
+                "relevance_filter": relevance_filter,
+                "judge_mode": judge_mode,
+                "debug_snapshots": debug_snapshots,
+                "refresh_reports": refresh_reports,
+                "run_id": run_id,
+                "log_path": f"{os.path.splitext(journal_path)[0]}.worker{index}.log",
+            }
+            process = context.Process(target=_worker_main, args=(index, options, messages),
+                                      name=f"research-worker-{index}")
+            process.start()
+            processes.append(process)
+
+    write_result = results_writer(results_path)
+    results: List[CompanyResult] = []
+    report_stats = ReportStats(report_mode)
+    relevance_stats = RelevanceStats()
+    refresh_stats = RefreshStats()
+    tracer = Tracer()
+    skipped = 0
+    finished = set()
+    started = time.perf_counter()
+
+    def receive():
+        nonlocal skipped
+        kind, index, payload = messages.get(timeout=1)
+        if kind == "start":
+            print(f"▶️ [worker {index}] Starting {payload}")
+        elif kind == "result":
+            result = CompanyResult(**payload)
+            results.append(result)
+            write_result(result)
+        elif kind == "done":
+            skipped += payload["skipped"]
+            report_stats.add(ReportStats(**payload["report_stats"]))
+            if payload["relevance_stats"]:
+                relevance_stats.add(RelevanceStats(**payload["relevance_stats"]))
+            refresh_stats.add(RefreshStats(**payload["refresh_stats"]))
+            tracer.spans.extend(Span(**span) for span in payload["spans"])
+            finished.add(index)
+
+    try:
+        while len(finished) < workers:
+            try:
+                receive()
+            except queue.Empty:
+                for index, process in enumerate(processes):
+                    if index not in finished and not process.is_alive():
+                        print(f"❌ Worker {index} exited with code {process.exitcode}")
+                        finished.add(index)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted, stopping workers. Re-run with --resume to continue.")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        # Keep reading, both for the companies that still finish and because a
+        # worker can't exit while its messages are stuck in a full pipe.
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        while any(process.is_alive() for process in processes) and time.monotonic() < deadline:
+            try:
+                receive()
+            except queue.Empty:
+                pass
+    finally:
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    summary = BatchSummary(results=results, wall_seconds=time.perf_counter() - started, skipped=skipped)
+    print(summary.format())
+    print(report_stats.format())
+    if relevance_filter:
+        print(relevance_stats.format())
+    if refresh_reports:
+        print(refresh_stats.format())
+    print(tracer.summary())
+    if trace_path:
+        print(f"🧵 Spans written to: {trace_path}")
+    if bundle:
+        bundle_path = bundle_run(run_id, bundle)
+        print(f"📦 Reports bundled in: {bundle_path}" if bundle_path else "📦 No reports to bundle")
+    return summary
+
+
+def _worker_main(index: int, options: dict, messages):
+    # Ctrl-C reaches every process in the terminal's process group; the parent
+    # decides how workers shut down, with SIGTERM.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with open(options["log_path"], "w", buffering=1, encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            asyncio.run(_work(index, options, messages))
+        except asyncio.CancelledError:
+            print(f"🛑 Worker {index} stopped")
+
+
+async def _work(index: int, options: dict, messages):
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    # Imported here so the agents are created in the worker, not pickled from the parent.
+    from octagon_web_demo.main import build_pipeline
+
+    tracer = Tracer(path=options["trace_path"] or None)
+    pipeline = build_pipeline(options["gather_mode"], options["report_mode"], options["cache_policy"], tracer,
+                              options["relevance_filter"], options["judge_mode"], options["debug_snapshots"],
+                              options["run_id"], options["refresh_reports"])
+    # The parent started a new journal if this isn't a resumed run.
+    journal = RunJournal(options["journal_path"], resume=True)
+    companies = iter_companies_from_csv(options["csv_path"], *options["shard"])
+
+    summary = await run_batch(
+        pipeline,
+        companies,
+        options["concurrency"],
+        on_result=lambda result: messages.put(("result", index, asdict(result))),
+        journal=journal,
+        on_start=lambda _, company: messages.put(("start", index, company["name"])),
+    )
+    messages.put(("done", index, {
+        "skipped": summary.skipped,
+        "report_stats": asdict(pipeline.report_stats),
+        "relevance_stats": asdict(pipeline.relevance.stats) if pipeline.relevance else None,
+        "refresh_stats": asdict(pipeline.refresh_stats),
+        "spans": [asdict(span) for span in tracer.spans],
+    }))
+
+
+def _worker_limits(workers: int) -> Dict[str, str]:
+    """
+    Environment giving each worker an equal share of the rate limits, so the
+    pool as a whole stays within them. Limits of 0 stay disabled.
+    """
+    def share(limit: int) -> int:
+        return max(1, limit // workers) if limit else 0
+
+    model_limits = ",".join(
+        f"{model}={share(rpm)}/{share(tpm)}" for model, (rpm, tpm) in parse_model_limits(MODEL_RATE_LIMITS).items()
+    )
+    return {
+        "OPENAI_RPM": str(share(OPENAI_RPM)),
+        "OPENAI_TPM": str(share(OPENAI_TPM)),
+        "OPENAI_MAX_CONCURRENCY": str(math.ceil(OPENAI_MAX_CONCURRENCY / workers)),
+        "OCTAGON_RPM": str(share(OCTAGON_RPM)),
+        "OCTAGON_TPM": str(share(OCTAGON_TPM)),
+        "OCTAGON_MAX_CONCURRENCY": str(math.ceil(OCTAGON_MAX_CONCURRENCY / workers)),
+        "MODEL_RATE_LIMITS": model_limits,
+    }
+
+
+@contextlib.contextmanager
+def _environment(values: Dict[str, str]):
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
@@ -0,0 +1,59 @@
+import pytest
+from agents import Agent, set_tracing_disabled
+
+from octagon_web_demo.mock_backend import MockModel
+from octagon_web_demo.pipeline import ResearchPipeline
+from octagon_web_demo.ratelimit import RateLimiter
+from octagon_web_demo.storage import ReportIndex, ReportStore
+
+TEMPLATE = """# Investment Report
+
+## Funding History
+- Funding rounds, investors and valuation: {{ funding.rounds }}
+
+## Products
+- Product lines and platform features: {{ products }}
+"""
+
+AGENT_NAMES = {
+    "search": "Search Agent",
+    "deep_research": "Deep Research Agent",
+    "companies": "Companies Agent",
+    "funding": "Funding Agent",
+    "report": "Report Generator Agent",
+    "judge": "Judge Agent",
+}
+
+
+@pytest.fixture
+def template() -> str:
+    return TEMPLATE
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    """
+    Build a ResearchPipeline over instant mock models, without rate limits,
+    saving to `tmp_path`. Returns the pipeline and its MockModel by agent key,
+    whose `_attempts` show which agents were called.
+    """
+    set_tracing_disabled(True)
+
+    def make(**kwargs):
+        models = {
+            key: MockModel(key, latency=0, tokens_per_second=0, output_tokens=40, error_rate=0) for key in AGENT_NAMES
+        }
+        agents = {
+            f"{key}_agent": Agent(name=name, instructions=f"You are the {name}.", model=models[key])
+            for key, name in AGENT_NAMES.items()
+        }
+        pipeline = ResearchPipeline(
+            **agents,
+            template=TEMPLATE,
+            rate_limiter=RateLimiter(provider_limits={"openai": (0, 0, 4), "octagon": (0, 0, 4)}, model_limits={}),
+            store=ReportStore(str(tmp_path / "reports"), index=ReportIndex(str(tmp_path / "index.jsonl"))),
+            **kwargs,
+        )
+        return pipeline, models
+
+    return make
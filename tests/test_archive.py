@@ -0,0 +1,78 @@
+import io
+import os
+import random
+import asyncio
+import tarfile
+import zipfile
+import threading
+
+import pytest
+
+from octagon_web_demo.archive import bundle_run, run_reports, stream_archive
+from octagon_web_demo.storage import DEBUG, ReportIndex, ReportStore
+
+
+@pytest.fixture
+def report_files(tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / f"report_{i}.md"
+        rng = random.Random(i)
+        path.write_text(f"# Report {i}\n" + " ".join(str(rng.random()) for _ in range(5000)))
+        files.append((str(path), f"run/report_{i}.md"))
+    return files
+
+
+@pytest.mark.parametrize("fmt", ["zip", "tar.gz"])
+def test_stream_archive_yields_a_complete_archive_in_chunks(report_files, fmt):
+    chunks = list(stream_archive(report_files, fmt, chunk_size=4096))
+    assert len(chunks) > 1
+    data = io.BytesIO(b"".join(chunks))
+    if fmt == "zip":
+        with zipfile.ZipFile(data) as archive:
+            contents = {name: archive.read(name).decode() for name in archive.namelist()}
+    else:
+        with tarfile.open(fileobj=data, mode="r:gz") as archive:
+            contents = {member.name: archive.extractfile(member).read().decode() for member in archive.getmembers()}
+    assert contents == {name: open(path).read() for path, name in report_files}
+
+
+def test_closing_stream_archive_stops_its_writer(report_files):
+    stream = stream_archive(report_files, "zip", chunk_size=1024)
+    next(stream)
+    stream.close()
+    writers = [thread for thread in threading.enumerate() if thread.name == "archive-writer"]
+    for thread in writers:
+        thread.join(timeout=2)
+    assert not any(thread.is_alive() for thread in writers)
+
+
+def test_stream_archive_rejects_unknown_formats(report_files):
+    with pytest.raises(ValueError):
+        list(stream_archive(report_files, "rar"))
+
+
+def test_stream_archive_passes_on_writer_errors(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(stream_archive([(str(tmp_path / "missing.md"), "run/missing.md")], "tar.gz"))
+
+
+def test_bundle_run_archives_the_run_reports_still_on_disk(tmp_path):
+    async def save_reports():
+        store = ReportStore(str(tmp_path), index=ReportIndex(str(tmp_path / "index.jsonl")), run_id="run1")
+        paths = [await store.save(f"# {company}\n", company) for company in ("acme.com", "globex.com", "initech.com")]
+        await store.save("# Draft\n", "acme.com", kind=DEBUG)
+        await ReportStore(str(tmp_path), index=store.index, run_id="run2").save("# Other run\n", "acme.com")
+        return store.index, paths
+
+    index, paths = asyncio.run(save_reports())
+    os.remove(paths[1])
+
+    entries, files = run_reports("run1", index, str(tmp_path))
+    assert [entry.company for entry in entries] == ["acme.com", "initech.com"]
+
+    bundle = bundle_run("run1", "zip", str(tmp_path), index)
+    assert bundle == str(tmp_path / "run_run1.zip")
+    with zipfile.ZipFile(bundle) as archive:
+        assert sorted(archive.namelist()) == sorted(f"run1/{os.path.basename(path)}" for path in (paths[0], paths[2]))
+    assert bundle_run("run3", "zip", str(tmp_path), index) is None
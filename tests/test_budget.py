@@ -0,0 +1,60 @@
+from octagon_web_demo.budget import ContextBudget, TrimStats, count_tokens, same_content, split_passages
+
+
+def test_same_content_needs_overlap_both_ways():
+    text = "Acme raised a Series B round of 40 million dollars led by Example Ventures in March"
+    assert same_content(text, text + " 2024.")
+    assert not same_content(text, text + " and then went on to open offices in Berlin, Paris and Madrid this year.")
+    assert not same_content(text, text + " 2024.", overlap=0)
+
+
+def test_fit_drops_passages_repeated_in_another_source(template):
+    budget = ContextBudget(template, overlap=0.8)
+    repeated = "Acme raised a Series B round of 40 million dollars led by Example Ventures."
+    data = {
+        "companies": f"Acme builds payment software for clinics.\n\n{repeated}",
+        "funding": repeated,
+    }
+    fitted, stats = budget.fit(data)
+    assert fitted == {"companies": data["companies"]}
+    assert stats.duplicates == 1
+    assert stats.dropped == 0
+
+
+def test_fit_keeps_the_best_passage_of_each_section_within_the_budget(template):
+    budget = ContextBudget(template, overlap=0)
+    funding = "Funding rounds: Acme raised money from investors at a high valuation."
+    products = "Product lines: the platform features billing and scheduling."
+    filler = "Unrelated trivia about the weather in the office on some Tuesday afternoon."
+    data = {"search": "\n\n".join([filler, funding, filler.replace("Tuesday", "Friday"), products])}
+    fitted, stats = budget.fit(data, budget=40)
+    assert fitted == {"search": f"{funding}\n\n{products}"}
+    assert stats.dropped == 2
+    assert stats.tokens_after <= 40 < stats.tokens_before
+
+
+def test_split_passages_keeps_headings_and_breaks_long_paragraphs_at_sentences():
+    long_paragraph = " ".join(f"Sentence number {i} about Acme." for i in range(100))
+    passages = split_passages(f"# Acme\n\nShort paragraph.\n\n{long_paragraph}", max_chars=300)
+    assert passages[0] == "# Acme\nShort paragraph."
+    assert all(len(passage) <= 300 for passage in passages[1:])
+    assert " ".join(passages[1:]) == long_paragraph
+
+
+def test_trim_stats_add_merges_counts_but_not_budgets():
+    stats = TrimStats(budget=1000, tokens_before=800, tokens_after=500, passages=10, duplicates=2, dropped=3)
+    stats.add(TrimStats(budget=600, tokens_before=400, tokens_after=300, passages=4, duplicates=1, dropped=1))
+    assert stats == TrimStats(budget=1000, tokens_before=1200, tokens_after=800, passages=14, duplicates=3, dropped=4)
+    assert stats.trimmed_tokens == 400
+
+
+def test_judge_input_is_reported_against_the_judge_budget(make_pipeline, template, capsys):
+    pipeline, _ = make_pipeline(context_budget=ContextBudget(template, judge_tokens=200, overlap=0))
+    base_report = "\n\n".join(f"Acme report paragraph {i} on funding rounds and investors." for i in range(50))
+    new_data = "\n\n".join(f"New Acme data point {i} on products and the platform." for i in range(50))
+
+    _, fitted_data, trim = pipeline._fit_judge_input("Judge this.", new_data, base_report)
+    assert trim.budget == 200
+    assert count_tokens(fitted_data) < count_tokens(new_data)
+    assert trim.tokens_after <= 200
+    assert "(budget 200)" in capsys.readouterr().out
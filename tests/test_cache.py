@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import asyncio
+
+import pytest
+from agents import Agent
+
+from octagon_web_demo.cache import ResponseCache
+from octagon_web_demo.mock_backend import MockModel
+
+
+def _cache(tmp_path, **kwargs) -> ResponseCache:
+    return ResponseCache(directory=str(tmp_path / "cache"), **kwargs)
+
+
+def _age(cache: ResponseCache, key: str, seconds: float):
+    """
+    Make an entry look `seconds` older, both its creation time and its last use.
+    """
+    path = cache._path(key)
+    with open(path) as f:
+        entry = json.load(f)
+    entry["created"] -= seconds
+    with open(path, "w") as f:
+        json.dump(entry, f)
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_key_depends_on_agent_and_input():
+    cache = ResponseCache()
+    search = Agent(name="Search Agent", instructions="Search.", model=MockModel("gpt-4o"))
+    funding = Agent(name="Funding Agent", instructions="Search.", model=MockModel("gpt-4o"))
+    assert cache.key(search, "acme.com") == cache.key(search, "acme.com")
+    assert cache.key(search, "acme.com") != cache.key(search, "globex.com")
+    assert cache.key(search, "acme.com") != cache.key(funding, "acme.com")
+    assert cache.key(search, "acme.com") != cache.key(search.clone(model=MockModel("gpt-4o-mini")), "acme.com")
+
+
+@pytest.mark.parametrize("policy, stored, served", [("use", True, True), ("refresh", True, False), ("bypass", False, False)])
+def test_cache_policies(tmp_path, policy, stored, served):
+    async def scenario():
+        cache = _cache(tmp_path, policy=policy)
+        await cache.set("ab12", "report")
+        return await cache.get("ab12"), await _cache(tmp_path).get("ab12")
+
+    assert asyncio.run(scenario()) == ("report" if served else None, "report" if stored else None)
+
+
+def test_expired_entries_are_removed(tmp_path):
+    async def scenario():
+        cache = _cache(tmp_path, ttl=60)
+        await cache.set("ab12", "fresh")
+        await cache.set("cd34", "stale")
+        _age(cache, "cd34", 120)
+        return await cache.get("ab12"), await cache.get("cd34"), os.path.exists(cache._path("cd34"))
+
+    assert asyncio.run(scenario()) == ("fresh", None, False)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    async def scenario():
+        cache = _cache(tmp_path, max_bytes=10 ** 6)
+        for key, age in (("aa", 30), ("bb", 20), ("cc", 10)):
+            await cache.set(key, "x" * 1000)
+            _age(cache, key, age)
+        # Reading "aa" makes it the most recently used entry.
+        assert await cache.get("aa") is not None
+        # Room for three entries, whose sizes differ by a few bytes with their timestamps.
+        cache.max_bytes = 3 * os.path.getsize(cache._path("aa")) + 100
+        await cache.set("dd", "x" * 1000)
+        return {key: os.path.exists(cache._path(key)) for key in ("aa", "bb", "cc", "dd")}, cache
+
+    present, cache = asyncio.run(scenario())
+    assert present == {"aa": True, "bb": False, "cc": True, "dd": True}
+    assert cache._size == sum(os.path.getsize(cache._path(key)) for key in ("aa", "cc", "dd"))
+
+
+def test_size_is_measured_once_and_tracked_on_writes(tmp_path):
+    async def scenario():
+        await _cache(tmp_path).set("aa", "x" * 100)
+        cache = _cache(tmp_path)
+        await asyncio.gather(*(cache.set(f"{i:02d}", "x" * 100) for i in range(20)))
+        await cache.set("aa", "x" * 200)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache._size == sum(stat.st_size for _, stat in cache._entries())
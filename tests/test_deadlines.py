@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from octagon_web_demo import pipeline as pipeline_module
+from octagon_web_demo.deadlines import Deadlines, DeadlineExceeded, parse_agent_deadlines, stream_with_deadlines
+
+
+def _stream(name, tokens=3, first=0.0, gap=0.0, preamble=0, log=None, error=None):
+    """
+    A stream yielding `preamble` non-token events, then `tokens` tokens, the
+    first after `first` seconds and the next ones `gap` seconds apart. `log`
+    records whether the stream finished or was cancelled.
+    """
+    async def events():
+        try:
+            for i in range(preamble):
+                yield ("start", f"{name}{i}")
+            await asyncio.sleep(first)
+            if error:
+                raise error
+            for i in range(tokens):
+                if i:
+                    await asyncio.sleep(gap)
+                yield ("token", f"{name}{i}")
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{name} cancelled")
+            raise
+        if log is not None:
+            log.append(f"{name} finished")
+
+    return events
+
+
+def _collect(start, deadlines, hedge=None):
+    async def scenario():
+        return [event async for event in stream_with_deadlines(start, lambda e: e[0] == "token", deadlines, hedge)]
+
+    return asyncio.run(scenario())
+
+
+def test_events_pass_through_within_the_deadlines():
+    events = _collect(_stream("a", preamble=1, gap=0.01), Deadlines(ttft=1, idle=1, total=1))
+    assert events == [("start", "a0"), ("token", "a0"), ("token", "a1"), ("token", "a2")]
+
+
+def test_missed_first_token_deadline_raises_and_stops_the_stream():
+    log = []
+    with pytest.raises(DeadlineExceeded) as error:
+        _collect(_stream("a", first=5, log=log), Deadlines(ttft=0.05, idle=0, total=0))
+    assert error.value.kind == "time to first token"
+    assert log == ["a cancelled"]
+
+
+@pytest.mark.parametrize("deadlines, kind", [
+    (Deadlines(ttft=1, idle=0.05, total=0), "idle"),
+    (Deadlines(ttft=1, idle=0.5, total=0.1), "total"),
+])
+def test_idle_and_total_deadlines(deadlines, kind):
+    with pytest.raises(DeadlineExceeded) as error:
+        _collect(_stream("a", tokens=10, gap=0.3), deadlines)
+    assert error.value.kind == kind
+
+
+def test_hedge_wins_over_a_hung_stream():
+    log = []
+    events = _collect(
+        _stream("a", first=5, preamble=1, log=log),
+        Deadlines(ttft=0.05, idle=0, total=0),
+        hedge=_stream("b", preamble=1, log=log),
+    )
+    # Only the winner's events are yielded, including those before its first token.
+    assert events == [("start", "b0"), ("token", "b0"), ("token", "b1"), ("token", "b2")]
+    assert sorted(log) == ["a cancelled", "b finished"]
+
+
+def test_original_stream_can_still_beat_its_hedge():
+    log = []
+    events = _collect(
+        _stream("a", first=0.15, log=log),
+        Deadlines(ttft=0.1, idle=0, total=0),
+        hedge=_stream("b", first=5, log=log),
+    )
+    assert [value for _, value in events] == ["a0", "a1", "a2"]
+    assert sorted(log) == ["a finished", "b cancelled"]
+
+
+def test_a_failing_stream_leaves_its_hedge_running():
+    events = _collect(
+        _stream("a", first=0.12, error=ConnectionError("reset")),
+        Deadlines(ttft=0.1, idle=0, total=0),
+        hedge=_stream("b", first=0.08),
+    )
+    assert [value for _, value in events] == ["b0", "b1", "b2"]
+
+
+def test_hedge_that_also_misses_the_deadline_raises():
+    with pytest.raises(DeadlineExceeded):
+        _collect(_stream("a", first=5), Deadlines(ttft=0.05, idle=0, total=0), hedge=_stream("b", first=5))
+
+
+def test_parse_agent_deadlines():
+    assert parse_agent_deadlines("Search Agent=30/20/120, Deep Research Agent=300/60/0") == {
+        "Search Agent": Deadlines(30, 20, 120),
+        "Deep Research Agent": Deadlines(300, 60, 0),
+    }
+
+
+@pytest.mark.parametrize("action", ["retry", "hedge"])
+def test_hung_source_is_dropped_after_one_more_request(make_pipeline, monkeypatch, action):
+    monkeypatch.setattr(pipeline_module, "deadlines_for", lambda name: Deadlines(ttft=0.05, idle=0, total=0))
+    pipeline, models = make_pipeline(deadline_action=action)
+    models["search"].latency = 5
+
+    data = asyncio.run(pipeline._fetch_source("search", "Search Agent", "acme.com", None))
+    assert data == ""
+    assert sum(models["search"]._attempts.values()) == 2
@@ -0,0 +1,56 @@
+import csv
+
+import pytest
+
+from octagon_web_demo.utils import company_digest, company_key, iter_companies_from_csv, parse_shard
+
+
+@pytest.fixture
+def companies_csv(tmp_path):
+    path = tmp_path / "companies.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Website"])
+        for i in range(200):
+            writer.writerow([f"Company {i}", f"https://company{i}.example/about"])
+        writer.writerows([
+            ["Company 0 Inc.", "http://company0.example"],
+            ["Stealth Co", ""],
+            [" Stealth Co ", ""],
+            ["", "https://nameless.example"],
+        ])
+    return str(path)
+
+
+def test_companies_are_read_in_order_with_duplicates_skipped(companies_csv):
+    companies = list(iter_companies_from_csv(companies_csv))
+    assert len(companies) == 201
+    assert companies[0] == {"name": "Company 0", "website": "https://company0.example/about"}
+    assert companies[-1] == {"name": "Stealth Co", "website": None}
+    assert len(list(iter_companies_from_csv(companies_csv, dedupe=False))) == 203
+
+
+def test_shards_are_disjoint_and_cover_the_file(companies_csv):
+    shards = [list(iter_companies_from_csv(companies_csv, shard=i, shards=3)) for i in range(3)]
+    keys = [{company_key(company) for company in shard} for shard in shards]
+    assert all(40 < len(shard) < 100 for shard in shards)
+    assert not (keys[0] & keys[1] or keys[0] & keys[2] or keys[1] & keys[2])
+    assert keys[0] | keys[1] | keys[2] == {company_key(company) for company in iter_companies_from_csv(companies_csv)}
+
+
+def test_company_keys_and_digests_are_stable():
+    assert company_key({"name": "Acme", "website": "https://www.Acme.com/team"}) == "www.acme.com"
+    assert company_key({"name": " Acme ", "website": None}) == "acme"
+    # Processes and machines must agree on the shard of a company.
+    assert company_digest("acme.com") == 0x179CBAC01F7203C7
+
+
+@pytest.mark.parametrize("spec, expected", [("0/1", (0, 1)), ("3/4", (3, 4))])
+def test_parse_shard(spec, expected):
+    assert parse_shard(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["4/4", "-1/2", "1"])
+def test_parse_shard_rejects_out_of_range_shards(spec):
+    with pytest.raises(ValueError):
+        parse_shard(spec)
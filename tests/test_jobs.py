@@ -0,0 +1,82 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from octagon_web_demo.event_loop import BackgroundLoop
+from octagon_web_demo.jobs import FINISHED, JobQueue, JobQueueFull
+
+COMPANIES = [{"name": "Acme", "website": "acme.com"}, {"name": "Globex", "website": ""}]
+
+
+@pytest.fixture
+def loop():
+    loop = BackgroundLoop()
+    yield loop
+
+    async def stop_workers():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    loop.run(stop_workers(), timeout=5)
+    loop.loop.call_soon_threadsafe(loop.loop.stop)
+
+
+def _wait_until_finished(queue: JobQueue, job_id: str, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = queue.get(job_id)
+        if state["status"] == FINISHED:
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_jobs_run_in_the_background_and_are_evicted_once_written(make_pipeline, loop, tmp_path):
+    queue = JobQueue(loop, lambda cache_policy, refresh: make_pipeline()[0], workers=1,
+                     jobs_dir=str(tmp_path / "jobs"), max_finished=1)
+    jobs = [queue.submit(COMPANIES, "use") for _ in range(3)]
+    states = [_wait_until_finished(queue, job.id) for job in jobs]
+
+    for state in states:
+        assert [company["status"] for company in state["companies"]] == ["succeeded", "succeeded"]
+        assert all(company["path"] for company in state["companies"])
+        assert state["run_id"] and state["started"] <= state["finished"]
+
+    # Finished jobs beyond max_finished are only served from their state files.
+    time.sleep(0.1)
+    assert list(queue._jobs) == [jobs[-1].id]
+    assert queue.get(jobs[0].id) == states[0]
+    assert queue.get("unknown") is None
+
+
+def test_full_queue_rejects_new_jobs(make_pipeline, loop, tmp_path):
+    release = threading.Event()
+
+    def blocked_pipeline(cache_policy, refresh):
+        release.wait(10)
+        return make_pipeline()[0]
+
+    queue = JobQueue(loop, blocked_pipeline, workers=1, max_depth=1, jobs_dir=str(tmp_path / "jobs"))
+    running = queue.submit(COMPANIES, "use")
+    time.sleep(0.1)
+    queued = queue.submit(COMPANIES, "use")
+    with pytest.raises(JobQueueFull):
+        queue.submit(COMPANIES, "use")
+    assert queue.get(queued.id)["status"] == "queued"
+
+    release.set()
+    assert _wait_until_finished(queue, running.id)["status"] == FINISHED
+    assert _wait_until_finished(queue, queued.id)["status"] == FINISHED
+
+
+def test_watch_follows_a_job_until_it_finishes(make_pipeline, loop, tmp_path):
+    queue = JobQueue(loop, lambda cache_policy, refresh: make_pipeline()[0], workers=1,
+                     jobs_dir=str(tmp_path / "jobs"))
+    job = queue.submit(COMPANIES, "use")
+    states = list(loop.iterate(lambda: queue.watch(job.id), heartbeat=10))
+    assert states[-1]["status"] == FINISHED
+    assert len(states) > 1
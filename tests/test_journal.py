@@ -0,0 +1,51 @@
+import asyncio
+
+from octagon_web_demo.batch import run_batch
+from octagon_web_demo.journal import DONE_STAGE, RunJournal
+
+
+def test_journal_replays_stages_and_ignores_a_torn_last_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record("acme.com", "search", "first")
+    journal.record("acme.com", "search", "second")
+    journal.record("globex.com", DONE_STAGE, {"path": "r.md", "status": "succeeded"})
+    with open(path, "a") as f:
+        f.write('{"company": "acme.com", "stage": "fund')
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed_stages("acme.com") == {"search": "second"}
+    assert resumed.is_done("globex.com")
+    assert not resumed.is_done("acme.com")
+
+
+def test_new_journal_keeps_an_unfinished_one(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    RunJournal(path).record("acme.com", "search", "data")
+
+    journal = RunJournal(path)
+    assert journal.previous is not None
+    assert RunJournal(journal.previous, resume=True).completed_stages("acme.com") == {"search": "data"}
+    assert open(path).read() == ""
+
+    journal.record("acme.com", DONE_STAGE, {})
+    assert RunJournal(path).previous is None
+
+
+def test_resumed_batch_skips_finished_companies_and_restored_stages(make_pipeline, tmp_path):
+    pipeline, models = make_pipeline()
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record("globex.com", DONE_STAGE, {"path": "globex.md", "status": "succeeded"})
+    journal.record("acme.com", "search", "Acme Health builds scheduling software for dental clinics.")
+
+    companies = [{"name": "Globex", "website": "globex.com"}, {"name": "Acme", "website": "acme.com"}]
+    summary = asyncio.run(run_batch(pipeline, companies, concurrency=1, journal=RunJournal(path, resume=True)))
+
+    assert summary.skipped == 1
+    assert [(result.name, result.status) for result in summary.results] == [("Acme", "succeeded")]
+    assert not models["search"]._attempts
+    assert models["companies"]._attempts and models["funding"]._attempts and models["deep_research"]._attempts
+    stages = RunJournal(path, resume=True).completed_stages("acme.com")
+    assert stages["search"] == "Acme Health builds scheduling software for dental clinics."
+    assert {"companies", "funding", "deep_research", DONE_STAGE} <= set(stages)
@@ -0,0 +1,68 @@
+import json
+import asyncio
+
+import openai
+import pytest
+from agents.agent_output import AgentOutputSchema
+
+from octagon_web_demo.pipeline import JudgeVerdict
+from octagon_web_demo.mock_backend import MockModel
+
+
+def _stream_text(model: MockModel, input, output_schema=None) -> str:
+    async def scenario():
+        deltas, completed = [], None
+        async for event in model.stream_response("Be brief.", input, None, [], output_schema, [], None):
+            if event.type == "response.output_text.delta":
+                deltas.append(event.delta)
+            else:
+                completed = event.response
+        return "".join(deltas), completed
+
+    text, completed = asyncio.run(scenario())
+    assert completed.usage.output_tokens == len(text.split())
+    return text.strip()
+
+
+def _model(**kwargs) -> MockModel:
+    return MockModel("gpt-4o", **{"latency": 0, "tokens_per_second": 0, "output_tokens": 40, "error_rate": 0, **kwargs})
+
+
+def test_outputs_are_reproducible_per_seed_and_input():
+    assert _stream_text(_model(), "acme.com") == _stream_text(_model(), "acme.com")
+    assert _stream_text(_model(), "acme.com") != _stream_text(_model(), "globex.com")
+    assert _stream_text(_model(), "acme.com") != _stream_text(_model(seed=1), "acme.com")
+
+
+def test_reports_have_footnoted_sections():
+    text = _stream_text(_model(), "acme.com")
+    assert text.startswith("# Report from gpt-4o")
+    assert text.count("\n## ") == 4 and "[^4]" in text
+
+
+def test_structured_output_matches_the_schema():
+    text = _stream_text(_model(), "judge acme.com", AgentOutputSchema(JudgeVerdict))
+    JudgeVerdict.model_validate(json.loads(text))
+
+
+def test_retries_of_a_failed_request_draw_again():
+    model = _model(error_rate=0.5)
+    outcomes = []
+    for _ in range(20):
+        try:
+            _stream_text(model, "acme.com")
+            outcomes.append("ok")
+        except openai.APIConnectionError:
+            outcomes.append("failed")
+    assert {"ok", "failed"} == set(outcomes)
+    with pytest.raises(openai.APIConnectionError):
+        _stream_text(_model(error_rate=1), "acme.com")
+
+
+def test_repeated_long_prompt_prefixes_are_reported_as_cached():
+    model = _model()
+    prefix = "template " * 1200
+    first = model._cached_tokens("Be brief.", prefix + "acme.com")
+    second = model._cached_tokens("Be brief.", prefix + "globex.com")
+    assert first == 0
+    assert second >= 1024 and second % 128 == 0
@@ -0,0 +1,149 @@
+import time
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from octagon_web_demo.ratelimit import (
+    AdaptiveConcurrency,
+    RateLimiter,
+    TokenBucket,
+    parse_model_limits,
+    retry_after,
+)
+
+
+def _response(status: int, headers=None) -> httpx.Response:
+    return httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://api.test/v1/responses"))
+
+
+def _rate_limit_error(headers=None) -> openai.RateLimitError:
+    return openai.RateLimitError("rate limited", response=_response(429, headers), body=None)
+
+
+def _limiter(max_retries: int = 3) -> RateLimiter:
+    return RateLimiter(provider_limits={"openai": (0, 0, 8), "octagon": (0, 0, 8)}, model_limits={},
+                       max_retries=max_retries)
+
+
+# === TokenBucket ===
+
+def test_token_bucket_waits_for_the_refill():
+    async def scenario():
+        bucket = TokenBucket(6000)
+        await bucket.acquire(6000)
+        started = time.monotonic()
+        await bucket.acquire(10)
+        return time.monotonic() - started
+
+    assert 0.08 <= asyncio.run(scenario()) < 1
+
+
+def test_token_bucket_adjust_can_go_into_debt():
+    bucket = TokenBucket(60)
+    bucket.adjust(100)
+    assert bucket.tokens < -39
+    bucket.adjust(-1000)
+    assert bucket.tokens == 60
+
+
+def test_disabled_token_bucket_never_waits():
+    async def scenario():
+        bucket = TokenBucket(0)
+        for _ in range(1000):
+            await bucket.acquire(10 ** 6)
+
+    asyncio.run(asyncio.wait_for(scenario(), 1))
+
+
+# === AdaptiveConcurrency ===
+
+def test_adaptive_concurrency_halves_on_throttle_and_grows_back():
+    concurrency = AdaptiveConcurrency(8)
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 2
+    for _ in range(2):
+        concurrency.on_success()
+    assert concurrency.limit == 3
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 1
+
+
+def test_adaptive_concurrency_limits_calls_in_flight():
+    async def scenario():
+        concurrency = AdaptiveConcurrency(2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            await concurrency.acquire()
+            peak = max(peak, concurrency.active)
+            await asyncio.sleep(0.01)
+            concurrency.release()
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        return peak, concurrency.active
+
+    assert asyncio.run(scenario()) == (2, 0)
+
+
+def test_cancelled_waiter_passes_its_wakeup_on():
+    async def scenario():
+        concurrency = AdaptiveConcurrency(1)
+        await concurrency.acquire()
+        first = asyncio.create_task(concurrency.acquire())
+        second = asyncio.create_task(concurrency.acquire())
+        await asyncio.sleep(0)
+        concurrency.release()
+        # `first` is woken, then cancelled (e.g. a hedge loser) before it runs.
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+        return first.cancelled(), concurrency.active
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+# === Retries ===
+
+def test_backoff_grows_exponentially_with_full_jitter():
+    limiter = _limiter(max_retries=10)
+    error = openai.APIConnectionError(request=httpx.Request("POST", "http://api.test"))
+    delays = [limiter.backoff("gpt-4o", error, attempt) for attempt in range(4) for _ in range(20)]
+    assert all(0 <= delay <= 2 ** (index // 20) for index, delay in enumerate(delays))
+
+
+def test_backoff_gives_up_on_client_errors_and_after_the_last_retry():
+    limiter = _limiter(max_retries=2)
+    bad_request = openai.BadRequestError("bad request", response=_response(400), body=None)
+    server_error = openai.InternalServerError("server error", response=_response(500), body=None)
+    assert limiter.backoff("gpt-4o", bad_request, 0) is None
+    assert limiter.backoff("gpt-4o", server_error, 1) is not None
+    assert limiter.backoff("gpt-4o", server_error, 2) is None
+
+
+def test_backoff_honors_retry_after_and_throttles_the_provider():
+    limiter = _limiter()
+    assert limiter.backoff("octagon-funding-agent", _rate_limit_error({"retry-after": "7"}), 0) == 7
+    assert limiter._concurrency["octagon"].limit == 4
+    assert limiter._concurrency["openai"].limit == 8
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after": "3"}, 3),
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, 0),
+    ({}, None),
+])
+def test_retry_after(headers, expected):
+    assert retry_after(_rate_limit_error(headers)) == expected
+
+
+def test_parse_model_limits():
+    assert parse_model_limits("gpt-4o=500/30000, octagon-funding-agent=60/") == {
+        "gpt-4o": (500, 30000),
+        "octagon-funding-agent": (60, 0),
+    }
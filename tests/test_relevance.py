@@ -0,0 +1,24 @@
+from octagon_web_demo.relevance import ACCEPT, ESCALATE, REJECT, RelevanceFilter
+
+
+def test_relevance_filter_accepts_rejects_and_escalates():
+    base_report = "# Acme Health\nAcme Health sells Clinic Cloud, scheduling software for dental clinics in Ohio."
+    relevance = RelevanceFilter(accept_score=0.6, reject_score=0.2, sample_rate=0)
+
+    accepted = relevance.assess(
+        "acmehealth.com: Acme Health raised a Series B for Clinic Cloud, its dental clinics scheduling software.",
+        base_report,
+        "acmehealth.com",
+    )
+    rejected = relevance.assess("Globex mines copper in Chile and reported record quarterly output.", base_report,
+                                "acmehealth.com")
+    escalated = relevance.assess("Acmehealth was mentioned in a list of startups.", base_report, "acmehealth.com")
+
+    assert (accepted.verdict, accepted.identity) == (ACCEPT, 1.0)
+    assert (rejected.verdict, rejected.identity) == (REJECT, 0.0)
+    assert (escalated.verdict, escalated.identity) == (ESCALATE, 0.5)
+    assert (relevance.stats.accepted, relevance.stats.rejected, relevance.stats.escalated) == (1, 1, 1)
+
+    relevance.record_agreement(ACCEPT, True)
+    relevance.record_agreement(REJECT, True)
+    assert (relevance.stats.sampled, relevance.stats.agreed) == (2, 1)
@@ -0,0 +1,42 @@
+import asyncio
+
+from octagon_web_demo.journal import RunJournal
+from octagon_web_demo.sections import assemble_report, parse_template, split_report
+
+
+def test_assemble_report_renumbers_footnotes_across_sections():
+    first = "## Overview\nAcme sells software[^1] to clinics[^2].\n\n[^1]: https://acme.example\n[^2]: https://news.example/a"
+    second = "## Funding\nAcme raised $40M[^1], see also its site[^2].\n\n[^1]: https://news.example/b\n[^2]: https://acme.example"
+    report = assemble_report("# Acme", [first, second])
+    assert report == (
+        "# Acme\n\n"
+        "## Overview\nAcme sells software[^1] to clinics[^2].\n\n"
+        "## Funding\nAcme raised $40M[^3], see also its site[^1].\n\n"
+        "[^1]: https://acme.example\n[^2]: https://news.example/a\n[^3]: https://news.example/b\n"
+    )
+
+
+def test_split_report_finds_the_template_sections(template):
+    _, sections = parse_template(template)
+    assert [section.title for section in sections] == ["Funding History", "Products"]
+    report = "# Acme\n\n## Funding History\nSeries B.\n\n## Products\nClinic Cloud."
+    assert split_report(report, sections) == {
+        "Funding History": "## Funding History\nSeries B.",
+        "Products": "## Products\nClinic Cloud.",
+    }
+
+
+def test_sections_report_is_checkpointed_and_restored(make_pipeline, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    query, hint = "Get all available data for this company: acme.com", "acme.com"
+
+    pipeline, _ = make_pipeline(report_mode="sections")
+    asyncio.run(pipeline.run(query, hint, checkpoint=RunJournal(path).company(hint)))
+    stages = RunJournal(path, resume=True).completed_stages(hint)
+    assert set(stages["sections"]) == {"Funding History", "Products"}
+    assert stages["report"].startswith("# Investment Report")
+
+    resumed, models = make_pipeline(report_mode="sections")
+    report_path = asyncio.run(resumed.run(query, hint, checkpoint=RunJournal(path, resume=True).company(hint)))
+    assert not any(model._attempts for model in models.values())
+    assert open(report_path).read().strip() == stages["report"].strip()
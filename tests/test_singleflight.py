@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from octagon_web_demo import web_app
+from octagon_web_demo.singleflight import SingleFlight
+
+
+def test_single_flight_shares_one_run_between_subscribers():
+    async def scenario():
+        flight = SingleFlight(ttl=60, max_results=4)
+        release = asyncio.Event()
+        starts = []
+
+        async def produce():
+            starts.append(1)
+            yield "a"
+            await release.wait()
+            yield "b"
+
+        async def collect():
+            return [chunk async for chunk in flight.subscribe("acme", produce)]
+
+        first = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(first, second)
+        replayed = await collect()
+        return starts, results, replayed
+
+    starts, results, replayed = asyncio.run(scenario())
+    assert starts == [1]
+    assert results == [["a", "b"], ["a", "b"]]
+    assert replayed == ["a", "b"]
+
+
+def test_single_flight_cancels_a_run_its_last_subscriber_left():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def produce():
+            try:
+                yield "a"
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        stream = flight.subscribe("acme", produce)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flight._runs
+
+    assert asyncio.run(scenario()) == {}
+
+
+def test_single_flight_does_not_replay_failed_runs():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            yield "a"
+            if len(calls) == 1:
+                raise RuntimeError("provider down")
+
+        with pytest.raises(RuntimeError):
+            [chunk async for chunk in flight.subscribe("acme", produce)]
+        return [chunk async for chunk in flight.subscribe("acme", produce)], calls
+
+    chunks, calls = asyncio.run(scenario())
+    assert chunks == ["a"]
+    assert calls == [1, 1]
+
+
+def test_single_flight_replay_expires_and_can_be_skipped():
+    async def scenario():
+        flight = SingleFlight(ttl=0.05)
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            yield "a"
+
+        async def collect(**kwargs):
+            return [chunk async for chunk in flight.subscribe("acme", produce, **kwargs)]
+
+        await collect()
+        await collect()
+        await collect(replay=False)
+        await asyncio.sleep(0.1)
+        await collect()
+        return len(calls)
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_single_flight_keeps_the_latest_finished_runs():
+    async def scenario():
+        flight = SingleFlight(max_results=2)
+
+        async def produce():
+            yield "a"
+
+        for key in ("acme", "globex", "initech"):
+            [chunk async for chunk in flight.subscribe(key, produce)]
+        return list(flight._runs)
+
+    assert asyncio.run(scenario()) == ["globex", "initech"]
+
+
+class _Pipeline:
+    runs = 0
+
+    async def run_streamed(self, prompt, filename_hint):
+        _Pipeline.runs += 1
+        yield "report ready\n"
+
+
+def test_stream_route_replays_a_finished_run_with_the_default_cache_policy(monkeypatch):
+    monkeypatch.setattr(web_app, "make_pipeline", lambda cache_policy, refresh_reports=False: _Pipeline())
+    monkeypatch.setattr(web_app, "single_flight", SingleFlight(ttl=60))
+    client = web_app.app.test_client()
+
+    bodies = [client.get("/stream/Acme?website=acme.com").get_data(as_text=True) for _ in range(2)]
+    client.get("/stream/Acme?website=acme.com&replay=0").get_data()
+
+    assert bodies[0] == bodies[1]
+    assert "data: report ready" in bodies[0] and "data: [DONE]" in bodies[0]
+    assert _Pipeline.runs == 2
@@ -0,0 +1,91 @@
+import os
+import asyncio
+
+import pytest
+
+from octagon_web_demo.storage import DEBUG, FALLBACK, FINAL, ReportEntry, ReportIndex, ReportStore
+from octagon_web_demo.utils import build_fallback_report, is_fallback_report
+
+
+@pytest.fixture
+def store(tmp_path) -> ReportStore:
+    return ReportStore(str(tmp_path), index=ReportIndex(str(tmp_path / "index.jsonl")), run_id="run1")
+
+
+def test_save_writes_and_indexes_the_report(store, tmp_path):
+    async def scenario():
+        first = await store.save("# Acme\n", "acme.com")
+        second = await store.save("# Acme, again\n", "acme.com")
+        await store.save("# Draft\n", "acme.com", kind=DEBUG)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first != second
+    assert open(second).read() == "# Acme, again\n"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    # Another process reads the same index.
+    index = ReportIndex(store.index.path)
+    assert index.latest("acme.com").filename == os.path.basename(second)
+    assert [entry.kind for entry in index.list(company="acme.com", include_debug=True)] == [DEBUG, FINAL, FINAL]
+    assert [entry.bytes for entry in index.list(run="run1")] == [14, 7]
+    assert index.list(run="run2") == []
+
+
+def test_draft_commit_renames_the_streamed_report(store):
+    async def scenario():
+        draft = store.draft("acme.com")
+        await draft.restart()
+        await draft.append("# Acme draft that is replaced\n")
+        await draft.restart()
+        for delta in ("# Acme\n", "Acme builds ", "clinic software.\n"):
+            await draft.append(delta)
+        streamed = open(draft.partial_path).read()
+        path = await draft.commit("# Acme\nAcme builds clinic software.\n")
+        return draft, streamed, path
+
+    draft, streamed, path = asyncio.run(scenario())
+    assert "replaced" not in streamed
+    assert open(path).read() == "# Acme\nAcme builds clinic software.\n"
+    assert not os.path.exists(draft.partial_path)
+    assert draft.committed
+    assert store.index.latest("acme.com").filename == os.path.basename(path)
+
+
+def test_draft_commit_writes_a_report_that_differs_from_the_stream(store):
+    async def scenario():
+        draft = store.draft("acme.com")
+        await draft.restart()
+        await draft.append("# Acme, cut short")
+        return draft, await draft.commit(build_fallback_report("Acme"), kind=FALLBACK)
+
+    draft, path = asyncio.run(scenario())
+    assert open(path).read() == build_fallback_report("Acme")
+    assert not os.path.exists(draft.partial_path)
+    assert store.index.latest("acme.com").kind == FALLBACK
+    assert asyncio.run(is_fallback_report(path))
+
+
+def test_discarded_draft_leaves_nothing_behind(store, tmp_path):
+    async def scenario():
+        draft = store.draft("acme.com")
+        await draft.restart()
+        await draft.append("# Acme")
+        await draft.flush()
+        draft.discard()
+
+    asyncio.run(scenario())
+    assert not [name for name in os.listdir(tmp_path) if name.endswith((".md", ".partial"))]
+    assert store.index.list() == []
+
+
+def test_index_skips_a_line_still_being_written(tmp_path):
+    index = ReportIndex(str(tmp_path / "index.jsonl"))
+    index.add(ReportEntry("acme.com", "run1", FINAL, "acme.md", 10, 1.0))
+    with open(index.path, "a") as f:
+        f.write('{"company": "globex.com", "run"')
+    assert [entry.company for entry in index.list()] == ["acme.com"]
+
+    with open(index.path, "a") as f:
+        f.write(': "run1", "kind": "final", "filename": "globex.md", "bytes": 5, "at": 2.0}\n')
+    assert [entry.company for entry in index.list()] == ["globex.com", "acme.com"]